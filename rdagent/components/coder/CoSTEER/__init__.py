@@ -53,6 +53,7 @@ class CoSTEER(Developer[Experiment]):
                 settings=settings,
                 former_knowledge_base_path=self.knowledge_base_path,
                 dump_knowledge_base_path=self.new_knowledge_base_path,
+                knowledge_base_format=settings.knowledge_base_format,
                 evolving_version=self.evolving_version,
             )
             if self.evolving_version == 2
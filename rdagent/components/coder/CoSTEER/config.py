@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Literal, Union
 
 from rdagent.core.conf import ExtendedBaseSettings
 
@@ -33,6 +33,12 @@ class CoSTEERSettings(ExtendedBaseSettings):
     new_knowledge_base_path: Union[str, None] = None
     """Path to the new knowledge base"""
 
+    knowledge_base_format: Literal["pickle", "mmap"] = "pickle"
+    """How the new knowledge base is dumped (only for evolving_version 2):
+    - pickle: one pickle file of the whole knowledge base.
+    - mmap: a folder with a compact node table and memory-mapped embeddings; dumps only append the new knowledge.
+    """
+
     enable_filelock: bool = False
     filelock_path: Union[str, None] = None
 
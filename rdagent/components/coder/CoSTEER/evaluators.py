@@ -27,7 +27,7 @@ from rdagent.core.conf import RD_AGENT_SETTINGS
 from rdagent.core.evaluation import Evaluator, Feedback
 from rdagent.core.evolving_framework import QueriedKnowledge
 from rdagent.core.experiment import Task, Workspace
-from rdagent.core.utils import multiprocessing_wrapper
+from rdagent.core.utils import async_wrapper, multiprocessing_wrapper
 from rdagent.log import rdagent_logger as logger
 
 if TYPE_CHECKING:
@@ -442,6 +442,11 @@ class CoSTEEREvaluator(Evaluator):
         scen: 关联的场景实例，提供评估所需的上下文信息和配置
     """
 
+    io_bound: bool = False
+    """Whether the evaluation mostly waits for LLM responses.
+    Only such evaluators run in threads when `RD_AGENT_SETTINGS.multi_proc_mode` is "async";
+    the evaluators executing code (CPU or subprocess heavy) keep using the process pool."""
+
     def __init__(
         self,
         scen: "Scenario",
@@ -609,7 +614,12 @@ class CoSTEERMultiEvaluator(CoSTEEREvaluator):
 
         for ev in eval_l:
             # 为每个评估器并行评估所有子任务
-            multi_implementation_feedback = multiprocessing_wrapper(
+            wrapper = (
+                async_wrapper
+                if RD_AGENT_SETTINGS.multi_proc_mode == "async" and getattr(ev, "io_bound", False)
+                else multiprocessing_wrapper
+            )
+            multi_implementation_feedback = wrapper(
                 [
                     (
                         ev.evaluate,  # 评估函数
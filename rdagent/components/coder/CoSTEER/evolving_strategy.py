@@ -20,7 +20,7 @@ from rdagent.core.conf import RD_AGENT_SETTINGS
 from rdagent.core.evolving_framework import EvolvingStrategy, EvoStep, QueriedKnowledge
 from rdagent.core.experiment import FBWorkspace, Task
 from rdagent.core.scenario import Scenario
-from rdagent.core.utils import multiprocessing_wrapper
+from rdagent.core.utils import async_wrapper, multiprocessing_wrapper
 
 
 class MultiProcessEvolvingStrategy(EvolvingStrategy):
@@ -116,7 +116,9 @@ class MultiProcessEvolvingStrategy(EvolvingStrategy):
                         {}
                     )  # empty implementation for skipped task, but assign_code_list_to_evo will still assign it
 
-        result = multiprocessing_wrapper(
+        # implementing a task mostly waits for LLM responses, so it can share the process in async mode
+        wrapper = async_wrapper if RD_AGENT_SETTINGS.multi_proc_mode == "async" else multiprocessing_wrapper
+        result = wrapper(
             [
                 (
                     self.implement_one_task,
@@ -37,6 +37,7 @@ from rdagent.components.knowledge_management.graph import (
     UndirectedGraph,
     UndirectedNode,
 )
+from rdagent.components.knowledge_management.storage import KnowledgeGraphStore
 from rdagent.core.evolving_agent import Feedback
 from rdagent.core.evolving_framework import (
     EvolvableSubjects,
@@ -116,14 +117,38 @@ class CoSTEERKnowledge(Knowledge):
 
 
 class CoSTEERRAGStrategy(RAGStrategy):
-    def __init__(self, *args, dump_knowledge_base_path: Path = None, **kwargs):
+    def __init__(self, *args, dump_knowledge_base_path: Path = None, knowledge_base_format: str = "pickle", **kwargs):
+        """
+        knowledge_base_format:
+            - pickle: the knowledge base is dumped as a whole pickle file.
+            - mmap: the knowledge base is dumped into a `KnowledgeGraphStore` folder (only for evolving_version 2);
+              embeddings are memory-mapped when loading and only the new knowledge is appended when dumping;
+              reloading only replays the knowledge appended since the last load/dump.
+        """
+        self.kb_store = (
+            KnowledgeGraphStore(
+                dump_knowledge_base_path,
+                append_only_attrs=CoSTEERKnowledgeBaseV2.APPEND_ONLY_ATTRS,
+                append_only_list_attrs=CoSTEERKnowledgeBaseV2.APPEND_ONLY_LIST_ATTRS,
+            )
+            if knowledge_base_format == "mmap" and dump_knowledge_base_path is not None
+            else None
+        )
         super().__init__(*args, **kwargs)
         self.dump_knowledge_base_path = dump_knowledge_base_path
 
     def load_or_init_knowledge_base(
         self, former_knowledge_base_path: Path = None, component_init_list: list = [], evolving_version: int = 2
     ) -> EvolvingKnowledgeBase:
-        if former_knowledge_base_path is not None and former_knowledge_base_path.exists():
+        if KnowledgeGraphStore.is_store(former_knowledge_base_path):
+            knowledge_base = KnowledgeGraphStore(
+                former_knowledge_base_path,
+                append_only_attrs=CoSTEERKnowledgeBaseV2.APPEND_ONLY_ATTRS,
+                append_only_list_attrs=CoSTEERKnowledgeBaseV2.APPEND_ONLY_LIST_ATTRS,
+            ).load()
+            if evolving_version != 2 or not isinstance(knowledge_base, CoSTEERKnowledgeBaseV2):
+                raise ValueError("The former knowledge base is not compatible with the current version")
+        elif former_knowledge_base_path is not None and former_knowledge_base_path.exists():
             knowledge_base = pickle.load(open(former_knowledge_base_path, "rb"))
             if evolving_version == 1 and not isinstance(knowledge_base, CoSTEERKnowledgeBaseV1):
                 raise ValueError("The former knowledge base is not compatible with the current version")
@@ -145,6 +170,8 @@ class CoSTEERRAGStrategy(RAGStrategy):
     def dump_knowledge_base(self):
         if self.dump_knowledge_base_path is None:
             logger.warning("Dump knowledge base path is not set, skip dumping.")
+        elif self.kb_store is not None:
+            self.kb_store.save(self.knowledgebase)
         else:
             if not self.dump_knowledge_base_path.parent.exists():
                 self.dump_knowledge_base_path.parent.mkdir(parents=True, exist_ok=True)
@@ -156,6 +183,10 @@ class CoSTEERRAGStrategy(RAGStrategy):
             logger.warning("Dump knowledge base path is not set, skip dumping.")
         elif not Path(self.dump_knowledge_base_path).exists():
             logger.info(f"Dumped knowledge base {self.dump_knowledge_base_path} does not exist, skip loading.")
+        elif self.kb_store is not None:
+            # only the knowledge appended by others since the last load/dump is replayed
+            self.knowledgebase = self.kb_store.refresh(self.knowledgebase)
+            logger.info(f"Loaded dumped knowledge base from {self.dump_knowledge_base_path}")
         else:
             with open(self.dump_knowledge_base_path, "rb") as f:
                 self.knowledgebase = pickle.load(f)
@@ -823,6 +854,15 @@ class CoSTEERRAGStrategyV2(CoSTEERRAGStrategy):
 
 
 class CoSTEERKnowledgeBaseV2(EvolvingKnowledgeBase):
+    # the dicts which only get new keys; KnowledgeGraphStore appends their new items instead of rewriting them
+    APPEND_ONLY_ATTRS = (
+        "success_task_to_knowledge_dict",
+        "node_to_implementation_knowledge_dict",
+        "task_to_component_nodes",
+    )
+    # the dicts of lists which only get new items at the end
+    APPEND_ONLY_LIST_ATTRS = ("working_trace_knowledge", "working_trace_error_analysis")
+
     def __init__(self, init_component_list=None, path: str | Path = None) -> None:
         """
         Load knowledge, offer brief information of knowledge and common handle interfaces
@@ -1,5 +1,5 @@
 import os
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic_settings import SettingsConfigDict
 
@@ -28,6 +28,17 @@ class FactorCoSTEERSettings(CoSTEERSettings):
     python_bin: str = "python"
     """Path to the Python binary"""
 
+    execution_mode: Literal["subprocess", "worker_pool"] = "subprocess"
+    """How the factor code is executed; "worker_pool" runs it in long-lived workers which keep the source data loaded
+    (see `rdagent.components.coder.factor_coder.worker_pool`)"""
+
+    worker_pool_size: int = 1
+    """The number of workers of each process in the "worker_pool" execution mode"""
+
+    value_cache_format: Literal["pickle", "arrow"] = "arrow"
+    """How `FactorFBWorkspace.execute` caches the factor values;
+    "arrow" stores them in memory-mapped columnar files, "pickle" pickles the whole result with `cache_with_pickle`"""
+
 
 def get_factor_env(
     conf_type: Optional[str] = None,
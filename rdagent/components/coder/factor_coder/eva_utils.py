@@ -1,23 +1,46 @@
 import io
 import json
+import time
 from abc import abstractmethod
-from typing import Dict, Tuple
+from contextlib import contextmanager
+from typing import Dict, Generator, Tuple
 
+import numpy as np
 import pandas as pd
 
 from rdagent.components.coder.factor_coder.config import FACTOR_COSTEER_SETTINGS
 from rdagent.components.coder.factor_coder.factor import FactorTask
 from rdagent.core.experiment import Task, Workspace
+from rdagent.log import rdagent_logger as logger
 from rdagent.oai.llm_conf import LLM_SETTINGS
 from rdagent.oai.llm_utils import APIBackend
 from rdagent.utils.agent.tpl import T
 
 
+def grouped_corr(x: pd.Series, y: pd.Series, level: str = "datetime", method: str = "pearson") -> pd.Series:
+    """
+    The same as `pd.concat([x, y], axis=1).groupby(level).apply(lambda df: x.corr(y, method=method))`
+    (rows with NaN in either series are dropped in each group), but computed by grouped sums instead of
+    calling `Series.corr` for every group.
+    """
+    valid = x.notna() & y.notna()
+    x, y = x.where(valid), y.where(valid)
+    if method == "spearman":
+        x, y = x.groupby(level=level).rank(), y.groupby(level=level).rank()
+    x = x - x.groupby(level=level).transform("mean")
+    y = y - y.groupby(level=level).transform("mean")
+    sums = pd.DataFrame({"n": valid.astype(float), "xy": x * y, "xx": x * x, "yy": y * y}).groupby(level=level).sum()
+    corr = sums["xy"] / np.sqrt(sums["xx"] * sums["yy"])
+    return corr.where((sums["n"] >= 2) & (sums["xx"] > 0) & (sums["yy"] > 0))
+
+
 class FactorEvaluator:
     """Although the init method is same to Evaluator, but we want to emphasize they are different"""
 
     def __init__(self, scen=None) -> None:
         self.scen = scen
+        # (gt_df, gen_df) prepared by the caller; they are used instead of executing the workspaces again
+        self.prepared_dfs: tuple[pd.DataFrame | None, pd.DataFrame | None] | None = None
 
     @abstractmethod
     def evaluate(
@@ -44,6 +67,8 @@ class FactorEvaluator:
         raise NotImplementedError("Please implement the `evaluator` method")
 
     def _get_df(self, gt_implementation: Workspace, implementation: Workspace):
+        if self.prepared_dfs is not None:
+            return self.prepared_dfs
         if gt_implementation is not None:
             _, gt_df = gt_implementation.execute()
             if isinstance(gt_df, pd.Series):
@@ -89,25 +114,18 @@ class FactorCodeEvaluator(FactorEvaluator):
             )
         )
 
-        execution_feedback_to_render = execution_feedback
-        for _ in range(10):  # 10 times to split the content is enough
-            user_prompt = T(".prompts:evaluator_code_feedback_v1_user").r(
+        # keep the tail of the execution feedback which fits the token limit
+        user_prompt = APIBackend().build_messages_and_fit_content(
+            lambda execution_feedback_to_render: T(".prompts:evaluator_code_feedback_v1_user").r(
                 factor_information=factor_information,
                 code=code,
                 execution_feedback=execution_feedback_to_render,
                 value_feedback=value_feedback,
                 gt_code=gt_implementation.code if gt_implementation else None,
-            )
-            if (
-                APIBackend().build_messages_and_calculate_token(
-                    user_prompt=user_prompt,
-                    system_prompt=system_prompt,
-                )
-                > APIBackend().chat_token_limit
-            ):
-                execution_feedback_to_render = execution_feedback_to_render[len(execution_feedback_to_render) // 2 :]
-            else:
-                break
+            ),
+            execution_feedback,
+            system_prompt=system_prompt,
+        )
         critic_response = APIBackend().build_messages_and_create_chat_completion(
             user_prompt=user_prompt,
             system_prompt=system_prompt,
@@ -280,8 +298,10 @@ class FactorIndexEvaluator(FactorEvaluator):
                 "The source dataframe is None. Please check the implementation.",
                 False,
             )
-        gen_index_set, gt_index_set = set(gen_df.index), set(gt_df.index)
-        similarity = len(gen_index_set.intersection(gt_index_set)) / len(gen_index_set.union(gt_index_set))
+        # the same as comparing `set(gen_df.index)` and `set(gt_df.index)` without building python tuples
+        gen_index, gt_index = gen_df.index.unique(), gt_df.index.unique()
+        n_shared = len(gen_index.intersection(gt_index))
+        similarity = n_shared / (len(gen_index) + len(gt_index) - n_shared)
         return (
             (
                 f"The source dataframe and the ground truth dataframe have different index with a similarity of {similarity:.2%}. The similarity is calculated by the number of shared indices divided by the union indices. "
@@ -363,13 +383,8 @@ class FactorCorrelationEvaluator(FactorEvaluator):
             )
         concat_df = pd.concat([gen_df, gt_df], axis=1)
         concat_df.columns = ["source", "gt"]
-        ic = concat_df.groupby("datetime").apply(lambda df: df["source"].corr(df["gt"])).dropna().mean()
-        ric = (
-            concat_df.groupby("datetime")
-            .apply(lambda df: df["source"].corr(df["gt"], method="spearman"))
-            .dropna()
-            .mean()
-        )
+        ic = grouped_corr(concat_df["source"], concat_df["gt"]).dropna().mean()
+        ric = grouped_corr(concat_df["source"], concat_df["gt"], method="spearman").dropna().mean()
 
         if self.hard_check:
             if ic > 0.99 and ric > 0.99:
@@ -387,6 +402,28 @@ class FactorCorrelationEvaluator(FactorEvaluator):
 
 
 class FactorValueEvaluator(FactorEvaluator):
+    """
+    Both dataframes are materialized (and sorted) only once and shared by all the checks.
+    The time spent on each check of the last evaluation is recorded in `timings`.
+    """
+
+    def __init__(self, scen=None) -> None:
+        super().__init__(scen)
+        self.timings: dict[str, float] = {}
+
+    @contextmanager
+    def _timed(self, name: str) -> Generator[None, None, None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def _check(self, evaluator: FactorEvaluator, implementation: Workspace, gt_implementation: Workspace) -> Tuple:
+        evaluator.prepared_dfs = self.prepared_dfs
+        with self._timed(str(evaluator)):
+            return evaluator.evaluate(implementation, gt_implementation)
+
     def evaluate(
         self,
         implementation: Workspace,
@@ -394,6 +431,19 @@ class FactorValueEvaluator(FactorEvaluator):
         version: int = 1,  # 1 for qlib factors and 2 for kaggle factors
         **kwargs,
     ) -> Tuple:
+        self.timings = {}
+        self.prepared_dfs = None
+        with self._timed("load_dataframes"):
+            self.prepared_dfs = self._get_df(gt_implementation, implementation)
+        try:
+            return self._evaluate(implementation, gt_implementation, version)
+        finally:
+            self.prepared_dfs = None
+            logger.info(
+                "Factor value evaluation timings: " + ", ".join(f"{k}={v:.3f}s" for k, v in self.timings.items())
+            )
+
+    def _evaluate(self, implementation: Workspace, gt_implementation: Workspace, version: int) -> Tuple:
         conclusions = []
 
         # Initialize result variables
@@ -406,7 +456,7 @@ class FactorValueEvaluator(FactorEvaluator):
 
         # Check if both dataframe has only one columns Mute this since factor task might generate more than one columns now
         if version == 1:
-            feedback_str, _ = FactorSingleColumnEvaluator(self.scen).evaluate(implementation, gt_implementation)
+            feedback_str, _ = self._check(FactorSingleColumnEvaluator(self.scen), implementation, gt_implementation)
             conclusions.append(feedback_str)
         elif version == 2:
             input_shape = self.scen.input_shape
@@ -416,15 +466,15 @@ class FactorValueEvaluator(FactorEvaluator):
                     "Output dataframe has more columns than input feature which is not acceptable in feature processing tasks. Please check the implementation to avoid generating too many columns. Consider this implementation as a failure."
                 )
 
-        feedback_str, inf_evaluate_res = FactorInfEvaluator(self.scen).evaluate(implementation, gt_implementation)
+        feedback_str, inf_evaluate_res = self._check(FactorInfEvaluator(self.scen), implementation, gt_implementation)
         conclusions.append(feedback_str)
 
         # Check if the index of the dataframe is ("datetime", "instrument")
-        feedback_str, _ = FactorOutputFormatEvaluator(self.scen).evaluate(implementation, gt_implementation)
+        feedback_str, _ = self._check(FactorOutputFormatEvaluator(self.scen), implementation, gt_implementation)
         conclusions.append(feedback_str)
         if version == 1:
-            feedback_str, daily_check_result = FactorDatetimeDailyEvaluator(self.scen).evaluate(
-                implementation, gt_implementation
+            feedback_str, daily_check_result = self._check(
+                FactorDatetimeDailyEvaluator(self.scen), implementation, gt_implementation
             )
             conclusions.append(feedback_str)
         else:
@@ -432,26 +482,28 @@ class FactorValueEvaluator(FactorEvaluator):
 
         # Check dataframe format
         if gt_implementation is not None:
-            feedback_str, row_result = FactorRowCountEvaluator(self.scen).evaluate(implementation, gt_implementation)
+            feedback_str, row_result = self._check(
+                FactorRowCountEvaluator(self.scen), implementation, gt_implementation
+            )
             conclusions.append(feedback_str)
 
-            feedback_str, index_result = FactorIndexEvaluator(self.scen).evaluate(implementation, gt_implementation)
+            feedback_str, index_result = self._check(FactorIndexEvaluator(self.scen), implementation, gt_implementation)
             conclusions.append(feedback_str)
 
-            feedback_str, output_format_result = FactorMissingValuesEvaluator(self.scen).evaluate(
-                implementation, gt_implementation
+            feedback_str, output_format_result = self._check(
+                FactorMissingValuesEvaluator(self.scen), implementation, gt_implementation
             )
             conclusions.append(feedback_str)
 
-            feedback_str, equal_value_ratio_result = FactorEqualValueRatioEvaluator(self.scen).evaluate(
-                implementation, gt_implementation
+            feedback_str, equal_value_ratio_result = self._check(
+                FactorEqualValueRatioEvaluator(self.scen), implementation, gt_implementation
             )
             conclusions.append(feedback_str)
 
             if index_result > 0.99:
-                feedback_str, high_correlation_result = FactorCorrelationEvaluator(
-                    hard_check=True, scen=self.scen
-                ).evaluate(implementation, gt_implementation)
+                feedback_str, high_correlation_result = self._check(
+                    FactorCorrelationEvaluator(hard_check=True, scen=self.scen), implementation, gt_implementation
+                )
             else:
                 high_correlation_result = False
                 feedback_str = "The source dataframe and the ground truth dataframe have different index. Give up comparing the values and correlation because it's useless"
@@ -491,10 +543,9 @@ class FactorFinalDecisionEvaluator(FactorEvaluator):
                 else "No scenario description."
             )
         )
-        execution_feedback_to_render = execution_feedback
-
-        for _ in range(10):  # 10 times to split the content is enough
-            user_prompt = T(".prompts:evaluator_final_decision_v1_user").r(
+        # keep the tail of the execution feedback which fits the token limit
+        user_prompt = APIBackend().build_messages_and_fit_content(
+            lambda execution_feedback_to_render: T(".prompts:evaluator_final_decision_v1_user").r(
                 factor_information=target_task.get_task_information(),
                 execution_feedback=execution_feedback_to_render,
                 code_feedback=code_feedback,
@@ -503,17 +554,10 @@ class FactorFinalDecisionEvaluator(FactorEvaluator):
                     if value_feedback is not None
                     else "No Ground Truth Value provided, so no evaluation on value is performed."
                 ),
-            )
-            if (
-                APIBackend().build_messages_and_calculate_token(
-                    user_prompt=user_prompt,
-                    system_prompt=system_prompt,
-                )
-                > APIBackend().chat_token_limit
-            ):
-                execution_feedback_to_render = execution_feedback_to_render[len(execution_feedback_to_render) // 2 :]
-            else:
-                break
+            ),
+            execution_feedback,
+            system_prompt=system_prompt,
+        )
 
         # TODO:  with retry_context(retry_n=3, except_list=[KeyError]):
         final_evaluation_dict = None
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import contextlib
+import multiprocessing as mp
 import subprocess
 import uuid
 from pathlib import Path
@@ -11,6 +13,11 @@ from filelock import FileLock
 from rdagent.app.kaggle.conf import KAGGLE_IMPLEMENT_SETTING
 from rdagent.components.coder.CoSTEER.task import CoSTEERTask
 from rdagent.components.coder.factor_coder.config import FACTOR_COSTEER_SETTINGS
+from rdagent.components.coder.factor_coder.factor_value_store import (
+    get_factor_value_store,
+)
+from rdagent.components.coder.factor_coder.worker_pool import get_factor_worker_pool
+from rdagent.core.conf import RD_AGENT_SETTINGS
 from rdagent.core.exception import CodeFormatError, CustomRuntimeError, NoOutputError
 from rdagent.core.experiment import Experiment, FBWorkspace
 from rdagent.core.utils import cache_with_pickle
@@ -103,7 +110,21 @@ class FactorFBWorkspace(FBWorkspace):
             else None
         )
 
-    @cache_with_pickle(hash_func)
+    def value_cache_enabled(self, data_type: str = "Debug") -> bool:
+        """Whether the result of `execute` is cached in the columnar factor value store"""
+        return (
+            FACTOR_COSTEER_SETTINGS.value_cache_format == "arrow"
+            and RD_AGENT_SETTINGS.cache_with_pickle
+            and self.hash_func(data_type) is not None
+        )
+
+    def warm_value_cache(self, data_type: str = "Debug") -> None:
+        """
+        Execute the implementation to fill the columnar cache without returning the factor value.
+        It is used in subprocesses so that the values are memory-mapped by the caller instead of being pickled back.
+        """
+        self.execute(data_type)
+
     def execute(self, data_type: str = "Debug") -> Tuple[str, pd.DataFrame]:
         """
         execute the implementation and get the factor value by the following steps:
@@ -120,9 +141,27 @@ class FactorFBWorkspace(FBWorkspace):
 
         Regarding the cache mechanism:
         1. We will store the function's return value to ensure it behaves as expected.
-        - The cached information will include a tuple with the following: (execution_feedback, executed_factor_value_dataframe, Optional[Exception])
+        - The cached information will include a tuple with the following: (execution_feedback, executed_factor_value_dataframe)
+        2. If FACTOR_COSTEER_SETTINGS.value_cache_format is "arrow", the factor values are stored in the columnar
+           `FactorValueStore` and memory-mapped on hit; otherwise the tuple is pickled by `cache_with_pickle`.
 
         """
+        if not self.value_cache_enabled(data_type):
+            return self._execute_with_pickle_cache(data_type)
+
+        hash_key = self.hash_func(data_type)
+        store = get_factor_value_store()
+        hit, execution_feedback, executed_factor_value_dataframe = store.get(hash_key)
+        if not hit:
+            with store.lock(hash_key) if RD_AGENT_SETTINGS.use_file_lock else contextlib.nullcontext():
+                # another process may have finished the same factor while we were waiting for the lock
+                hit, execution_feedback, executed_factor_value_dataframe = store.get(hash_key)
+                if not hit:
+                    execution_feedback, executed_factor_value_dataframe = self._execute(data_type)
+                    store.set(hash_key, execution_feedback, executed_factor_value_dataframe)
+        return execution_feedback, executed_factor_value_dataframe
+
+    def _execute(self, data_type: str = "Debug") -> Tuple[str, pd.DataFrame]:
         self.before_execute()
         if self.file_dict is None or "factor.py" not in self.file_dict:
             if self.raise_exception:
@@ -160,13 +199,28 @@ class FactorFBWorkspace(FBWorkspace):
                 execution_code_path.write_text((Path(__file__).parent / "factor_execution_template.txt").read_text())
 
             try:
-                subprocess.check_output(
-                    f"{FACTOR_COSTEER_SETTINGS.python_bin} {execution_code_path}",
-                    shell=True,
-                    cwd=self.workspace_path,
-                    stderr=subprocess.STDOUT,
-                    timeout=FACTOR_COSTEER_SETTINGS.file_based_execution_timeout,
-                )
+                # a daemonic process (e.g. a worker of `multiprocessing_wrapper`) can't start the workers of the pool
+                if (
+                    FACTOR_COSTEER_SETTINGS.execution_mode == "worker_pool"
+                    and self.target_task.version == 1
+                    and not mp.current_process().daemon
+                ):
+                    success, output = get_factor_worker_pool(FACTOR_COSTEER_SETTINGS.worker_pool_size).run(
+                        execution_code_path,
+                        cwd=self.workspace_path,
+                        data_folder=source_data_path,
+                        timeout=FACTOR_COSTEER_SETTINGS.file_based_execution_timeout,
+                    )
+                    if not success:
+                        raise subprocess.CalledProcessError(1, str(execution_code_path), output=output.encode())
+                else:
+                    subprocess.check_output(
+                        f"{FACTOR_COSTEER_SETTINGS.python_bin} {execution_code_path}",
+                        shell=True,
+                        cwd=self.workspace_path,
+                        stderr=subprocess.STDOUT,
+                        timeout=FACTOR_COSTEER_SETTINGS.file_based_execution_timeout,
+                    )
                 execution_success = True
             except subprocess.CalledProcessError as e:
                 import site
@@ -209,6 +263,8 @@ class FactorFBWorkspace(FBWorkspace):
 
         return execution_feedback, executed_factor_value_dataframe
 
+    _execute_with_pickle_cache = cache_with_pickle(hash_func)(_execute)
+
     def __str__(self) -> str:
         # NOTE:
         # If the code cache works, the workspace will be None.
@@ -0,0 +1,152 @@
+"""
+A columnar cache of the factor values computed by `FactorFBWorkspace.execute`.
+
+Every entry is an uncompressed Arrow IPC file `<root>/<xx>/<key>.arrow` holding the index columns
+(e.g. datetime, instrument) and the factor columns; the execution feedback is kept in the schema metadata.
+
+- Reading memory-maps the file (copy-on-write). Numeric columns without nulls are wrapped by pandas without
+  copying, so loading many factors only pays for the pages which are actually touched, and the values stay writable.
+- `columns` projects the factor columns; the other columns are never read.
+- NaN is kept as NaN (not converted to null), which keeps float columns zero-copy.
+- The store lives in the pickle cache folder and shares its size budget: the mtime of an entry is its last access
+  time and the least recently used entries are evicted by `PickleCacheManager` along with the pickles.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Iterable
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from filelock import FileLock
+
+from rdagent.core.conf import RD_AGENT_SETTINGS
+from rdagent.core.utils import PickleCacheManager, get_pickle_cache_manager
+
+_META_KEY = b"rdagent"
+
+
+class FactorValueStore:
+
+    def __init__(self, root: str | Path, cache_manager: PickleCacheManager | None = None) -> None:
+        """`cache_manager` is told about the written bytes, so the entries are evicted within its budget."""
+        self.root = Path(root)
+        self.cache_manager = cache_manager
+
+    def _path(self, key: str, suffix: str = ".arrow") -> Path:
+        return self.root / key[:2] / f"{key}{suffix}"
+
+    def lock(self, key: str) -> FileLock:
+        path = self._path(key, ".lock")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return FileLock(path)
+
+    @staticmethod
+    def _to_table(feedback: str, df: pd.DataFrame | None) -> pa.Table:
+        meta: dict[str, Any] = {"feedback": feedback, "has_value": df is not None}
+        arrays, names = [], []
+        if df is not None:
+            if not df.columns.is_unique:
+                raise ValueError("duplicated columns")
+            meta["index_names"] = list(df.index.names)
+            meta["columns"] = df.columns.tolist()
+            for i in range(df.index.nlevels):
+                arrays.append(pa.array(df.index.get_level_values(i)))
+                names.append(f"__index_{i}")
+            for i in range(df.shape[1]):
+                arrays.append(pa.array(df.iloc[:, i].to_numpy(), from_pandas=False))  # keep NaN as NaN
+                names.append(f"__col_{i}")
+        return pa.table(arrays, names=names, metadata={_META_KEY: json.dumps(meta)})
+
+    def set(self, key: str, feedback: str, df: pd.DataFrame | None) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            table = self._to_table(feedback, df)
+        except (pa.ArrowException, TypeError, ValueError):
+            # e.g. object columns mixing types or column names which are not json serializable; keep them as pickle
+            pkl_path = self._path(key, ".pkl")
+            tmp_path = pkl_path.with_name(f"{pkl_path.name}.{os.getpid()}.tmp")
+            with tmp_path.open("wb") as f:
+                pickle.dump((feedback, df), f)
+                size = f.tell()
+            os.replace(tmp_path, pkl_path)
+        else:
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with pa.OSFile(str(tmp_path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            size = tmp_path.stat().st_size
+            os.replace(tmp_path, path)
+        if self.cache_manager is not None:
+            self.cache_manager.add_written(size)
+
+    @staticmethod
+    def _column_to_numpy(col: pa.ChunkedArray, base: np.ndarray) -> np.ndarray:
+        if (
+            col.num_chunks == 1
+            and col.null_count == 0
+            and (pa.types.is_floating(col.type) or pa.types.is_integer(col.type))
+        ):
+            # a view of the copy-on-write mapping (`Array.to_numpy` would give a read-only array)
+            chunk = col.chunk(0)
+            dtype = np.dtype(col.type.to_pandas_dtype())
+            start = chunk.buffers()[1].address - base.ctypes.data + chunk.offset * dtype.itemsize
+            return base[start : start + len(chunk) * dtype.itemsize].view(dtype)
+        return col.to_numpy()
+
+    def get(self, key: str, columns: Iterable[Any] | None = None) -> tuple[bool, str | None, pd.DataFrame | None]:
+        """
+        Parameters
+        ----------
+        columns :
+            the factor columns to load; None means all of them
+
+        Returns
+        -------
+        (hit, execution feedback, factor value dataframe)
+        """
+        path = self._path(key)
+        try:
+            with path.open("rb") as f:
+                base = np.frombuffer(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY), dtype=np.uint8)
+                os.utime(f.fileno())  # the entry is recently used
+        except FileNotFoundError:
+            pkl_path = self._path(key, ".pkl")
+            try:
+                with pkl_path.open("rb") as f:
+                    feedback, df = pickle.load(f)
+                    os.utime(f.fileno())
+            except FileNotFoundError:
+                return False, None, None
+            return True, feedback, df if columns is None or df is None else df[list(columns)]
+
+        table = pa.ipc.open_file(pa.py_buffer(base)).read_all()
+        meta = json.loads(table.schema.metadata[_META_KEY])
+        if not meta["has_value"]:
+            return True, meta["feedback"], None
+
+        index_names = meta["index_names"]
+        index_df = table.select([f"__index_{i}" for i in range(len(index_names))]).to_pandas()
+        if len(index_names) > 1:
+            index = pd.MultiIndex.from_frame(index_df, names=index_names)
+        else:
+            index = pd.Index(index_df.iloc[:, 0], name=index_names[0])
+        all_columns = meta["columns"]
+        selected = range(len(all_columns)) if columns is None else [all_columns.index(c) for c in columns]
+        df = pd.DataFrame(
+            {i: self._column_to_numpy(table.column(f"__col_{i}"), base) for i in selected}, index=index, copy=False
+        )
+        df.columns = [all_columns[i] for i in selected]
+        return True, meta["feedback"], df
+
+
+def get_factor_value_store() -> FactorValueStore:
+    return FactorValueStore(
+        Path(RD_AGENT_SETTINGS.pickle_cache_folder_path_str) / "factor_values", cache_manager=get_pickle_cache_manager()
+    )
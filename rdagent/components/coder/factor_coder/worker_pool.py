@@ -0,0 +1,217 @@
+"""
+Long-lived worker processes to execute factor code, as an alternative to one `python factor.py` subprocess per factor.
+
+- The source data files (e.g. `daily_pv.h5`) read by `pd.read_hdf` are converted once into memory-mapped Arrow files
+  (see `FactorValueStore`). All the workers map the same files, so the data is shared through the page cache and
+  each execution only pays for a copy in memory instead of parsing the HDF5 file again.
+- Every factor is executed as `__main__` with the workspace as the working directory; the output (the file
+  descriptors of stdout & stderr) and the traceback are returned like the output of a failed subprocess.
+- A worker which exceeds the timeout is killed and replaced by a new one.
+
+NOTE: the workers run with the current interpreter (`FACTOR_CoSTEER_python_bin` is not used), and
+the state of imported modules (e.g. random seeds, pandas options) is kept between the factors executed by a worker.
+A daemonic process (e.g. a worker of `multiprocessing_wrapper`) can't start the workers, so `FactorFBWorkspace` runs
+the factors in subprocesses there.
+"""
+
+from __future__ import annotations
+
+import atexit
+import contextlib
+import multiprocessing as mp
+import os
+import queue
+import runpy
+import subprocess
+import sys
+import tempfile
+import traceback
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import IO, Any, Iterator
+
+import pandas as pd
+
+from rdagent.components.coder.factor_coder.factor_value_store import FactorValueStore
+from rdagent.core.conf import RD_AGENT_SETTINGS
+from rdagent.utils import md5_hash
+
+
+class _SourceDataCache:
+    """The `pd.read_hdf` used in the workers; files in the source data folder are loaded from the Arrow store."""
+
+    def __init__(self, store: FactorValueStore) -> None:
+        self.store = store
+        self.frames: dict[str, pd.DataFrame] = {}
+        self.data_folder: Path | None = None
+        self.origin_read_hdf = pd.read_hdf
+
+    def _source_file(self, path: Any) -> Path | None:
+        if self.data_folder is None or not isinstance(path, (str, os.PathLike)):
+            return None
+        path = Path(path).absolute()
+        source = self.data_folder / path.name
+        # the data files are linked into the workspace (symlinks or hardlinks)
+        with contextlib.suppress(OSError):
+            if source.is_file() and os.path.samefile(path, source):
+                return source
+        return None
+
+    def read_hdf(self, path_or_buf: Any, key: Any = None, *args: Any, **kwargs: Any) -> Any:
+        source = self._source_file(path_or_buf)
+        if source is None or args or any((k, v) != ("mode", "r") for k, v in kwargs.items()):
+            return self.origin_read_hdf(path_or_buf, key, *args, **kwargs)
+        st = source.stat()
+        cache_key = md5_hash(f"{source}:{st.st_size}:{st.st_mtime_ns}:{key}")
+        if cache_key not in self.frames:
+            hit, _, df = self.store.get(cache_key)
+            if not hit:
+                with self.store.lock(cache_key):
+                    hit, _, df = self.store.get(cache_key)
+                    if not hit:
+                        df = self.origin_read_hdf(source, key)
+                        self.store.set(cache_key, str(source), df)
+            self.frames[cache_key] = df
+        df = self.frames[cache_key]
+        return df.copy() if isinstance(df, (pd.DataFrame, pd.Series)) else df
+
+
+def _flush_std() -> None:
+    for f in (sys.stdout, sys.stderr):
+        with contextlib.suppress(Exception):  # e.g. closed by the factor code
+            f.flush()
+
+
+@contextlib.contextmanager
+def _redirect_fds(file: IO[bytes]) -> Iterator[None]:
+    """
+    Redirect the file descriptors 1 & 2 to `file`, so the output of the C extensions and of the child processes is
+    captured like the output of a subprocess.
+    """
+    _flush_std()
+    saved = [os.dup(fd) for fd in (1, 2)]
+    try:
+        for fd in (1, 2):
+            os.dup2(file.fileno(), fd)
+        yield
+    finally:
+        _flush_std()
+        for fd, saved_fd in zip((1, 2), saved):
+            os.dup2(saved_fd, fd)
+            os.close(saved_fd)
+
+
+def _run_factor(cache: _SourceDataCache, code_path: str, cwd: str, data_folder: str) -> tuple[bool, str]:
+    success = True
+    origin_cwd, origin_sys_path = os.getcwd(), list(sys.path)
+    cache.data_folder = Path(data_folder).absolute()
+    with tempfile.TemporaryFile() as output:
+        try:
+            os.chdir(cwd)
+            sys.path.insert(0, cwd)
+            with _redirect_fds(output):
+                try:
+                    runpy.run_path(code_path, run_name="__main__")
+                except SystemExit as e:
+                    success = e.code in (None, 0)
+                except BaseException:  # noqa: BLE001
+                    traceback.print_exc()
+                    success = False
+        finally:
+            os.chdir(origin_cwd)
+            sys.path[:] = origin_sys_path
+            cache.data_folder = None
+        output.seek(0)
+        return success, output.read().decode(errors="replace")
+
+
+def _worker_main(conn: Connection, store_root: str) -> None:
+    cache = _SourceDataCache(FactorValueStore(store_root))
+    pd.read_hdf = cache.read_hdf
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        conn.send(_run_factor(cache, *task))
+
+
+class FactorWorkerPool:
+
+    def __init__(self, size: int = 1) -> None:
+        self.size = size
+        self._ctx = mp.get_context("spawn")
+        self._idle: queue.Queue[tuple[Any, Connection]] = queue.Queue()
+        self._workers: list[tuple[Any, Connection]] = []
+        for _ in range(size):
+            self._idle.put(self._start_worker())
+
+    def _start_worker(self) -> tuple[Any, Connection]:
+        parent_conn, child_conn = self._ctx.Pipe()
+        store_root = Path(RD_AGENT_SETTINGS.pickle_cache_folder_path_str) / "factor_source_data"
+        process = self._ctx.Process(target=_worker_main, args=(child_conn, str(store_root)))
+        process.daemon = True
+        process.start()
+        child_conn.close()
+        self._workers.append((process, parent_conn))
+        return process, parent_conn
+
+    def _replace_worker(self, worker: tuple[Any, Connection]) -> tuple[Any, Connection]:
+        process, conn = worker
+        process.kill()
+        process.join()
+        conn.close()
+        self._workers.remove(worker)
+        return self._start_worker()
+
+    def run(self, code_path: Path, cwd: Path, data_folder: Path, timeout: float) -> tuple[bool, str]:
+        """
+        Execute `code_path` in a worker.
+
+        Returns
+        -------
+        (whether it succeeded, the output)
+
+        Raises
+        ------
+        subprocess.TimeoutExpired
+            if the execution exceeds `timeout` seconds
+        """
+        worker = self._idle.get()
+        try:
+            process, conn = worker
+            conn.send((str(code_path), str(cwd), str(data_folder)))
+            if not conn.poll(timeout):
+                worker = self._replace_worker(worker)
+                raise subprocess.TimeoutExpired(str(code_path), timeout)
+            try:
+                return conn.recv()
+            except EOFError:  # e.g. the factor code crashed the interpreter
+                worker = self._replace_worker(worker)
+                return False, f"The worker executing {code_path.name} exited with code {process.exitcode}."
+        finally:
+            self._idle.put(worker)
+
+    def close(self) -> None:
+        for process, conn in self._workers:
+            with contextlib.suppress(OSError):
+                conn.send(None)
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
+            conn.close()
+        self._workers.clear()
+
+
+_POOL: FactorWorkerPool | None = None
+
+
+def get_factor_worker_pool(size: int) -> FactorWorkerPool:
+    """Create (or get) the worker pool of this process."""
+    global _POOL
+    if _POOL is None:
+        _POOL = FactorWorkerPool(size)
+        atexit.register(_POOL.close)
+    return _POOL
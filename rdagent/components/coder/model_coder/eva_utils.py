@@ -73,25 +73,18 @@ class ModelCodeEvaluator(CoSTEEREvaluator):
                 else "No scenario description."
             )
         )
-        execution_feedback_to_render = model_execution_feedback
-        for _ in range(10):  # 10 times to split the content is enough
-            user_prompt = T(".prompts:evaluator_code_feedback.user").r(
+        # keep the tail of the execution feedback which fits the token limit
+        user_prompt = APIBackend().build_messages_and_fit_content(
+            lambda execution_feedback_to_render: T(".prompts:evaluator_code_feedback.user").r(
                 model_information=model_task_information,
                 code=code,
                 model_execution_feedback=execution_feedback_to_render,
                 model_value_feedback=model_value_feedback,
                 gt_code=gt_implementation.all_codes if gt_implementation else None,
-            )
-            if (
-                APIBackend().build_messages_and_calculate_token(
-                    user_prompt=user_prompt,
-                    system_prompt=system_prompt,
-                )
-                > APIBackend().chat_token_limit
-            ):
-                execution_feedback_to_render = execution_feedback_to_render[len(execution_feedback_to_render) // 2 :]
-            else:
-                break
+            ),
+            model_execution_feedback,
+            system_prompt=system_prompt,
+        )
 
         critic_response = APIBackend().build_messages_and_create_chat_completion(
             user_prompt=user_prompt,
@@ -126,27 +119,18 @@ class ModelFinalEvaluator(CoSTEEREvaluator):
             )
         )
 
-        execution_feedback_to_render = model_execution_feedback
-
-        for _ in range(10):  # 10 times to split the content is enough
-            user_prompt = T(".prompts:evaluator_final_feedback.user").r(
+        # keep the tail of the execution feedback which fits the token limit
+        user_prompt = APIBackend().build_messages_and_fit_content(
+            lambda execution_feedback_to_render: T(".prompts:evaluator_final_feedback.user").r(
                 model_information=target_task.get_task_information(),
                 model_execution_feedback=execution_feedback_to_render,
                 model_shape_feedback=model_shape_feedback,
                 model_code_feedback=model_code_feedback,
                 model_value_feedback=model_value_feedback,
-            )
-
-            if (
-                APIBackend().build_messages_and_calculate_token(
-                    user_prompt=user_prompt,
-                    system_prompt=system_prompt,
-                )
-                > APIBackend().chat_token_limit
-            ):
-                execution_feedback_to_render = execution_feedback_to_render[len(execution_feedback_to_render) // 2 :]
-            else:
-                break
+            ),
+            model_execution_feedback,
+            system_prompt=system_prompt,
+        )
 
         final_evaluation_dict = json.loads(
             APIBackend().build_messages_and_create_chat_completion(
@@ -8,7 +8,7 @@ from typing import Any, NoReturn
 
 from rdagent.components.knowledge_management.vector_base import (
     KnowledgeMetaData,
-    PDVectorBase,
+    MatrixVectorBase,
     VectorBase,
     cosine,
 )
@@ -111,7 +111,7 @@ class UndirectedGraph(Graph):
     """
 
     def __init__(self, path: str | Path | None = None) -> None:
-        self.vector_base: VectorBase = PDVectorBase()
+        self.vector_base: VectorBase = MatrixVectorBase()
         super().__init__(path=path)
 
     def __str__(self) -> str:
@@ -313,7 +313,7 @@ class UndirectedGraph(Graph):
 
     def clear(self) -> None:
         self.nodes.clear()
-        self.vector_base: VectorBase = PDVectorBase()
+        self.vector_base: VectorBase = MatrixVectorBase()
 
     def query_by_node(
         self,
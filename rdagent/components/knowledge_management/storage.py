@@ -0,0 +1,467 @@
+"""
+An on-disk format for knowledge bases built on `UndirectedGraph` + `MatrixVectorBase`
+(e.g. `CoSTEERKnowledgeBaseV2`), as an alternative to pickling the whole object.
+
+Layout of the store folder::
+
+    manifest.json     committed length of every file below and the epoch of the store, which changes whenever
+                      the store is rewritten as a whole; it is written last and atomically
+    nodes.pkl         stream of node records (id, label, content, appendix, row)
+    edges.pkl         stream of (node_id, node_id) pairs
+    rows.pkl          stream of vector base row records (id, label, content, trunk, norm)
+    embeddings.npy    float32 (n_rows, dim) normalized vectors, opened with `mmap_mode="r"` when loading
+    kb_append.pkl     journal of ("dict" | "list", attribute, key, value) of the append-only attributes of
+                      the knowledge base
+    kb_state.pkl      the other attributes of the knowledge base, rewritten on every save
+
+- Loading reads the metadata only; the embeddings stay in the page cache and are shared by all the
+  processes loading the same store.
+- Saving appends what was added since the last load/refresh/save of the same knowledge base object.
+  Bytes after the committed length (e.g. from an interrupted save) are ignored and overwritten later.
+  If others have appended since then, their records are replayed first and the local changes are appended after
+  them. Saving another knowledge base object (or a cleared one) rewrites the store under a new epoch; the local
+  changes of a knowledge base of an older epoch are merged into the rewritten store.
+- `refresh` replays only the records appended by others since the last load/refresh/save, so processes sharing
+  a store exchange deltas instead of unpickling and pickling the whole knowledge base. A new epoch reloads the store.
+- Loading, refreshing and saving hold the lock file `<store folder>.lock`, so the store is never read while it is
+  being written or rewritten.
+- An object journaled twice (e.g. the same knowledge in a dict and in a list) is stored once and referenced later,
+  so the identity between the attributes is kept.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import pickle
+import shutil
+import struct
+import uuid
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterator
+
+import numpy as np
+from filelock import FileLock
+
+from rdagent.components.knowledge_management.graph import (
+    UndirectedGraph,
+    UndirectedNode,
+)
+from rdagent.components.knowledge_management.vector_base import (
+    MatrixVectorBase,
+    PDVectorBase,
+)
+from rdagent.core.knowledge_base import KnowledgeBase
+from rdagent.core.utils import import_class
+from rdagent.log import rdagent_logger as logger
+
+_NPY_HEADER_LEN = 128
+_STREAMS = ("nodes", "edges", "rows", "kb_append")
+
+
+def _npy_header(shape: tuple[int, int]) -> bytes:
+    """A fixed-length `.npy` (v1.0) header, so the shape can be updated in place when rows are appended."""
+    magic = b"\x93NUMPY\x01\x00"
+    header = repr({"descr": "<f4", "fortran_order": False, "shape": shape}).encode("latin1")
+    pad = _NPY_HEADER_LEN - len(magic) - 2 - len(header) - 1
+    return magic + struct.pack("<H", _NPY_HEADER_LEN - len(magic) - 2) + header + b" " * pad + b"\n"
+
+
+def _to_matrix_vector_base(vb: Any) -> MatrixVectorBase:
+    if isinstance(vb, MatrixVectorBase):
+        return vb
+    mvb = MatrixVectorBase()
+    if isinstance(vb, PDVectorBase) and vb.vector_df.shape[0]:
+        df = vb.vector_df
+        rows = df[["id", "label", "content", "trunk"]].to_dict("records")
+        mvb._append_rows(df["embedding"].to_list(), rows)  # noqa: SLF001
+    return mvb
+
+
+class KnowledgeGraphStore:
+
+    def __init__(
+        self, path: str | Path, append_only_attrs: tuple[str, ...] = (), append_only_list_attrs: tuple[str, ...] = ()
+    ) -> None:
+        """
+        Parameters
+        ----------
+        path :
+            the folder of the store
+        append_only_attrs :
+            dict attributes of the knowledge base which only get new keys (the values of existing keys never change).
+            Only their new items are appended on saving.
+        append_only_list_attrs :
+            dict attributes of the knowledge base whose values are lists which only get new items at the end.
+            Only their new items are appended on saving.
+        """
+        self.path = Path(path)
+        self.append_only_attrs = append_only_attrs
+        self.append_only_list_attrs = append_only_list_attrs
+        self._kb: KnowledgeBase | None = None  # the knowledge base which is in sync with the disk
+        self._lock = FileLock(self.path.with_name(f"{self.path.name}.lock"))  # reentrant, e.g. `refresh` -> `load`
+        self._manifest: dict[str, Any] = {}
+        self._reset_journal()
+
+    def _reset_journal(self) -> None:
+        self._edges: set[tuple[str, str]] = set()
+        self._appended_keys: dict[str, set] = {attr: set() for attr in self.append_only_attrs}
+        self._appended_lens: dict[str, dict[Any, int]] = {attr: {} for attr in self.append_only_list_attrs}
+        # the journaled objects; later records refer to them by their index
+        self._objs: list[Any] = []
+        self._obj_index: dict[int, int] = {}
+
+    def _register(self, obj: Any) -> None:
+        if id(obj) not in self._obj_index:
+            self._obj_index[id(obj)] = len(self._objs)
+            self._objs.append(obj)  # keep a reference so that the id is never reused
+
+    @staticmethod
+    def is_store(path: str | Path | None) -> bool:
+        return path is not None and (Path(path) / "manifest.json").exists()
+
+    def _pickler(self, f: BinaryIO, graph: UndirectedGraph) -> pickle.Pickler:
+        pickler = pickle.Pickler(f)
+
+        def persistent_id(obj: Any) -> str | tuple[str, int] | None:
+            # nodes are stored in nodes.pkl and journaled objects in kb_append.pkl; other records only keep references
+            if isinstance(obj, UndirectedNode) and graph.nodes.get(obj.id) is obj:
+                return obj.id
+            if (i := self._obj_index.get(id(obj))) is not None:
+                return ("obj", i)
+            return None
+
+        pickler.persistent_id = persistent_id  # type: ignore[method-assign]
+        return pickler
+
+    def _iter_records(self, name: str, graph: UndirectedGraph | None = None, start: int = 0) -> Iterator[Any]:
+        """the records of stream `name` between `start` and the committed length"""
+        end = self._manifest[name]
+        file = self.path / f"{name}.pkl"
+        if end <= start or not file.exists():
+            return
+        with file.open("rb") as f:
+            f.seek(start)
+            data = io.BytesIO(f.read(end - start))
+        unpickler = pickle.Unpickler(data)
+        if graph is not None:
+            unpickler.persistent_load = self._persistent_load(graph)  # type: ignore[method-assign,assignment]
+        while data.tell() < end - start:
+            yield unpickler.load()
+
+    def _persistent_load(self, graph: UndirectedGraph) -> Callable[[Any], Any]:
+        return lambda pid: graph.nodes[pid] if isinstance(pid, str) else self._objs[pid[1]]
+
+    def _replay(
+        self, kb: KnowledgeBase, old: dict[str, Any], local_nodes: dict[str, UndirectedNode] | None = None
+    ) -> None:
+        """
+        apply the records between the `old` manifest and the current one to `kb`;
+        the nodes in `local_nodes` are reused instead of creating new ones for the same ids
+        """
+        graph = kb.graph
+        vb = graph.vector_base
+        n_rows, dim = self._manifest["n_rows"], self._manifest["dim"]
+
+        # 1) vector base
+        if n_rows:
+            vb.matrix = np.load(self.path / "embeddings.npy", mmap_mode="r")[:n_rows]
+        else:
+            vb.matrix = np.zeros((0, dim), dtype=np.float32)
+        rows = list(self._iter_records("rows", start=old["rows"]))
+        vb.norms = np.concatenate([vb.norms[: old["n_rows"]], np.asarray([r.pop("norm") for r in rows], np.float32)])
+        del vb.rows[old["n_rows"] :]
+        for i, row in enumerate(rows, start=old["n_rows"]):
+            vb.label_index.setdefault(row["label"], []).append(i)
+        vb.rows.extend(rows)
+        vb.size = n_rows
+
+        # 2) graph
+        local_nodes = local_nodes or {}
+        for node_id, label, content, appendix, row_id in self._iter_records("nodes", start=old["nodes"]):
+            if (node := graph.nodes.get(node_id, local_nodes.get(node_id))) is None:
+                node = UndirectedNode(
+                    content=content,
+                    label=label,
+                    embedding=vb.matrix[row_id] if row_id >= 0 else None,
+                    appendix=appendix,
+                )
+                node.id = node_id
+            graph.nodes[node_id] = node
+        for a, b in self._iter_records("edges", start=old["edges"]):
+            self._edges.add((a, b))
+            graph.nodes[a].add_neighbor(graph.nodes[b])
+
+        # 3) knowledge base attributes
+        for record in self._iter_records("kb_append", graph, start=old["kb_append"]):
+            kind, attr, key, value = record if len(record) == 4 else ("dict", *record)
+            if kind == "dict":
+                kb.__dict__.setdefault(attr, {})[key] = value
+                self._appended_keys.setdefault(attr, set()).add(key)
+            else:
+                kb.__dict__.setdefault(attr, {}).setdefault(key, []).append(value)
+                lens = self._appended_lens.setdefault(attr, {})
+                lens[key] = lens.get(key, 0) + 1
+            self._register(value)
+        with (self.path / "kb_state.pkl").open("rb") as f:
+            unpickler = pickle.Unpickler(f)
+            unpickler.persistent_load = self._persistent_load(graph)  # type: ignore[method-assign,assignment]
+            kb.__dict__.update(unpickler.load())
+        kb.graph = graph
+        self._kb = kb
+
+    def load(self) -> KnowledgeBase:
+        with self._lock:
+            return self._load()
+
+    def _load(self) -> KnowledgeBase:
+        self._manifest = json.loads((self.path / "manifest.json").read_text())
+        self._reset_journal()
+        graph = UndirectedGraph()
+        graph.path = Path(self._manifest["graph_path"]) if self._manifest["graph_path"] else None
+        graph.vector_base = MatrixVectorBase()
+        kb_cls = import_class(self._manifest["kb_class"])
+        kb = kb_cls.__new__(kb_cls)
+        for attr in (*self.append_only_attrs, *self.append_only_list_attrs):
+            kb.__dict__[attr] = {}
+        kb.graph = graph
+        self._replay(kb, {name: 0 for name in _STREAMS} | {"n_rows": 0})
+        return kb
+
+    def refresh(self, kb: KnowledgeBase | None) -> KnowledgeBase:
+        """
+        Bring `kb` up to date with the store.
+        If `kb` is the knowledge base loaded/saved last time and it has not been changed since then,
+        only the records appended by others are replayed; otherwise, the store is loaded again.
+        """
+        if not self.is_store(self.path):
+            raise FileNotFoundError(f"{self.path} is not a knowledge graph store")
+        with self._lock:
+            return self._refresh(kb)
+
+    def _refresh(self, kb: KnowledgeBase | None) -> KnowledgeBase:
+        manifest = json.loads((self.path / "manifest.json").read_text())
+        graph = getattr(kb, "graph", None)
+        if (
+            kb is None
+            or kb is not self._kb
+            or not isinstance(graph, UndirectedGraph)
+            or not isinstance(graph.vector_base, MatrixVectorBase)
+            # changed locally since the last sync
+            or graph.vector_base.size != self._manifest["n_rows"]
+            or len(graph.nodes) != self._manifest["n_nodes"]
+            # rewritten by others
+            or manifest.get("epoch") != self._manifest.get("epoch")
+            or any(manifest[name] < self._manifest[name] for name in (*_STREAMS, "n_rows", "n_nodes"))
+        ):
+            return self.load()
+        old, self._manifest = self._manifest, manifest
+        self._replay(kb, old)
+        return kb
+
+    def _append(self, name: str, records: list[Any], graph: UndirectedGraph) -> None:
+        file = self.path / f"{name}.pkl"
+        with file.open("r+b" if file.exists() else "wb") as f:
+            f.seek(self._manifest[name])
+            f.truncate()
+            pickler = self._pickler(f, graph)
+            for record in records:
+                pickler.dump(record)
+                pickler.clear_memo()  # every record must be loadable on its own
+            self._manifest[name] = f.tell()
+
+    def _append_journal(self, records: list[tuple[str, str, Any, Any]], graph: UndirectedGraph) -> None:
+        file = self.path / "kb_append.pkl"
+        with file.open("r+b" if file.exists() else "wb") as f:
+            f.seek(self._manifest["kb_append"])
+            f.truncate()
+            pickler = self._pickler(f, graph)
+            for record in records:
+                pickler.dump(record)
+                pickler.clear_memo()  # every record must be loadable on its own
+                self._register(record[-1])  # the later records refer to it
+            self._manifest["kb_append"] = f.tell()
+
+    def _rebase(self, kb: KnowledgeBase, manifest: dict[str, Any], rewritten: bool = False) -> None:
+        """
+        replay the records appended by others (up to `manifest`) into `kb`, which may have been changed locally since
+        the last sync; the local changes are kept after the replayed records, so the next append writes them only.
+        If the store was `rewritten` by others, the synced part of `kb` is replaced by the whole rewritten store.
+        """
+        graph, vb = kb.graph, kb.graph.vector_base
+        n_rows = self._manifest["n_rows"]
+
+        # 1) detach the local changes
+        local_matrix, local_norms = np.array(vb.matrix[n_rows : vb.size]), np.array(vb.norms[n_rows : vb.size])
+        local_rows = vb.rows[n_rows : vb.size]
+        for ids in vb.label_index.values():
+            ids[:] = [i for i in ids if i < n_rows]
+        # the approximate index covers local rows, which are moved after the rows of others
+        if vb._ivf_size > n_rows:  # noqa: SLF001
+            vb._ivf_centroids, vb._ivf_lists, vb._ivf_size = None, [], 0  # noqa: SLF001
+        nodes = list(graph.nodes.items())
+        graph.nodes = dict(nodes[: self._manifest["n_nodes"]])
+        local_nodes = dict(nodes[self._manifest["n_nodes"] :])
+        local_keys = {}
+        for attr in self.append_only_attrs:
+            values = kb.__dict__.setdefault(attr, {})
+            appended = self._appended_keys.setdefault(attr, set())
+            local_keys[attr] = {k: values.pop(k) for k in list(values) if k not in appended}
+        local_items = {}
+        for attr in self.append_only_list_attrs:
+            lens = self._appended_lens.setdefault(attr, {})
+            local_items[attr] = {}
+            for key, values in kb.__dict__.setdefault(attr, {}).items():
+                local_items[attr][key] = values[lens.get(key, 0) :]
+                del values[lens.get(key, 0) :]
+        journaled = {"graph", *self.append_only_attrs, *self.append_only_list_attrs}
+        state = {k: v for k, v in kb.__dict__.items() if k not in journaled}
+        old = self._manifest
+        if rewritten:
+            # the synced part belongs to the old epoch
+            synced_matrix, synced_norms, synced_rows = vb.matrix, vb.norms, vb.rows[:n_rows]
+            synced_nodes = dict(nodes[: self._manifest["n_nodes"]])
+            vb.rows, vb.norms, vb.label_index = [], np.zeros(0, dtype=np.float32), {}
+            vb._ivf_centroids, vb._ivf_lists, vb._ivf_size = None, [], 0  # noqa: SLF001
+            graph.nodes = {}
+            for attr in (*self.append_only_attrs, *self.append_only_list_attrs):
+                kb.__dict__[attr] = {}
+            old = {name: 0 for name in _STREAMS} | {"n_rows": 0}
+            self._reset_journal()
+
+        # 2) replay the records of others
+        self._manifest = manifest
+        self._replay(kb, old, local_nodes)
+        if rewritten:
+            # the nodes of the old epoch linked to the local ones are carried over if the rewritten store lacks them
+            for node in list(local_nodes.values()):
+                for neighbor in node.neighbors:
+                    if neighbor.id in graph.nodes or neighbor.id in local_nodes:
+                        continue
+                    if synced_nodes.get(neighbor.id) is neighbor:
+                        local_nodes[neighbor.id] = neighbor
+                        ids = [i for i, row in enumerate(synced_rows) if row["id"] == neighbor.id]
+                        local_matrix = np.concatenate(
+                            [local_matrix.reshape(-1, synced_matrix.shape[1]), synced_matrix[ids]]
+                        )
+                        local_norms = np.concatenate([local_norms, synced_norms[ids]])
+                        local_rows += [synced_rows[i] for i in ids]
+
+        # 3) attach the local changes again
+        vb.matrix = np.concatenate([vb.matrix, local_matrix.reshape(-1, vb.matrix.shape[1])])
+        vb.norms = np.concatenate([vb.norms, local_norms])
+        for i, row in enumerate(local_rows, start=vb.size):
+            vb.label_index.setdefault(row["label"], []).append(i)
+        vb.rows.extend(local_rows)
+        vb.size += len(local_rows)
+        for node_id, node in local_nodes.items():
+            graph.nodes.setdefault(node_id, node)
+        if rewritten:
+            # the links to the nodes of the old epoch are moved to the nodes of the same ids, if any
+            for node in local_nodes.values():
+                neighbors, node.neighbors = node.neighbors, set()
+                for neighbor in neighbors:
+                    if (target := graph.nodes.get(neighbor.id)) is not None:
+                        node.add_neighbor(target)
+        for attr, items in local_keys.items():
+            for key, value in items.items():
+                kb.__dict__[attr].setdefault(key, value)  # the value of others is kept for the same key
+        for attr, items in local_items.items():
+            for key, values in items.items():
+                kb.__dict__[attr].setdefault(key, []).extend(values)
+        kb.__dict__.update(state)
+
+    def save(self, kb: KnowledgeBase) -> None:
+        graph = getattr(kb, "graph", None)
+        if not isinstance(graph, UndirectedGraph):
+            raise TypeError(f"{type(kb).__name__} has no UndirectedGraph, it can't be saved by {type(self).__name__}")
+        graph.vector_base = vb = _to_matrix_vector_base(graph.vector_base)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._save(kb, graph, vb)
+
+    def _save(self, kb: KnowledgeBase, graph: UndirectedGraph, vb: MatrixVectorBase) -> None:
+        if (
+            kb is not self._kb
+            or not self.is_store(self.path)
+            or vb.size < self._manifest["n_rows"]
+            or len(graph.nodes) < self._manifest["n_nodes"]  # the graph is cleared
+        ):
+            # the disk is not in sync with the knowledge base; rewrite everything under a new epoch
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path.mkdir(parents=True)
+            self._manifest = {name: 0 for name in _STREAMS} | {"n_rows": 0, "n_nodes": 0, "epoch": uuid.uuid4().hex}
+            self._reset_journal()
+        elif (manifest := json.loads((self.path / "manifest.json").read_text())) != self._manifest:
+            # others have saved since the last sync
+            rewritten = manifest.get("epoch") != self._manifest.get("epoch")
+            if rewritten:
+                logger.warning(
+                    f"{self.path} was rewritten by others since the last load/refresh/save; "
+                    "the local changes are merged into the rewritten store."
+                )
+            self._rebase(kb, manifest, rewritten)
+        self._manifest["kb_class"] = f"{type(kb).__module__}.{type(kb).__qualname__}"
+        self._manifest["graph_path"] = str(graph.path) if graph.path is not None else None
+
+        # 1) embeddings: append the new rows, then update the shape in the header
+        n_rows = self._manifest["n_rows"]
+        dim = vb.matrix.shape[1]
+        emb_file = self.path / "embeddings.npy"
+        with emb_file.open("r+b" if emb_file.exists() else "wb") as f:
+            f.seek(_NPY_HEADER_LEN + n_rows * dim * 4)
+            f.write(np.ascontiguousarray(vb.matrix[n_rows : vb.size], dtype="<f4").tobytes())
+            f.seek(0)
+            f.write(_npy_header((vb.size, dim)))
+        self._append(
+            "rows",
+            [{**row, "norm": float(vb.norms[i])} for i, row in enumerate(vb.rows[n_rows : vb.size], start=n_rows)],
+            graph,
+        )
+
+        # 2) graph
+        first_row = {}
+        for i, row in enumerate(vb.rows[: vb.size]):
+            first_row.setdefault(row["id"], i)
+        new_nodes = list(graph.nodes.values())[self._manifest["n_nodes"] :]
+        self._append(
+            "nodes",
+            [(n.id, n.label, n.content, getattr(n, "appendix", None), first_row.get(n.id, -1)) for n in new_nodes],
+            graph,
+        )
+        new_edges = []
+        for node in graph.nodes.values():
+            for neighbor in node.neighbors:
+                edge = (node.id, neighbor.id) if node.id < neighbor.id else (neighbor.id, node.id)
+                if edge not in self._edges:
+                    self._edges.add(edge)
+                    new_edges.append(edge)
+        self._append("edges", new_edges, graph)
+
+        # 3) knowledge base attributes
+        new_records = []
+        for attr in self.append_only_attrs:
+            appended = self._appended_keys.setdefault(attr, set())
+            for key, value in getattr(kb, attr, {}).items():
+                if key not in appended:
+                    appended.add(key)
+                    new_records.append(("dict", attr, key, value))
+        for attr in self.append_only_list_attrs:
+            lens = self._appended_lens.setdefault(attr, {})
+            for key, values in getattr(kb, attr, {}).items():
+                new_records.extend(("list", attr, key, value) for value in values[lens.get(key, 0) :])
+                lens[key] = len(values)
+        self._append_journal(new_records, graph)
+        journaled = {"graph", *self.append_only_attrs, *self.append_only_list_attrs}
+        state = {k: v for k, v in kb.__dict__.items() if k not in journaled}
+        with (self.path / "kb_state.pkl.tmp").open("wb") as f:
+            self._pickler(f, graph).dump(state)
+        os.replace(self.path / "kb_state.pkl.tmp", self.path / "kb_state.pkl")
+
+        # 4) commit
+        self._manifest["n_rows"], self._manifest["dim"] = vb.size, dim
+        self._manifest["n_nodes"] = len(graph.nodes)
+        (self.path / "manifest.json.tmp").write_text(json.dumps(self._manifest))
+        os.replace(self.path / "manifest.json.tmp", self.path / "manifest.json")
+        self._kb = kb
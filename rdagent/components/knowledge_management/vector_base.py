@@ -1,7 +1,9 @@
+import os
 import uuid
 from pathlib import Path
-from typing import List, Tuple, Union
+from typing import Any, List, Tuple, Union
 
+import numpy as np
 import pandas as pd
 from scipy.spatial.distance import cosine
 
@@ -230,3 +232,217 @@ class PDVectorBase(VectorBase):
             docs.append(Document().from_dict(similar_docs.to_dict()))
 
         return docs, searched_similarities.to_list()
+
+
+class MatrixVectorBase(VectorBase):
+    """
+    Implement of VectorBase using a contiguous, pre-normalized float32 matrix.
+
+    It is a drop-in replacement of PDVectorBase (same `add` / `search` / `shape` interface):
+    - `add` appends rows to a matrix with amortized (doubling) growth instead of `pd.concat`.
+    - `search` scores all the candidates with one matrix-vector product and picks top-k by `np.argpartition`.
+    - `constraint_labels` are resolved by a label -> row-ids index instead of filtering a DataFrame.
+    - With `approximate=True`, an IVF (inverted file) index is built by spherical k-means once the base
+      reaches `ivf_min_size` rows, and only the `n_probe` closest lists (plus rows added after the last build)
+      are scored.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = None,
+        approximate: bool = False,
+        n_lists: int | None = None,
+        n_probe: int = 8,
+        ivf_min_size: int = 4096,
+    ):
+        self.approximate = approximate
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.ivf_min_size = ivf_min_size
+
+        self.matrix = np.zeros((0, 0), dtype=np.float32)  # normalized embeddings; only the first `size` rows are valid
+        self.norms = np.zeros(0, dtype=np.float32)
+        self.size = 0
+        self.rows: list[dict[str, Any]] = []  # id, label, content and trunk of each row
+        self.label_index: dict[Any, list[int]] = {}
+
+        self._ivf_centroids: np.ndarray | None = None
+        self._ivf_lists: list[np.ndarray] = []
+        self._ivf_size = 0  # rows in [_ivf_size, size) are not indexed yet and are always scanned
+        super().__init__(path)
+
+    def shape(self):
+        return self.size, 4
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getstate__(self) -> dict:
+        # do not pickle the over-allocated capacity; a matrix memory-mapped from a `.npy` file (e.g. loaded from a
+        # `KnowledgeGraphStore`) is pickled as a reference to the file, so the processes unpickling it map the same
+        # pages instead of getting their own copy
+        state = self.__dict__.copy()
+        matrix = self.matrix[: self.size]
+        if isinstance(matrix, np.memmap) and matrix.filename is not None and os.path.exists(matrix.filename):
+            state["matrix"] = None
+            state["_matrix_file"] = (matrix.filename, os.stat(matrix.filename).st_ino, matrix.shape)
+        else:
+            state["matrix"] = matrix.copy()
+        state["norms"] = self.norms[: self.size].copy()
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        matrix_file = state.pop("_matrix_file", None)
+        self.__dict__.update(state)
+        if matrix_file is not None:
+            filename, inode, (n_rows, dim) = matrix_file
+            if not os.path.exists(filename) or os.stat(filename).st_ino != inode:
+                raise FileNotFoundError(f"The embeddings file {filename} was removed or replaced since it was pickled")
+            self.matrix = np.load(filename, mmap_mode="r")[:n_rows]
+            if self.matrix.shape != (n_rows, dim):
+                raise ValueError(
+                    f"The embeddings file {filename} has {self.matrix.shape} rows, {(n_rows, dim)} expected"
+                )
+
+    def _append_rows(self, embeddings: list, rows: list[dict[str, Any]]) -> None:
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        if self.size == 0 and self.matrix.shape[1] != vectors.shape[1]:
+            self.matrix = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        if vectors.shape[1] != self.matrix.shape[1]:
+            raise ValueError(
+                f"Embedding dimension {vectors.shape[1]} does not match the vector base {self.matrix.shape[1]}"
+            )
+
+        needed = self.size + len(vectors)
+        if needed > self.matrix.shape[0]:
+            capacity = max(needed, 2 * self.matrix.shape[0], 64)
+            matrix = np.zeros((capacity, self.matrix.shape[1]), dtype=np.float32)
+            matrix[: self.size] = self.matrix[: self.size]
+            norms = np.zeros(capacity, dtype=np.float32)
+            norms[: self.size] = self.norms[: self.size]
+            self.matrix, self.norms = matrix, norms
+
+        norms = np.linalg.norm(vectors, axis=1)
+        self.matrix[self.size : needed] = vectors / np.maximum(norms, 1e-12)[:, None]  # zero vectors stay zero
+        self.norms[self.size : needed] = norms
+        for i, row in enumerate(rows, start=self.size):
+            self.label_index.setdefault(row["label"], []).append(i)
+        self.rows.extend(rows)
+        self.size = needed
+
+    def add(self, document: Union[Document, List[Document]]):
+        """
+        add new node to the matrix
+        Parameters
+        ----------
+        document
+
+        Returns
+        -------
+
+        """
+        if isinstance(document, Document):
+            if document.embedding is None:
+                document.create_embedding()
+            row = {"id": document.id, "label": document.label, "content": document.content}
+            rows = [{**row, "trunk": document.content}] + [{**row, "trunk": trunk} for trunk in document.trunks]
+            self._append_rows([document.embedding, *document.trunks_embedding], rows)
+        else:
+            for doc in document:
+                self.add(document=doc)
+
+    def _build_ivf(self, n_iter: int = 10) -> None:
+        """spherical k-means over the valid rows"""
+        data = self.matrix[: self.size]
+        n_lists = min(self.n_lists or int(np.sqrt(self.size)), self.size)
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(self.size, n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, data)
+            norms = np.linalg.norm(sums, axis=1)
+            non_empty = norms > 0
+            centroids[non_empty] = sums[non_empty] / norms[non_empty, None]
+        assign = np.argmax(data @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(n_lists + 1))
+        self._ivf_centroids = centroids
+        self._ivf_lists = [order[bounds[i] : bounds[i + 1]] for i in range(n_lists)]
+        self._ivf_size = self.size
+
+    def _candidate_rows(self, query: np.ndarray, constraint_labels: list[str] | None) -> np.ndarray | None:
+        """Return the row ids to score; None means all the rows."""
+        rows = None
+        if self.approximate and self.size >= self.ivf_min_size:
+            if self._ivf_centroids is None or self.size > 2 * self._ivf_size:
+                self._build_ivf()
+            probe = np.argsort(-(self._ivf_centroids @ query))[: self.n_probe]
+            rows = np.concatenate([*(self._ivf_lists[i] for i in probe), np.arange(self._ivf_size, self.size)])
+        if constraint_labels is not None:
+            label_rows = [np.asarray(self.label_index.get(label, []), dtype=np.int64) for label in constraint_labels]
+            label_rows_arr = np.unique(np.concatenate(label_rows)) if label_rows else np.zeros(0, dtype=np.int64)
+            rows = label_rows_arr if rows is None else np.intersect1d(rows, label_rows_arr)
+        return rows if rows is None else np.sort(rows)
+
+    def search(
+        self,
+        content: str,
+        topk_k: int | None = None,
+        similarity_threshold: float = 0,
+        constraint_labels: list[str] | None = None,
+    ) -> Tuple[List[Document], List]:
+        """
+        Search vector by node's embedding.
+
+        Parameters
+        ----------
+        content : str
+            The content to search for.
+        topk_k : int, optional
+            The number of nearest vectors to return.
+        similarity_threshold : float, optional
+            The minimum similarity score for a vector to be considered.
+        constraint_labels : List[str], optional
+            If provided, only nodes with matching labels will be considered.
+
+        Returns
+        -------
+        Tuple[List[Document], List]
+            A list of `topk_k` nodes that are semantically similar to the input node, sorted by similarity score.
+            All nodes shall meet the `similarity_threshold` and `constraint_labels` criteria.
+        """
+        if not self.size:
+            return [], []
+
+        document = Document(content=content)
+        document.create_embedding()
+        query = np.asarray(document.embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        rows = self._candidate_rows(query, constraint_labels)
+        if rows is None:
+            rows = np.arange(self.size)
+            similarities = self.matrix[: self.size] @ query
+        else:
+            similarities = self.matrix[rows] @ query
+
+        keep = similarities > similarity_threshold
+        rows, similarities = rows[keep], similarities[keep]
+        if topk_k is not None and topk_k < len(rows):
+            top = np.argpartition(-similarities, topk_k - 1)[:topk_k]
+            rows, similarities = rows[top], similarities[top]
+        order = np.lexsort((rows, -similarities))  # ties are broken by insertion order
+
+        docs = []
+        for i in rows[order]:
+            row = self.rows[i]
+            doc = Document(
+                content=row["content"],
+                label=row["label"],
+                embedding=(self.matrix[i] * self.norms[i]).tolist(),
+                identity=row["id"],
+            )
+            doc.trunk = row["trunk"]
+            docs.append(doc)
+        return docs, similarities[order].astype(float).tolist()
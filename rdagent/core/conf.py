@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import cast
+from typing import Literal, cast
 
 from pydantic_settings import (
     BaseSettings,
@@ -64,6 +64,18 @@ class RDAgentSettings(ExtendedBaseSettings):
 
     # multi processing conf
     multi_proc_n: int = 1
+    multi_proc_warm_pool: bool = False
+    """Whether `multiprocessing_wrapper` keeps its worker processes alive across calls instead of spawning new ones"""
+    multi_proc_max_tasks_per_child: int = 0
+    """the warm workers are replaced after running so many tasks; 0 (or any value <=0) means never"""
+    multi_proc_timeout: int = 3600
+    """the timeout (seconds) of every task run by `multiprocessing_wrapper`; only the worker of the task is killed"""
+    multi_proc_mode: Literal["process", "async"] = "process"
+    """How CoSTEER runs the sub-tasks of an experiment concurrently (at most `multi_proc_n` at a time):
+    - process: a spawned process pool (`multiprocessing_wrapper`).
+    - async: threads of the current process driven by asyncio (`async_wrapper`) for the I/O-bound steps,
+      i.e. `implement_one_task` and the evaluators with `io_bound = True`; the others still use the process pool.
+    """
 
     # pickle cache conf
     cache_with_pickle: bool = True  # whether to use pickle cache
@@ -74,11 +86,27 @@ class RDAgentSettings(ExtendedBaseSettings):
         True  # when calling the function with same parameters, whether to use file lock to avoid
         # executing the function multiple times
     )
+    pickle_cache_size_limit: int = 0
+    """the budget (bytes) of the files cached by `cache_with_pickle`;
+    0 (or any value <=0) means *no* size limit. The least recently used files are evicted first."""
+    pickle_cache_memory_size_limit: int = 0
+    """the budget (bytes) of the in-process memory tier of `cache_with_pickle`; 0 (or any value <=0) disables it."""
+    pickle_cache_stats_log_interval: int = 1000
+    """log the hit rate and the size of the pickle cache every so many lookups; 0 (or any value <=0) disables it"""
+    env_cache_size_limit: int = 0
+    """the budget (bytes) of the workspace snapshots cached by `Env.cached_run`;
+    0 (or any value <=0) means *no* size limit. The least recently used snapshots are evicted first."""
+    env_cache_max_age_days: float = 0
+    """the workspace snapshots not used for longer than it are evicted; 0 (or any value <=0) means never."""
 
     # misc
     """The limitation of context stdout"""
     stdout_context_len: int = 400
     stdout_line_len: int = 10000
+    stdout_capture_len: int = 0
+    """the number of chars of the output of a run kept in memory (from its head and its tail); when it is longer, the
+    whole output is spooled to the `env_output` folder of the current log trace and kept with the trace.
+    0 (or any value <=0) means 2 * stdout_context_len * stdout_line_len"""
 
     enable_mlflow: bool = False
 
@@ -104,6 +132,10 @@ class RDAgentSettings(ExtendedBaseSettings):
 
     # Template:
     app_tpl: str | None = None  # for application to override the default template, example: "app/fintune/tpl"
+    tpl_log: bool = True
+    """whether the rendered templates are logged with the tag `debug_tpl` (some UI pages are built from them)"""
+    tpl_bytecode_cache: bool = True
+    """whether the compiled templates are cached in the temporary directory, so new processes don't compile them"""
 
 
 RD_AGENT_SETTINGS = RDAgentSettings()
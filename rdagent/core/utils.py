@@ -1,12 +1,24 @@
 from __future__ import annotations
 
+import asyncio
+import atexit
+import concurrent.futures
+import contextlib
+import contextvars
 import functools
+import hashlib
 import importlib
 import json
 import multiprocessing as mp
+import os
 import pickle
 import random
+import threading
+import time
+from collections import Counter, OrderedDict
 from collections.abc import Callable
+from multiprocessing.connection import Connection
+from multiprocessing.connection import wait as mp_wait
 from pathlib import Path
 from typing import Any, ClassVar, NoReturn, cast
 
@@ -88,6 +100,10 @@ def import_class(class_path: str) -> Any:
     return getattr(module, class_name)
 
 
+# the seed generator of the calls run by `async_wrapper`; the global `random` is used elsewhere
+_TASK_SEED_RNG: contextvars.ContextVar[random.Random] = contextvars.ContextVar("_TASK_SEED_RNG")
+
+
 class CacheSeedGen:
     """
     It is a global seed generator to generate a sequence of seeds.
@@ -102,11 +118,11 @@ class CacheSeedGen:
         self.set_seed(LLM_SETTINGS.init_chat_cache_seed)
 
     def set_seed(self, seed: int) -> None:
-        random.seed(seed)
+        _TASK_SEED_RNG.get(random).seed(seed)
 
     def get_next_seed(self) -> int:
         """generate next random int"""
-        return random.randint(0, 10000)  # noqa: S311
+        return _TASK_SEED_RNG.get(random).randint(0, 10000)  # noqa: S311
 
 
 LLM_CACHE_SEED_GEN = CacheSeedGen()
@@ -121,6 +137,159 @@ def _subprocess_wrapper(f: Callable, seed: int, args: list) -> Any:
     return f(*args)
 
 
+def _warm_worker_main(conn: Connection) -> None:
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        f, seed, args = task
+        try:
+            res: tuple[bool, Any] = (True, _subprocess_wrapper(f, seed, args))
+        except Exception as e:  # noqa: BLE001
+            res = (False, f"{getattr(f, '__qualname__', f)} failed: {e!r}")
+        try:
+            conn.send(res)
+        except Exception as e:  # noqa: BLE001  e.g. the result can't be pickled
+            conn.send((False, f"{getattr(f, '__qualname__', f)} returned an object which can't be sent back: {e!r}"))
+
+
+class _Worker:
+    def __init__(self, ctx: Any) -> None:
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_warm_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.n_tasks = 0
+        self.task_index: int | None = None  # the index of the running task
+        self.deadline = 0.0
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def close(self) -> None:
+        with contextlib.suppress(OSError):
+            self.conn.send(None)
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class WarmProcessPool:
+    """
+    `spawn` worker processes which are kept alive across `multiprocessing_wrapper` calls,
+    so the interpreter start-up and the imports of rdagent are paid once per worker instead of once per call.
+
+    - A dead worker is replaced before it gets a task (health check).
+    - A worker is recycled after `max_tasks_per_child` tasks (0 or any value <= 0 means never).
+    - A task exceeding the timeout only kills its own worker; the other tasks of the batch keep running.
+    """
+
+    def __init__(self, size: int, max_tasks_per_child: int = 0) -> None:
+        self.size = size
+        self.max_tasks_per_child = max_tasks_per_child
+        self._ctx = mp.get_context("spawn")
+        self._workers = [_Worker(self._ctx) for _ in range(size)]
+        self._lock = threading.Lock()  # one batch at a time
+
+    def _healthy(self, i: int) -> _Worker:
+        worker = self._workers[i]
+        if not worker.process.is_alive() or (0 < self.max_tasks_per_child <= worker.n_tasks):
+            worker.close()
+            worker = self._workers[i] = _Worker(self._ctx)
+        return worker
+
+    def map(self, func_calls: list[tuple[Callable, int, tuple]], timeout: float) -> list:
+        """
+        Run `f(*args)` with the chat cache seed for every (f, seed, args) of `func_calls`.
+        A call which fails or exceeds `timeout` seconds gets None.
+        """
+        with self._lock:
+            return self._map(func_calls, timeout)
+
+    def _map(self, func_calls: list[tuple[Callable, int, tuple]], timeout: float) -> list:
+        from rdagent.log import rdagent_logger as logger  # rdagent.log depends on this module
+
+        results: list[Any] = [None] * len(func_calls)
+        pending = list(range(len(func_calls)))[::-1]
+        idle = list(range(self.size))
+        busy: dict[Connection, int] = {}  # connection -> worker index
+
+        def _finish(i: int, replace: bool) -> None:
+            worker = self._workers[i]
+            del busy[worker.conn]
+            worker.task_index = None
+            if replace:
+                worker.kill()
+                self._workers[i] = _Worker(self._ctx)
+            idle.append(i)
+
+        while pending or busy:
+            while pending and idle:
+                i = idle.pop()
+                worker = self._healthy(i)
+                worker.task_index = pending.pop()
+                worker.n_tasks += 1
+                worker.deadline = time.monotonic() + timeout
+                busy[worker.conn] = i
+                try:
+                    worker.conn.send(func_calls[worker.task_index])
+                except Exception as e:  # noqa: BLE001  e.g. the call can't be pickled; it gets None like a failure
+                    f = func_calls[worker.task_index][0]
+                    logger.warning(f"{getattr(f, '__qualname__', f)} can't be sent to the worker: {e!r}")
+                    _finish(i, replace=isinstance(e, OSError))  # the pipe is broken
+            if not busy:
+                continue  # all the tasks left failed to be sent
+
+            wait_time = max(0.0, min(self._workers[i].deadline for i in busy.values()) - time.monotonic())
+            for conn in mp_wait(list(busy), timeout=wait_time):
+                i = busy[conn]  # type: ignore[index]
+                task_index = self._workers[i].task_index
+                try:
+                    success, res = conn.recv()  # type: ignore[union-attr]
+                except EOFError:  # e.g. the call crashed the interpreter
+                    logger.warning(f"The worker running task {task_index} exited unexpectedly.")
+                    _finish(i, replace=True)
+                    continue
+                if success:
+                    results[task_index] = res  # type: ignore[index]
+                else:
+                    logger.warning(res)
+                _finish(i, replace=False)
+
+            now = time.monotonic()
+            for i in [i for i in busy.values() if self._workers[i].deadline <= now]:
+                logger.warning(f"Task {self._workers[i].task_index} timed out after {timeout} seconds.")
+                _finish(i, replace=True)
+        return results
+
+    def close(self) -> None:
+        for worker in self._workers:
+            worker.close()
+        self._workers.clear()
+
+
+_WARM_POOL: WarmProcessPool | None = None
+
+
+def get_warm_process_pool(size: int) -> WarmProcessPool:
+    """Create (or get) the warm pool of this process; it is recreated when the size changes."""
+    global _WARM_POOL
+    if _WARM_POOL is not None and _WARM_POOL.size != size:
+        _WARM_POOL.close()
+        _WARM_POOL = None
+    if _WARM_POOL is None:
+        _WARM_POOL = WarmProcessPool(size, max_tasks_per_child=RD_AGENT_SETTINGS.multi_proc_max_tasks_per_child)
+        atexit.register(_WARM_POOL.close)
+    return _WARM_POOL
+
+
 def multiprocessing_wrapper(func_calls: list[tuple[Callable, tuple]], n: int) -> list:
     """It will use multiprocessing to call the functions in func_calls with the given parameters.
     The results equals to `return  [f(*args) for f, args in func_calls]`
@@ -140,40 +309,270 @@ def multiprocessing_wrapper(func_calls: list[tuple[Callable, tuple]], n: int) ->
     Returns
     -------
     list
+        A call which fails or exceeds `RD_AGENT_SETTINGS.multi_proc_timeout` seconds gets None.
 
     """
     if n == 1 or max(1, min(n, len(func_calls))) == 1:
         return [f(*args) for f, args in func_calls]
 
-    # 使用更可靠的进程启动方法，避免 macOS 上的资源泄漏问题
+    seeded_calls = [(f, LLM_CACHE_SEED_GEN.get_next_seed(), args) for f, args in func_calls]
+    if RD_AGENT_SETTINGS.multi_proc_warm_pool:
+        return get_warm_process_pool(n).map(seeded_calls, timeout=RD_AGENT_SETTINGS.multi_proc_timeout)
+
     # spawn 方法更安全，虽然启动稍慢，但能避免 fork 导致的资源共享问题
-    ctx = mp.get_context("spawn")
-
-    with ctx.Pool(processes=max(1, min(n, len(func_calls)))) as pool:
-        results = [
-            pool.apply_async(_subprocess_wrapper, args=(f, LLM_CACHE_SEED_GEN.get_next_seed(), args))
-            for f, args in func_calls
-        ]
-        # 添加超时和更好的异常处理
+    pool = WarmProcessPool(max(1, min(n, len(func_calls))), max_tasks_per_child=0)
+    try:
+        return pool.map(seeded_calls, timeout=RD_AGENT_SETTINGS.multi_proc_timeout)
+    finally:
+        pool.close()
+
+
+def _thread_wrapper(f: Callable, seed: int, args: tuple) -> Any:
+    """
+    The counterpart of `_subprocess_wrapper` for `async_wrapper`.
+    The seed only applies to the current context, so the calls running in other threads are not affected.
+    """
+    _TASK_SEED_RNG.set(random.Random(seed))  # noqa: S311
+    try:
+        return f(*args)
+    except Exception as e:
+        from rdagent.log import rdagent_logger as logger  # rdagent.log depends on this module
+
+        logger.warning(f"{getattr(f, '__qualname__', f)} failed: {e!r}")
+        return None
+
+
+def async_wrapper(func_calls: list[tuple[Callable, tuple]], n: int) -> list:
+    """It is the same as `multiprocessing_wrapper`, but the functions run in threads of the current process,
+    driven by an asyncio event loop with at most `n` calls in flight.
+
+    It suits I/O-bound functions (e.g. waiting for LLM responses): nothing is pickled and rdagent is not imported
+    again, and the process-wide objects (e.g. `APIBackend` and its prompt cache) are shared by all the calls.
+    Like `multiprocessing_wrapper`, every call gets its own chat cache seed and a failed call returns None.
+
+    Parameters
+    ----------
+    func_calls : List[Tuple[Callable, Tuple]]
+        the list of functions and their parameters
+    n : int
+        the number of calls in flight
+
+    Returns
+    -------
+    list
+
+    """
+    if n == 1 or max(1, min(n, len(func_calls))) == 1:
+        return [f(*args) for f, args in func_calls]
+
+    seeds = [LLM_CACHE_SEED_GEN.get_next_seed() for _ in func_calls]
+
+    async def _run_all() -> list:
+        semaphore = asyncio.Semaphore(n)
+
+        async def _run(f: Callable, seed: int, args: tuple) -> Any:
+            async with semaphore:
+                return await asyncio.to_thread(_thread_wrapper, f, seed, args)
+
+        return await asyncio.gather(*(_run(f, seed, args) for (f, args), seed in zip(func_calls, seeds)))
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_run_all())
+    # called by a synchronous step of a running loop (e.g. `LoopBase`); run another event loop in a new thread
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(contextvars.copy_context().run, asyncio.run, _run_all()).result()
+
+
+class PickleCacheManager(SingletonBaseClass):
+    """
+    The storage of `cache_with_pickle`.
+
+    Layout: <root>/<module.function>/<xx>/<yy>/<hash_key>.pkl, where xx/yy are the first 4 hex chars of md5(hash_key).
+    Files of the legacy flat layout (<root>/<module.function>/<hash_key>.pkl) are moved into place when they are hit;
+    until then they are counted and evicted like the others.
+
+    - The mtime of a cache file is its last access time. When the files exceed `size_limit` bytes,
+      the least recently used ones are evicted until they fit into 90% of the budget.
+      The files of the stores sharing the folder (`FILE_PATTERNS`, e.g. the `FactorValueStore` entries under
+      `factor_values`) are evicted along with the pickles; those stores report their writes by `add_written`.
+    - An optional in-process memory tier keeps the pickled bytes of the recently used entries,
+      so repeated hits do not touch the disk (the result is still unpickled, so callers never share objects).
+    - The hit/miss counts and the size of the folder are logged every `stats_log_interval` lookups.
+    """
+
+    EVICT_LOW_WATERMARK = 0.9
+    SCAN_INTERVAL = 0.1  # scan the folder again after writing this fraction of the budget
+    FILE_PATTERNS = ("*/??/??/*.pkl", "*/*.pkl", "factor_values/??/*.arrow", "factor_values/??/*.pkl")
+
+    def __init__(self, root: str, size_limit: int = 0, memory_size_limit: int = 0, stats_log_interval: int = 0) -> None:
+        if getattr(self, "_initialized", False):
+            # SingletonBaseClass returns the same object for the same kwargs, but `__init__` is still called.
+            return
+        self.root = Path(root)
+        self.size_limit = size_limit
+        self.memory_size_limit = memory_size_limit
+        self.stats_log_interval = stats_log_interval
+        self._memory: OrderedDict[Path, bytes] = OrderedDict()
+        self._memory_size = 0
+        self._memory_lock = threading.Lock()  # the manager is shared by the threads of `async_wrapper`
+        self._written_since_scan: int | None = None  # None means the folder has not been scanned yet
+        self.stats: Counter[str] = Counter()
+        self._initialized = True
+
+    def cache_path(self, namespace: str, hash_key: str) -> Path:
+        shard = hashlib.md5(hash_key.encode()).hexdigest()  # noqa: S324
+        return self.root / namespace / shard[:2] / shard[2:4] / f"{hash_key}.pkl"
+
+    def _remember(self, path: Path, data: bytes) -> None:
+        if len(data) > self.memory_size_limit:
+            return
+        with self._memory_lock:
+            self._forget_locked(path)
+            self._memory[path] = data
+            self._memory_size += len(data)
+            while self._memory_size > self.memory_size_limit:
+                _, old = self._memory.popitem(last=False)
+                self._memory_size -= len(old)
+
+    def _forget(self, path: Path) -> None:
+        with self._memory_lock:
+            self._forget_locked(path)
+
+    def _forget_locked(self, path: Path) -> None:
+        if (old := self._memory.pop(path, None)) is not None:
+            self._memory_size -= len(old)
+
+    def load(self, namespace: str, hash_key: str) -> tuple[bool, Any]:
+        """
+        Returns
+        -------
+        (hit, the cached result)
+        """
+        path = self.cache_path(namespace, hash_key)
+        with self._memory_lock:
+            if (data := self._memory.get(path)) is not None:
+                self._memory.move_to_end(path)
+        if data is not None:
+            self._record("memory_hits")
+            return True, pickle.loads(data)  # noqa: S301
+
+        legacy_path = self.root / namespace / f"{hash_key}.pkl"
+        if not path.exists() and legacy_path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with contextlib.suppress(FileNotFoundError):  # moved by another process
+                os.replace(legacy_path, path)
         try:
-            return [result.get(timeout=3600) for result in results]  # 1小时超时
-        except Exception as e:
-            # 确保在异常情况下也能获取已完成的结果
-            final_results = []
-            for result in results:
-                try:
-                    final_results.append(result.get(timeout=10))
-                except Exception:
-                    final_results.append(None)
-            return final_results
+            data = path.read_bytes()
+        except FileNotFoundError:
+            self._record("misses")
+            return False, None
+        with contextlib.suppress(FileNotFoundError):  # evicted by another process
+            os.utime(path)
+        self.stats["bytes_read"] += len(data)
+        self._record("disk_hits")
+        if self.memory_size_limit > 0:
+            self._remember(path, data)
+        return True, pickle.loads(data)  # noqa: S301
+
+    def dump(self, namespace: str, hash_key: str, result: Any) -> None:
+        path = self.cache_path(namespace, hash_key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with tmp_path.open("wb") as f:
+            pickle.dump(result, f)
+            size = f.tell()
+        os.replace(tmp_path, path)
+        if 0 < size <= self.memory_size_limit:
+            self._remember(path, path.read_bytes())
+        self.add_written(size)
+
+    def add_written(self, size: int) -> None:
+        """Account `size` bytes written into the folder; the folder is scanned for eviction when enough is written."""
+        self.stats["bytes_written"] += size
+        self._maybe_evict(size)
+
+    def _record(self, outcome: str) -> None:
+        self.stats[outcome] += 1
+        self.stats["lookups"] += 1
+        if self.stats_log_interval > 0 and self.stats["lookups"] % self.stats_log_interval == 0:
+            self.log_stats(scan=True)
+
+    def lock(self, namespace: str, hash_key: str) -> FileLock:
+        path = self.cache_path(namespace, hash_key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return FileLock(path.with_suffix(".lock"))
+
+    def _maybe_evict(self, written: int) -> None:
+        if self.size_limit <= 0:
+            return
+        if self._written_since_scan is not None:
+            self._written_since_scan += written
+            if self._written_since_scan < self.size_limit * self.SCAN_INTERVAL:
+                return
+        self._written_since_scan = 0
+        self.evict()
+
+    def evict(self) -> None:
+        """Evict the least recently used files if the cache exceeds the budget."""
+        if self.size_limit <= 0:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        with FileLock(self.root / "pickle_cache.lock"):
+            files = self._scan()
+            total = self.stats["size_bytes"] = sum(size for _, size, _ in files)
+            if total <= self.size_limit:
+                return
+            for _, size, path in sorted(files, key=lambda x: x[0]):
+                if total <= self.size_limit * self.EVICT_LOW_WATERMARK:
+                    break
+                path.unlink(missing_ok=True)
+                path.with_suffix(".lock").unlink(missing_ok=True)
+                self._forget(path)
+                total -= size
+                self.stats["evicted_files"] += 1
+                self.stats["evicted_bytes"] += size
+            self.stats["size_bytes"] = total
+        self.log_stats()
+
+    def _scan(self) -> list[tuple[float, int, Path]]:
+        """(mtime, size, path) of the cached files"""
+        files = []
+        for pattern in self.FILE_PATTERNS:
+            for path in self.root.glob(pattern):
+                with contextlib.suppress(FileNotFoundError):
+                    st = path.stat()
+                    files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def log_stats(self, scan: bool = False) -> None:
+        """`scan` measures the size of the folder first; otherwise the size of the last eviction scan is logged."""
+        from rdagent.log import rdagent_logger as logger  # rdagent.log depends on this module
+
+        if scan:
+            self.stats["size_bytes"] = sum(size for _, size, _ in self._scan())
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        hit_rate = hits / self.stats["lookups"] if self.stats["lookups"] else 0.0
+        logger.info(f"Pickle cache stats (hit rate {hit_rate:.1%}): {dict(self.stats)}", tag="pickle_cache")
+
+
+def get_pickle_cache_manager() -> PickleCacheManager:
+    """Create (or get) the manager configured by RD_AGENT_SETTINGS."""
+    return PickleCacheManager(
+        root=RD_AGENT_SETTINGS.pickle_cache_folder_path_str,
+        size_limit=RD_AGENT_SETTINGS.pickle_cache_size_limit,
+        memory_size_limit=RD_AGENT_SETTINGS.pickle_cache_memory_size_limit,
+        stats_log_interval=RD_AGENT_SETTINGS.pickle_cache_stats_log_interval,
+    )
 
 
 def cache_with_pickle(hash_func: Callable, post_process_func: Callable | None = None, force: bool = False) -> Callable:
     """
     This decorator will cache the return value of the function with pickle.
     The cache key is generated by the hash_func. The hash function returns a string or None.
-    If it returns None, the cache will not be used. The cache will be stored in the folder
-    specified by RD_AGENT_SETTINGS.pickle_cache_folder_path_str with name hash_key.pkl.
+    If it returns None, the cache will not be used. The cache will be stored by `PickleCacheManager`
+    in the folder specified by RD_AGENT_SETTINGS.pickle_cache_folder_path_str with name hash_key.pkl.
     The post_process_func will be called with the original arguments and the cached result
     to give each caller a chance to process the cached result. The post_process_func should
     return the final result.
@@ -194,30 +593,29 @@ def cache_with_pickle(hash_func: Callable, post_process_func: Callable | None =
             if not RD_AGENT_SETTINGS.cache_with_pickle and not force:
                 return func(*args, **kwargs)
 
-            target_folder = Path(RD_AGENT_SETTINGS.pickle_cache_folder_path_str) / f"{func.__module__}.{func.__name__}"
-            target_folder.mkdir(parents=True, exist_ok=True)
             hash_key = hash_func(*args, **kwargs)
 
             if hash_key is None:
                 return func(*args, **kwargs)
 
-            cache_file = target_folder / f"{hash_key}.pkl"
-            lock_file = target_folder / f"{hash_key}.lock"
-
-            if cache_file.exists():
-                with cache_file.open("rb") as f:
-                    cached_res = pickle.load(f)
-                return post_process_func(*args, cached_res=cached_res, **kwargs) if post_process_func else cached_res
-
-            if RD_AGENT_SETTINGS.use_file_lock:
-                with FileLock(lock_file):
-                    result = func(*args, **kwargs)
-            else:
+            manager = get_pickle_cache_manager()
+            namespace = f"{func.__module__}.{func.__name__}"
+
+            hit, cached_res = manager.load(namespace, hash_key)
+            if not hit and RD_AGENT_SETTINGS.use_file_lock:
+                with manager.lock(namespace, hash_key):
+                    # another process may have finished the same call while we were waiting for the lock
+                    if manager.cache_path(namespace, hash_key).exists():
+                        hit, cached_res = manager.load(namespace, hash_key)
+                    if not hit:
+                        result = func(*args, **kwargs)
+                        manager.dump(namespace, hash_key, result)
+            elif not hit:
                 result = func(*args, **kwargs)
+                manager.dump(namespace, hash_key, result)
 
-            with cache_file.open("wb") as f:
-                pickle.dump(result, f)
-
+            if hit:
+                return post_process_func(*args, cached_res=cached_res, **kwargs) if post_process_func else cached_res
             return result
 
         return cache_wrapper
@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import Any, Literal
 
 from pydantic_settings import SettingsConfigDict
 
@@ -19,6 +19,23 @@ class LogSettings(ExtendedBaseSettings):
 
     storages: dict[str, list[int | str]] = {}
 
+    storage_format: Literal["files", "segments"] = "files"
+    """
+    How FileStorage saves the logged objects:
+    - "files": one pickle file per object under the directory of its tag
+    - "segments": append-only segment files (one writer per process) with an index of the tags and timestamps
+    Both formats can be read.
+    """
+
+    segment_max_bytes: int = 256 * 1024 * 1024
+    """A new segment is started when the current one is larger than this"""
+
+    log_object_in_background: bool = False
+    """
+    Whether `log_object` returns before the object is written; the objects are pickled and written in order by a
+    background thread (of the main process), so a logged object should not be modified afterwards.
+    """
+
     def model_post_init(self, _context: Any, /) -> None:
         if self.ui_server_port is not None:
             self.storages["rdagent.log.ui.storage.WebStorage"] = [self.ui_server_port, self.trace_path]
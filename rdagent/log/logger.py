@@ -1,8 +1,12 @@
+import atexit
+import concurrent.futures
+import multiprocessing
 import os
 import sys
+import threading
 from contextlib import contextmanager
 from contextvars import ContextVar
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Generator
 
@@ -20,7 +24,6 @@ from rdagent.core.utils import SingletonBaseClass, import_class
 
 from .base import Storage
 from .storage import FileStorage
-from .utils import get_caller_info
 
 
 class RDAgentLog(SingletonBaseClass):
@@ -65,6 +68,13 @@ class RDAgentLog(SingletonBaseClass):
             self.other_storages.append(storage_cls(*args))
 
         self.main_pid = os.getpid()
+        self._pid_chain = (-1, "")  # (pid, the pid chain of the process)
+        self._raw_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        # the thread writing the logged objects if `LOG_SETTINGS.log_object_in_background`, by pid (it is not forked)
+        self._writer: tuple[int, concurrent.futures.ThreadPoolExecutor] | None = None
+        self._pending: list[concurrent.futures.Future] = []
+        atexit.register(self.flush)
 
     @contextmanager
     def tag(self, tag: str) -> Generator[None, None, None]:
@@ -82,11 +92,13 @@ class RDAgentLog(SingletonBaseClass):
             self._tag_ctx.reset(token)
 
     def set_storages_path(self, path: str | Path) -> None:
+        self.flush()  # the pending objects are written to the previous path
         for storage in [self.storage] + self.other_storages:
             if hasattr(storage, "path"):
                 storage.path = path
 
     def truncate_storages(self, time: datetime) -> None:
+        self.flush()
         for storage in [self.storage] + self.other_storages:
             storage.truncate(time=time)
 
@@ -94,8 +106,11 @@ class RDAgentLog(SingletonBaseClass):
         """
         Returns a string of pids from the current process to the main process.
         Split by '-'.
+        The chain is computed once per process.
         """
         pid = os.getpid()
+        if self._pid_chain[0] == pid:
+            return self._pid_chain[1]
         process = Process(pid)
         pid_chain = f"{pid}"
         while process.pid != self.main_pid:
@@ -103,28 +118,56 @@ class RDAgentLog(SingletonBaseClass):
             parent_process = Process(parent_pid)
             pid_chain = f"{parent_pid}-{pid_chain}"
             process = parent_process
+        self._pid_chain = (pid, pid_chain)
         return pid_chain
 
-    def log_object(self, obj: object, *, tag: str = "") -> None:
-        tag = f"{self._tag}.{tag}.{self.get_pids()}".strip(".")
-
+    def _get_writer(self) -> concurrent.futures.ThreadPoolExecutor | None:
+        # the processes of multiprocessing may exit without running `atexit`, so they write the objects directly
+        if not LOG_SETTINGS.log_object_in_background or multiprocessing.parent_process() is not None:
+            return None
+        with self._pending_lock:
+            if self._writer is None or self._writer[0] != os.getpid():
+                self._writer = (os.getpid(), concurrent.futures.ThreadPoolExecutor(max_workers=1))
+                self._pending = []
+            return self._writer[1]
+
+    def _write_object(self, obj: object, tag: str, timestamp: datetime) -> None:
         for storage in [self.storage] + self.other_storages:
-            storage.log(obj, tag=tag)
+            storage.log(obj, tag=tag, timestamp=timestamp)
 
-    def _log(self, level: str, msg: str, *, tag: str = "", raw: bool = False) -> None:
-        caller_info = get_caller_info(level=3)
+    def log_object(self, obj: object, *, tag: str = "") -> None:
         tag = f"{self._tag}.{tag}.{self.get_pids()}".strip(".")
+        timestamp = datetime.now(timezone.utc)
+
+        writer = self._get_writer()
+        if writer is None:
+            self._write_object(obj, tag, timestamp)
+            return
+        # NOTE: `obj` is pickled by the writer, so it should not be modified after being logged
+        with self._pending_lock:
+            future = writer.submit(self._write_object, obj, tag, timestamp)
+            future.add_done_callback(self._check_written)
+            self._pending = [f for f in self._pending if not f.done()] + [future]
+
+    def _check_written(self, future: concurrent.futures.Future) -> None:
+        if (e := future.exception()) is not None:
+            logger.error(f"Failed to log the object: {e!r}")
+
+    def flush(self) -> None:
+        """Wait for the objects being written in the background."""
+        with self._pending_lock:
+            pending = list(self._pending) if self._writer is not None and self._writer[0] == os.getpid() else []
+        concurrent.futures.wait(pending)
 
+    def _log(self, level: str, msg: str, *, tag: str = "", raw: bool = False) -> None:
         if raw:
-            logger.remove()
-            logger.add(sys.stderr, format=lambda r: "{message}")
-
-        log_func = getattr(logger.patch(lambda r: r.update(caller_info)), level)
-        log_func(msg)
-
-        if raw:
-            logger.remove()
-            logger.add(sys.stderr)
+            # e.g. the chunks of the streamed LLM responses, written as they are
+            with self._raw_lock:
+                sys.stderr.write(msg)
+                sys.stderr.flush()
+            return
+        # depth=2: the caller of `info`/`warning`/`error`, found by loguru without inspecting the whole stack
+        getattr(logger.opt(depth=2), level)(msg)
 
     def info(self, msg: str, *, tag: str = "", raw: bool = False) -> None:
         self._log("info", msg, tag=tag, raw=raw)
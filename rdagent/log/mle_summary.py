@@ -1,4 +1,3 @@
-import pickle
 import traceback
 from collections import defaultdict
 from pathlib import Path
@@ -9,6 +8,7 @@ import pandas as pd
 from rdagent.core.experiment import FBWorkspace
 from rdagent.core.proposal import ExperimentFeedback
 from rdagent.log.storage import FileStorage
+from rdagent.log.summary_index import SummaryIndex
 from rdagent.log.utils import extract_json, extract_loopid_func_name, is_valid_session
 from rdagent.log.utils.folder import get_first_session_file_after_duration
 from rdagent.scenarios.data_science.experiment.experiment import DSExperiment
@@ -20,6 +20,7 @@ from rdagent.scenarios.data_science.test_eval import (
 
 # from rdagent.scenarios.kaggle.kaggle_crawler import score_rank
 from rdagent.utils.workflow import LoopBase
+from rdagent.utils.workflow.checkpoint import load_checkpoint
 
 
 def save_grade_info(log_trace_path: Path):
@@ -38,6 +39,8 @@ def save_grade_info(log_trace_path: Path):
                 trace_storage.log(
                     mle_score_str, tag=f"{msg.tag}.mle_score.pid", save_type="pkl", timestamp=msg.timestamp
                 )
+                if (loop_id := extract_loopid_func_name(msg.tag)[0]) is not None:
+                    SummaryIndex(log_trace_path).update(int(loop_id), mle_score=extract_json(mle_score_str))
             except Exception as e:
                 print(f"Error in {log_trace_path}: {e}", traceback.format_exc())
 
@@ -54,8 +57,7 @@ def save_all_grade_info(log_folder: str | Path) -> None:
 def _get_loop_and_fn_after_hours(log_folder: Path, hours: int):
     stop_session_fp = get_first_session_file_after_duration(log_folder, f"{hours}h")
 
-    with stop_session_fp.open("rb") as f:
-        session_obj: LoopBase = pickle.load(f)
+    session_obj: LoopBase = load_checkpoint(stop_session_fp)
 
     loop_trace = session_obj.loop_trace
     stop_li = max(loop_trace.keys())
@@ -1,8 +1,9 @@
 import os
-import random
 import signal
 import subprocess
-from collections import defaultdict
+import threading
+import time
+from collections import OrderedDict, defaultdict
 from datetime import datetime, timezone
 from pathlib import Path
 
@@ -30,50 +31,108 @@ def favicon():
     return send_from_directory(app.static_folder, "favicon.ico", mimetype="image/vnd.microsoft.icon")
 
 
-msgs_for_frontend = defaultdict(list)
+class Trace:
+    """The messages of a trace for the frontend, tailed from its log folder"""
+
+    REFRESH_INTERVAL = 1.0  # seconds between two reads of the log folder
+
+    def __init__(self, log_path: Path, id: str = "") -> None:
+        self.fs = FileStorage(log_path)
+        self.ws = WebStorage(port=1, path=log_path)
+        self.id = id
+        self.msgs: list[dict] = []
+        self.cursor: dict = {}  # where the last read of the log folder stopped
+        self.last_timestamp: datetime | None = None
+        self.ended = False
+        self.refreshed_at = float("-inf")
+        self.accessed_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refresh(self) -> None:
+        """Convert the records logged since the last refresh."""
+        with self.lock:
+            if self.ended or time.monotonic() - self.refreshed_at < self.REFRESH_INTERVAL:
+                return
+            for msg in self.fs.iter_new_msg(self.cursor):
+                data = self.ws._obj_to_json(
+                    obj=msg.content, tag=msg.tag, id=self.id, timestamp=msg.timestamp.isoformat()
+                )
+                if data:
+                    self.msgs.extend(d["msg"] for d in (data if isinstance(data, list) else [data]))
+                    self.last_timestamp = msg.timestamp
+            self.refreshed_at = time.monotonic()
+
+            now = datetime.now(timezone.utc)
+            if (
+                self.id not in rdagent_processes
+                and self.last_timestamp
+                and (now - self.last_timestamp).total_seconds() > 1800
+            ):
+                self._end()
+
+    def end(self) -> None:
+        with self.lock:
+            self._end()
+
+    def _end(self) -> None:
+        if not self.ended:
+            self.msgs.append({"tag": "END", "timestamp": datetime.now(timezone.utc).isoformat(), "content": {}})
+            self.ended = True
+
+
+class TraceCache:
+    """The traces are loaded on their first request and the least recently used ones are evicted."""
+
+    def __init__(self) -> None:
+        self.traces: OrderedDict[str, Trace] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, trace_id: str) -> Trace:
+        with self.lock:
+            if (trace := self.traces.get(trace_id)) is None:
+                trace = self.traces[trace_id] = Trace(Path(trace_id), id=trace_id)
+            self.traces.move_to_end(trace_id)
+            trace.accessed_at = time.monotonic()
+            self._evict()
+        return trace
+
+    def _evict(self) -> None:
+        # the evicted traces are read from their log folders again on their next request
+        deadline = time.monotonic() - UI_SETTING.trace_idle_seconds
+        while len(self.traces) > 1:
+            trace_id, trace = next(iter(self.traces.items()))
+            if len(self.traces) <= UI_SETTING.trace_cache_size and trace.accessed_at > deadline:
+                break
+            del self.traces[trace_id]
+
+    def loaded(self) -> dict[str, Trace]:
+        with self.lock:
+            return dict(self.traces)
+
+
+traces = TraceCache()
 pointers = defaultdict(lambda: defaultdict(int))  # pointers[trace_id][user_ip]
 
 
-def read_trace(log_path: Path, id: str = "") -> None:
-    fs = FileStorage(log_path)
-    ws = WebStorage(port=1, path=log_path)
-    msgs_for_frontend[id] = []
-    last_timestamp = None
-    for msg in fs.iter_msg():
-        data = ws._obj_to_json(obj=msg.content, tag=msg.tag, id=id, timestamp=msg.timestamp.isoformat())
-        if data:
-            if isinstance(data, list):
-                for d in data:
-                    msgs_for_frontend[id].append(d["msg"])
-                    last_timestamp = msg.timestamp
-            else:
-                msgs_for_frontend[id].append(data["msg"])
-                last_timestamp = msg.timestamp
-
-    now = datetime.now(timezone.utc)
-    if last_timestamp and (now - last_timestamp).total_seconds() > 1800:
-        msgs_for_frontend[id].append({"tag": "END", "timestamp": now.isoformat(), "content": {}})
-
-
-# load all traces from the log folder
-for p in log_folder_path.glob("*/*/"):
-    if is_valid_session(p):
-        read_trace(p, id=str(p))
-
-
 @app.route("/trace", methods=["POST"])
 def update_trace():
-    global pointers, msgs_for_frontend
+    global pointers
     data = request.get_json()
     trace_id = data.get("id")
     return_all = data.get("all")
     reset = data.get("reset")
-    msg_num = random.randint(1, 10)
+    msg_num = UI_SETTING.trace_page_size
     app.logger.info(data)
     log_folder_path = Path(UI_SETTING.trace_folder).absolute()
     if not trace_id:
         return jsonify({"error": "Trace ID is required"}), 400
     trace_id = str(log_folder_path / trace_id)
+    if trace_id not in rdagent_processes:
+        # only the sessions in the trace folder can be read, e.g. not absolute paths or ids with ".."
+        trace_path = Path(trace_id).resolve()
+        if not trace_path.is_relative_to(log_folder_path.resolve()) or not is_valid_session(trace_path):
+            return jsonify({"error": "Trace not found"}), 404
+    trace = traces.get(trace_id)
 
     user_ip = request.remote_addr
 
@@ -82,10 +141,12 @@ def update_trace():
 
     start_pointer = pointers[trace_id][user_ip]
     end_pointer = start_pointer + msg_num
-    if end_pointer > len(msgs_for_frontend[trace_id]) or return_all:
-        end_pointer = len(msgs_for_frontend[trace_id])
+    if end_pointer > len(trace.msgs) or return_all:
+        trace.refresh()  # tail the new records when the reader catches up
+    if end_pointer > len(trace.msgs) or return_all:
+        end_pointer = len(trace.msgs)
 
-    returned_msgs = msgs_for_frontend[trace_id][start_pointer:end_pointer]
+    returned_msgs = trace.msgs[start_pointer:end_pointer]
 
     pointers[trace_id][user_ip] = end_pointer
     if returned_msgs:
@@ -188,18 +249,13 @@ def receive_msgs():
     except Exception as e:
         return jsonify({"error": "Internal Server Error"}), 500
 
-    if isinstance(data, list):
-        for d in data:
-            msgs_for_frontend[d["id"]].append(d["msg"])
-    else:
-        msgs_for_frontend[data["id"]].append(data["msg"])
-
+    # the messages are also logged to the log folder of the trace, which is tailed when the trace is requested
     return jsonify({"status": "success"}), 200
 
 
 @app.route("/control", methods=["POST"])
 def control_process():
-    global rdagent_processes, msgs_for_frontend
+    global rdagent_processes
     data = request.get_json()
     app.logger.info(data)
     if not data or "id" not in data or "action" not in data:
@@ -214,7 +270,7 @@ def control_process():
     process = rdagent_processes[id]
 
     if process.poll() is not None:
-        msgs_for_frontend[id].append({"tag": "END", "timestamp": datetime.now(timezone.utc).isoformat(), "content": {}})
+        traces.get(id).end()
         return jsonify({"error": "Process has already terminated"}), 400
 
     try:
@@ -228,9 +284,9 @@ def control_process():
             process.terminate()
             process.wait()
             del rdagent_processes[id]
-            msgs_for_frontend[id].append(
-                {"tag": "END", "timestamp": datetime.now(timezone.utc).isoformat(), "content": {}}
-            )
+            trace = traces.get(id)
+            trace.refresh()
+            trace.end()
             return jsonify({"status": "stopped"}), 200
         else:
             return jsonify({"error": "Unknown action"}), 400
@@ -241,8 +297,8 @@ def control_process():
 @app.route("/test", methods=["GET"])
 def test():
     # return 'Hello, World!'
-    global msgs_for_frontend, pointers
-    msgs = {k: [i["tag"] for i in v] for k, v in msgs_for_frontend.items()}
+    global pointers
+    msgs = {k: [i["tag"] for i in v.msgs] for k, v in traces.loaded().items()}
     pointers = pointers
     return jsonify({"msgs": msgs, "pointers": pointers}), 200
 
@@ -250,7 +306,6 @@ def test():
 @app.route("/", methods=["GET"])
 def index():
     # return 'Hello, World!'
-    # return {k: [i["tag"] for i in v] for k, v in msgs_for_frontend.items()}
     return send_from_directory(app.static_folder, "index.html")
 
 
@@ -1,15 +1,72 @@
+import heapq
 import json
+import os
 import pickle
 import re
+import struct
+import threading
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Generator, Literal
+from typing import IO, Any, Callable, Generator, Iterator, Literal
 
 from .base import Message, Storage
+from .conf import LOG_SETTINGS
+from .summary_index import SummaryIndex
 from .utils import gen_datetime
 
 LOG_LEVEL = Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
 
+SEGMENT_DIR = "__segments__"
+_RECORD_HEADER = struct.Struct("<Q")  # the length of the pickled object
+
+
+def _glob_to_regex(pattern: str) -> re.Pattern:
+    """The regex matching the relative paths matched by `Path.glob(pattern)` (only `**`, `*` and `?` are supported)"""
+    regex = ""
+    for part in pattern.split("/"):
+        if part == "**":
+            regex += "(?:[^/]+/)*"
+        else:
+            regex += "".join({"*": "[^/]*", "?": "[^/]"}.get(c, re.escape(c)) for c in part) + "/"
+    return re.compile(regex.removesuffix("/"))
+
+
+class _SegmentWriter:
+    """The segment files written by one process; a record is appended to the segment before its index entry."""
+
+    def __init__(self, seg_dir: Path) -> None:
+        self.seg_dir = seg_dir
+        self.seg_dir.mkdir(parents=True, exist_ok=True)
+        self.seq = len(list(seg_dir.glob(f"{os.getpid()}-*.seg")))
+        self.seg: IO[bytes] | None = None
+        self.idx: IO[str] | None = None
+
+    def _open(self) -> None:
+        self.close()
+        stem = self.seg_dir / f"{os.getpid()}-{self.seq:06d}"
+        self.seq += 1
+        self.seg = stem.with_suffix(".seg").open("ab")
+        self.idx = stem.with_suffix(".idx").open("a")
+
+    def append(self, obj: object, tag: str, timestamp: datetime) -> Path:
+        data = pickle.dumps(obj)
+        if self.seg is None or self.seg.tell() > LOG_SETTINGS.segment_max_bytes:
+            self._open()
+        assert self.seg is not None and self.idx is not None
+        offset = self.seg.tell()
+        self.seg.write(_RECORD_HEADER.pack(len(data)) + data)
+        self.seg.flush()
+        entry = {"tag": tag, "ts": timestamp.timestamp(), "offset": offset, "length": len(data)}
+        self.idx.write(json.dumps(entry) + "\n")
+        self.idx.flush()
+        return Path(self.seg.name)
+
+    def close(self) -> None:
+        for f in (self.seg, self.idx):
+            if f is not None:
+                f.close()
+        self.seg = self.idx = None
+
 
 def _remove_empty_dir(path: Path) -> None:
     """
@@ -29,11 +86,18 @@ class FileStorage(Storage):
     """
     The info are logginged to the file systems
 
-    TODO: describe the storage format
+    Two formats are supported (see `LOG_SETTINGS.storage_format`); both are read by `iter_msg` and `truncate`.
+
+    - "files": every object is pickled to `<tag as directories>/<pid>/<timestamp>.pkl`.
+    - "segments": the objects are appended to `__segments__/<pid>-<seq>.seg` as length-prefixed pickles.
+      The sidecar `<pid>-<seq>.idx` has one json line `{"tag", "ts", "offset", "length"}` per object, so the
+      messages can be filtered by tag, ordered and truncated without unpickling them.
     """
 
     def __init__(self, path: str | Path) -> None:
         self.path = Path(path)
+        self._writers: dict[tuple[str, int], _SegmentWriter] = {}  # by (path, pid); `path` may be reassigned
+        self._lock = threading.Lock()
 
     def log(
         self,
@@ -46,7 +110,14 @@ class FileStorage(Storage):
         # TODO: We can remove the timestamp after we implement PipeLog
         timestamp = gen_datetime(timestamp)
 
-        cur_p = self.path / tag.replace(".", "/")
+        if save_type == "pkl" and LOG_SETTINGS.storage_format == "segments":
+            key = (str(self.path), os.getpid())
+            with self._lock:
+                if key not in self._writers:
+                    self._writers[key] = _SegmentWriter(Path(self.path) / SEGMENT_DIR)
+                return self._writers[key].append(obj, tag, timestamp)
+
+        cur_p = Path(self.path) / tag.replace(".", "/")
         cur_p.mkdir(parents=True, exist_ok=True)
 
         path = cur_p / f"{timestamp.strftime('%Y-%m-%d_%H-%M-%S-%f')}.log"
@@ -61,8 +132,11 @@ class FileStorage(Storage):
             return path
         elif save_type == "pkl":
             path = path.with_suffix(".pkl")
-            with path.open("wb") as f:
+            # the readers tailing the folder never see a partially written pickle
+            tmp = path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+            with tmp.open("wb") as f:
                 pickle.dump(obj, f)
+            os.replace(tmp, path)
             return path
         elif save_type == "text":
             obj = str(obj)
@@ -76,40 +150,175 @@ class FileStorage(Storage):
         r"(?P<caller>.+:.+:\d+) - "
     )
 
-    def iter_msg(self, tag: str | None = None, pattern: str | None = None) -> Generator[Message, None, None]:
-        msg_l = []
+    @staticmethod
+    def _file_timestamp(file: Path) -> datetime:
+        return datetime.strptime(file.stem, "%Y-%m-%d_%H-%M-%S-%f").replace(tzinfo=timezone.utc)
 
+    def _stamped_files(self, pkl_files: str) -> list[tuple[datetime, Path]]:
+        files = [f for f in Path(self.path).glob(pkl_files) if f.name != "debug_llm.pkl"]
+        return sorted(((self._file_timestamp(f), f) for f in files), key=lambda x: x[0])
+
+    def _file_tag(self, file: Path) -> str:
+        return ".".join(file.relative_to(self.path).as_posix().replace("/", ".").split(".")[:-3])
+
+    def _iter_files(self, stamped: list[tuple[datetime, Path]]) -> Iterator[tuple[float, Message, Path]]:
+        for timestamp, file in stamped:  # the files are only unpickled when their messages are consumed
+            with file.open("rb") as f:
+                content = pickle.load(f)
+            m = Message(
+                tag=self._file_tag(file),
+                level="INFO",
+                timestamp=timestamp,
+                caller="",
+                pid_trace=file.parent.name,
+                content=content,
+            )
+            yield timestamp.timestamp(), m, file
+
+    @staticmethod
+    def _index_lines(idx: Path, start: int = 0) -> list[tuple[dict[str, Any], int]]:
+        """the complete entries after the byte offset `start`, with the offset after each of them"""
+        lines = []
+        with idx.open("rb") as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # the entry being written
+                start += len(line)
+                lines.append((json.loads(line), start))
+        return lines
+
+    @classmethod
+    def _read_index(cls, idx: Path, start: int = 0) -> tuple[list[dict[str, Any]], int]:
+        """the complete entries after the byte offset `start`, and the offset after them"""
+        lines = cls._index_lines(idx, start)
+        return [e for e, _ in lines], lines[-1][1] if lines else start
+
+    def _iter_segment(self, idx: Path, entries: list[dict[str, Any]]) -> Iterator[tuple[float, Message, dict]]:
+        if not entries:
+            return
+        entries = sorted(entries, key=lambda e: e["ts"])  # the threads of a process may append slightly out of order
+        with idx.with_suffix(".seg").open("rb") as f:
+            for e in entries:
+                f.seek(e["offset"] + _RECORD_HEADER.size)
+                content = pickle.loads(f.read(e["length"]))
+                tag, _, pid = e["tag"].rpartition(".")
+                timestamp = datetime.fromtimestamp(e["ts"], tz=timezone.utc)
+                yield e["ts"], Message(
+                    tag=tag, level="INFO", timestamp=timestamp, caller="", pid_trace=pid, content=content
+                ), e
+
+    def _segment_indexes(self) -> list[Path]:
+        seg_dir = Path(self.path) / SEGMENT_DIR
+        return sorted(seg_dir.glob("*.idx")) if seg_dir.exists() else []
+
+    def iter_msg(
+        self, tag: str | None = None, pattern: str | None = None, tag_filter: Callable[[str], bool] | None = None
+    ) -> Generator[Message, None, None]:
+        """
+        Iterate the messages ordered by their timestamps. The messages are read lazily, so consuming the first
+        messages does not load the whole log.
+
+        Parameters
+        ----------
+        tag :
+            only the messages whose tag contains `tag` (e.g. "running" or "Loop_1.running")
+        pattern :
+            only the messages whose file matches this glob pattern (e.g. "**/running/*/*.pkl"); the messages of the
+            segments are matched as if they were saved in the "files" format
+        tag_filter :
+            only the messages whose tag passes it; it is checked before the messages are unpickled
+        """
         if pattern:
             pkl_files = pattern
         elif tag:
             pkl_files = f"**/{tag.replace('.','/')}/**/*.pkl"
         else:
             pkl_files = "**/*.pkl"
-        for file in self.path.glob(pkl_files):
-            if file.name == "debug_llm.pkl":
-                continue
-            pkl_log_tag = ".".join(file.relative_to(self.path).as_posix().replace("/", ".").split(".")[:-3])
-            pid = file.parent.name
 
-            with file.open("rb") as f:
-                content = pickle.load(f)
-
-            timestamp = datetime.strptime(file.stem, "%Y-%m-%d_%H-%M-%S-%f").replace(tzinfo=timezone.utc)
+        stamped = self._stamped_files(pkl_files)
+        if tag_filter is not None:
+            stamped = [(ts, f) for ts, f in stamped if tag_filter(self._file_tag(f))]
+        sources = [self._iter_files(stamped)]
+        match = _glob_to_regex(pkl_files) if pattern or tag else None
+        for idx in self._segment_indexes():
+            entries, _ = self._read_index(idx)
+            if match is not None:
+                # match the path the message would have in the "files" format
+                entries = [e for e in entries if match.fullmatch(f"{e['tag'].replace('.', '/')}/{e['ts']}.pkl")]
+            if tag_filter is not None:
+                entries = [e for e in entries if tag_filter(e["tag"].rpartition(".")[0])]
+            sources.append(self._iter_segment(idx, entries))
+        for _, m, _ in heapq.merge(*sources, key=lambda x: x[0]):
+            yield m
 
-            m = Message(tag=pkl_log_tag, level="INFO", timestamp=timestamp, caller="", pid_trace=pid, content=content)
+    TAIL_LOOKBACK = 60.0
+    """
+    Seconds before the latest pickle file read by `iter_new_msg` in which a new file is still read; the files are not
+    created in the order of their timestamps (e.g. by several processes or by the background writer of the logger).
+    """
 
-            msg_l.append(m)
+    def iter_new_msg(self, cursor: dict[str, Any]) -> Generator[Message, None, None]:
+        """
+        Iterate the messages logged since the last call with the same `cursor`, ordered by their timestamps.
 
-        msg_l.sort(key=lambda x: x.timestamp)
-        for m in msg_l:
+        `cursor` is an empty dict at the first call; it holds the offsets reached in the segment indexes and the
+        pickle files read within `TAIL_LOOKBACK` of the latest one (the older files are all considered read).
+        It is only advanced past the yielded messages, so the messages left are yielded by the next call.
+        """
+        seen: dict[str, float] = cursor.setdefault("files_seen", {})
+        if seen:
+            horizon = max(seen.values()) - self.TAIL_LOOKBACK
+            if horizon > cursor.get("files_ts", float("-inf")):
+                cursor["files_ts"] = horizon
+                for f in [f for f, ts in seen.items() if ts <= horizon]:
+                    del seen[f]
+        last = cursor.get("files_ts", float("-inf"))
+        stamped = [(ts, f) for ts, f in self._stamped_files("**/*.pkl") if ts.timestamp() > last and str(f) not in seen]
+        sources = [self._iter_files(stamped)]
+        offsets = cursor.setdefault("segments", {})
+        ends: dict[int, int] = {}  # id of an entry -> the offset after its line in the index
+        pending: dict[str, list[int]] = {}  # index -> the offsets after its lines not yielded yet, the first at the end
+        for idx in self._segment_indexes():
+            lines = self._index_lines(idx, offsets.get(idx.name, 0))
+            ends.update((id(e), end) for e, end in lines)
+            pending[idx.name] = [end for _, end in reversed(lines)]
+            sources.append(((ts, m, (idx.name, e)) for ts, m, e in self._iter_segment(idx, [e for e, _ in lines])))
+        yielded: set[tuple[str, int]] = set()
+        for ts, m, src in heapq.merge(*sources, key=lambda x: x[0]):
+            if isinstance(src, Path):
+                seen[str(src)] = ts
+            else:
+                # the entries of a segment are yielded by their timestamps, so its offset only passes the lines
+                # whose entries are all yielded
+                name, e = src
+                yielded.add((name, ends[id(e)]))
+                while pending[name] and (name, pending[name][-1]) in yielded:
+                    offsets[name] = pending[name].pop()
             yield m
 
     def truncate(self, time: datetime) -> None:
-        for file in self.path.glob("**/*.pkl"):
-            timestamp = datetime.strptime(file.stem, "%Y-%m-%d_%H-%M-%S-%f").replace(tzinfo=timezone.utc)
-            if timestamp > time.replace(tzinfo=timezone.utc):
+        for file in Path(self.path).glob("**/*.pkl"):
+            if self._file_timestamp(file) > time.replace(tzinfo=timezone.utc):
                 file.unlink()
 
+        with self._lock:
+            for writer in self._writers.values():
+                writer.close()  # reopened in a new segment by the next log
+            self._writers.clear()
+            for idx in self._segment_indexes():
+                entries, _ = self._read_index(idx)
+                cut = time.replace(tzinfo=timezone.utc).timestamp()
+                # the entries are in the order of the records, so the segment is cut at the first later record
+                end = next((e["offset"] for e in entries if e["ts"] > cut), None)
+                if end is None:
+                    continue
+                kept = [e for e in entries if e["offset"] < end]
+                with idx.with_suffix(".seg").open("r+b") as f:
+                    f.truncate(end)
+                idx.write_text("".join(json.dumps(e) + "\n" for e in kept))
+
+        SummaryIndex(self.path).truncate(time)
         _remove_empty_dir(self.path)
 
     def __str__(self) -> str:
@@ -0,0 +1,68 @@
+"""
+A small per-run index of the loop statistics shown by the UI summaries, so they don't have to unpickle the logs.
+
+The index is the file `summary_index.jsonl` in the log folder of a run. Each line updates the fields of one loop:
+    {"loop_id": 3, "ts": <posix timestamp>, "times": {"coding": {"start_time": ..., "end_time": ...}}, "decision": true}
+The lines are appended by the producers of the fields (e.g. the `record` step of the data science loop) and merged
+per loop when the index is read; the "times" of the lines are merged step by step.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+SUMMARY_INDEX_NAME = "summary_index.jsonl"
+
+_lock = threading.Lock()
+
+
+class SummaryIndex:
+
+    def __init__(self, log_path: str | Path) -> None:
+        self.path = Path(log_path) / SUMMARY_INDEX_NAME
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def update(self, loop_id: int, **fields: Any) -> None:
+        line = {"loop_id": loop_id, "ts": datetime.now(timezone.utc).timestamp(), **fields}
+        data = json.dumps(line, default=lambda o: o.isoformat() if isinstance(o, datetime) else str(o)) + "\n"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with _lock, self.path.open("a") as f:
+            f.write(data)  # one write per line, so the lines of concurrent writers are not interleaved
+
+    def _lines(self) -> list[dict[str, Any]]:
+        if not self.path.exists():
+            return []
+        with self.path.open() as f:
+            return [json.loads(line) for line in f if line.endswith("\n")]
+
+    def loops(self) -> dict[int, dict[str, Any]]:
+        """The fields of every loop, sorted by the loop ids; the times are parsed to datetimes."""
+        loops: dict[int, dict[str, Any]] = {}
+        for line in self._lines():
+            fields = loops.setdefault(line.pop("loop_id"), {"times": {}})
+            for step, t in line.pop("times", {}).items():
+                fields["times"][step] = {k: datetime.fromisoformat(v) for k, v in t.items()}
+            fields.update(line)
+        return dict(sorted(loops.items()))
+
+    def truncate(self, time: datetime) -> None:
+        """Remove the updates written after `time`."""
+        if not self.path.exists():
+            return
+        cut = time.replace(tzinfo=timezone.utc).timestamp()
+        kept = [line for line in self._lines() if line["ts"] <= cut]
+        with _lock:
+            self.path.write_text("".join(json.dumps(line) + "\n" for line in kept))
+
+
+def update_summary_index(loop_id: int, **fields: Any) -> None:
+    """Update the summary index of the current run (i.e. the log folder of `rdagent_logger`)."""
+    from rdagent.log import rdagent_logger  # rdagent.log.storage depends on this module
+
+    SummaryIndex(rdagent_logger.storage.path).update(loop_id, **fields)
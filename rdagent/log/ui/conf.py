@@ -18,6 +18,15 @@ class UIBasePropSetting(ExtendedBaseSettings):
 
     trace_folder: str = "./traces"
 
+    trace_page_size: int = 10
+    """The number of messages returned by the log server for each request of a trace"""
+
+    trace_cache_size: int = 16
+    """The number of traces kept in the memory of the log server; the least recently used ones are evicted"""
+
+    trace_idle_seconds: int = 3600
+    """The traces not requested for this long are evicted from the log server"""
+
     enable_cache: bool = True
 
 
@@ -18,6 +18,7 @@ from rdagent.app.data_science.loop import DataScienceRDLoop
 from rdagent.core.proposal import Trace
 from rdagent.core.utils import cache_with_pickle
 from rdagent.log.storage import FileStorage
+from rdagent.log.summary_index import SummaryIndex
 from rdagent.log.ui.conf import UI_SETTING
 from rdagent.log.utils import extract_json, extract_loopid_func_name
 from rdagent.oai.llm_utils import md5_hash
@@ -404,6 +405,21 @@ def load_times_info(log_path: Path) -> dict[int, dict[str, dict[Literal["start_t
             }
     """
     log_storage = FileStorage(log_path)
+    if (index := SummaryIndex(log_path)).exists():
+        loops = index.loops()
+        times_info = defaultdict(dict, {li: loop["times"] for li, loop in loops.items() if loop["times"]})
+        # the steps of the loops not recorded yet (e.g. running in a live session) are read from their logs
+        recorded = {li for li, loop in loops.items() if "record" in loop["times"]}
+
+        def _not_recorded(tag: str) -> bool:
+            li, _ = extract_loopid_func_name(tag)
+            return li is not None and int(li) not in recorded
+
+        for msg in log_storage.iter_msg(tag="time_info", tag_filter=_not_recorded):
+            li, fn = extract_loopid_func_name(msg.tag)
+            times_info[int(li)].setdefault(fn, msg.content)
+        return times_info
+
     time_msgs = list(log_storage.iter_msg(tag="time_info"))
     exp_gen_time_msgs = list(log_storage.iter_msg(tag="exp_gen_time_info"))
     times_info = defaultdict(dict)
@@ -420,6 +436,66 @@ if UI_SETTING.enable_cache:
     load_times_info = cache_with_pickle(_log_path_hash_func, force=True)(load_times_info)
 
 
+def get_index_stat(log_path: Path) -> dict | None:
+    """
+    The statistics of `get_sota_exp_stat` (for both selectors) and `get_score_stat` used by `get_summary_df`,
+    computed from the summary index of the run; None if the run has no index (e.g. it was logged by an older version).
+    """
+    loops = SummaryIndex(log_path).loops()
+    recorded = [li for li, loop in loops.items() if "trace_loop_ids" in loop]
+    if not recorded:
+        return None
+    last = loops[max(recorded, key=lambda li: loops[li]["ts"])]
+
+    def mle_score(li: int | None) -> dict | None:
+        return loops.get(li, {}).get("mle_score") if li is not None else None
+
+    def sota_stat(li: int | None) -> tuple[int | None, dict | None, str | None]:
+        return (li, mle_score(li), map_stat(mle_score(li))) if li is not None else (None, None, None)
+
+    stat = {}
+    stat["sota_loop_id_new"], sota_submit_report, stat["sota_exp_stat_new"] = sota_stat(last["sota_to_submit_loop_id"])
+    stat["sota_exp_score_valid_new"] = loops.get(stat["sota_loop_id_new"], {}).get("valid_score")
+
+    # the best valid selector
+    direction_sign = 1 if last.get("metric_direction") else -1
+    candidates = [
+        li
+        for li in last["trace_loop_ids"]
+        if loops.get(li, {}).get("decision") and loops[li].get("valid_score") is not None
+    ]
+    best = max(candidates, key=lambda li: direction_sign * loops[li]["valid_score"], default=None)
+    stat["sota_loop_id"], sota_bv_report, stat["sota_exp_stat"] = sota_stat(best)
+    stat["sota_exp_score"] = sota_bv_report["score"] if sota_bv_report else None
+    stat["sota_exp_score_new"] = sota_submit_report["score"] if sota_submit_report else None
+
+    # the scores before and after the merge period, like `get_score_stat`
+    valid, test = {False: [], True: []}, {False: [], True: []}
+    is_lower_better = False
+    total_merge_loops = 0
+    stat["submit_is_merge"] = False
+    for li in last["trace_loop_ids"]:
+        loop = loops.get(li, {})
+        is_merge = loop.get("is_merge", False)
+        if is_merge:
+            total_merge_loops += 1
+            stat["submit_is_merge"] |= li == stat["sota_loop_id_new"]
+        if not loop.get("decision") or not (score := loop.get("mle_score")):
+            continue
+        is_lower_better = score.get("is_lower_better", False)
+        valid[is_merge].append(loop.get("valid_score"))
+        if score["score"] is not None:
+            test[is_merge].append(score["score"])
+    best_of = min if is_lower_better else max
+    better = (lambda a, b: a < b) if is_lower_better else (lambda a, b: a > b)
+    stat["valid_improve"] = bool(valid[True]) and (
+        not valid[False] or better(best_of(valid[True]), best_of(valid[False]))
+    )
+    stat["test_improve"] = bool(test[True]) and (not test[False] or better(best_of(test[True]), best_of(test[False])))
+    stat["merge_sota_rate"] = 0 if not total_merge_loops else len(test[True]) / total_merge_loops
+    return stat
+
+
 def _log_folders_summary_hash_func(log_folder: str | Path, hours: int | None = None):
     summary_p = Path(log_folder) / (f"summary.pkl" if hours is None else f"summary_{hours}h.pkl")
     if summary_p.exists():
@@ -488,6 +564,9 @@ def get_summary_df(log_folder: str | Path, hours: int | None = None) -> tuple[di
         v["running_time"] = str(running_time).split(".")[0]
 
         # overwrite sota_exp_stat in summary.pkl because it may not be correct in multi-trace
+        if (index_stat := get_index_stat(log_folder / k)) is not None:
+            v.update(index_stat)
+            continue
         sota_exp_submit, v["sota_loop_id_new"], sota_submit_report, v["sota_exp_stat_new"] = get_sota_exp_stat(
             log_folder / k, selector="auto"
         )
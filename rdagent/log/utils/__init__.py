@@ -1,6 +1,6 @@
-import inspect
 import json
 import re
+import sys
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Optional, TypedDict, cast
@@ -67,13 +67,10 @@ class CallerInfo(TypedDict):
 
 
 def get_caller_info(level: int = 2) -> CallerInfo:
-    # Get the current stack information
-    stack = inspect.stack()
-    # The second element is usually the caller's information
-    caller_info = stack[level]
-    frame = caller_info[0]
+    # Get the frame of the caller directly; `inspect.stack()` would read the source of every frame of the stack
+    frame = sys._getframe(level)
     info: CallerInfo = {
-        "line": caller_info.lineno,
+        "line": frame.f_lineno,
         "name": frame.f_globals["__name__"],  # Get the module name from the frame's globals
         "function": frame.f_code.co_name,  # Get the caller's function name
     }
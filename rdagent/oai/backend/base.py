@@ -1,18 +1,35 @@
 from __future__ import annotations
 
+import atexit
 import io
 import json
+import os
 import re
 import sqlite3
+import threading
 import time
 import tokenize
 import uuid
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from copy import deepcopy
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Callable, List, Optional, Tuple, Type, Union, cast
-
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+    cast,
+)
+
+import numpy as np
 import pytz
 from pydantic import BaseModel, TypeAdapter
 
@@ -22,7 +39,10 @@ from rdagent.log import LogColors
 from rdagent.log import rdagent_logger as logger
 from rdagent.log.timer import RD_Agent_TIMER_wrapper
 from rdagent.oai.llm_conf import LLM_SETTINGS
+from rdagent.oai.utils.chat_cache import CHAT_CACHE_STATS, ChatCacheKey
 from rdagent.oai.utils.embedding import truncate_content_list
+from rdagent.oai.utils.rate_limit import get_rate_limiter
+from rdagent.oai.utils.token_count import fit_to_token_limit
 from rdagent.utils import md5_hash
 
 try:
@@ -136,6 +156,27 @@ class JSONParser:
         return json.dumps(obj)
 
 
+SQLITE_MAX_VARIABLES = 900  # stay below SQLITE_MAX_VARIABLE_NUMBER (999 on old sqlite builds)
+
+
+def _pack_embedding(value: Any) -> bytes | str:
+    """Embeddings (list of numbers) are stored as packed little-endian float32; anything else falls back to JSON."""
+    if isinstance(value, list) and all(isinstance(v, (int, float)) for v in value):
+        return np.asarray(value, dtype="<f4").tobytes()
+    return json.dumps(value)
+
+
+def _unpack_embedding(value: bytes | str) -> Any:
+    """Both the packed float32 blobs and the legacy JSON text rows are supported."""
+    if isinstance(value, bytes):
+        return np.frombuffer(value, dtype="<f4").tolist()
+    return json.loads(value)
+
+
+def _chunks(items: list, size: int = SQLITE_MAX_VARIABLES) -> list[list]:
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
 class SQliteLazyCache(SingletonBaseClass):
     def __init__(self, cache_location: str) -> None:
         super().__init__()
@@ -144,8 +185,10 @@ class SQliteLazyCache(SingletonBaseClass):
         # 确保父目录存在，否则 SQLite 无法创建数据库文件
         Path(cache_location).parent.mkdir(parents=True, exist_ok=True)
         # TODO: sqlite3 does not support multiprocessing.
-        self.conn = sqlite3.connect(cache_location, timeout=20)
+        # The connection is shared by the threads of `async_wrapper`; `_lock` serializes the queries.
+        self.conn = sqlite3.connect(cache_location, timeout=20, check_same_thread=False)
         self.c = self.conn.cursor()
+        self._lock = threading.Lock()
         if not db_file_exist:
             self.c.execute(
                 """
@@ -175,52 +218,235 @@ class SQliteLazyCache(SingletonBaseClass):
 
     def chat_get(self, key: str) -> str | None:
         md5_key = md5_hash(key)
-        self.c.execute("SELECT chat FROM chat_cache WHERE md5_key=?", (md5_key,))
-        result = self.c.fetchone()
+        with self._lock:
+            self.c.execute("SELECT chat FROM chat_cache WHERE md5_key=?", (md5_key,))
+            result = self.c.fetchone()
         return None if result is None else result[0]
 
     def embedding_get(self, key: str) -> list | dict | str | None:
-        md5_key = md5_hash(key)
-        self.c.execute("SELECT embedding FROM embedding_cache WHERE md5_key=?", (md5_key,))
-        result = self.c.fetchone()
-        return None if result is None else json.loads(result[0])
+        return self.embedding_get_many([key]).get(key)
+
+    def embedding_get_many(self, keys: list[str]) -> dict[str, Any]:
+        """Look up several embeddings with one `IN` query per chunk; missing keys are absent from the result."""
+        md5_to_key = {md5_hash(key): key for key in keys}
+        res = {}
+        for md5_chunk in _chunks(list(md5_to_key)):
+            with self._lock:
+                self.c.execute(
+                    f"SELECT md5_key, embedding FROM embedding_cache WHERE md5_key IN ({','.join('?' * len(md5_chunk))})",  # noqa: S608
+                    md5_chunk,
+                )
+                fetched = self.c.fetchall()
+            for md5_key, embedding in fetched:
+                res[md5_to_key[md5_key]] = _unpack_embedding(embedding)
+        return res
 
     def chat_set(self, key: str, value: str) -> None:
         md5_key = md5_hash(key)
-        self.c.execute(
-            "INSERT OR REPLACE INTO chat_cache (md5_key, chat) VALUES (?, ?)",
-            (md5_key, value),
-        )
-        self.conn.commit()
+        with self._lock:
+            self.c.execute(
+                "INSERT OR REPLACE INTO chat_cache (md5_key, chat) VALUES (?, ?)",
+                (md5_key, value),
+            )
+            self.conn.commit()
         return None
 
     def embedding_set(self, content_to_embedding_dict: dict) -> None:
-        for key, value in content_to_embedding_dict.items():
-            md5_key = md5_hash(key)
+        self.embedding_set_many(content_to_embedding_dict)
+
+    def embedding_set_many(self, content_to_embedding_dict: dict) -> None:
+        rows = [(md5_hash(key), _pack_embedding(value)) for key, value in content_to_embedding_dict.items()]
+        with self._lock:
+            self.c.executemany("INSERT OR REPLACE INTO embedding_cache (md5_key, embedding) VALUES (?, ?)", rows)
+            self.conn.commit()
+
+    def message_get(self, conversation_id: str) -> list[dict[str, Any]]:
+        with self._lock:
+            self.c.execute("SELECT message FROM message_cache WHERE conversation_id=?", (conversation_id,))
+            result = self.c.fetchone()
+        return [] if result is None else cast(list[dict[str, Any]], json.loads(result[0]))
+
+    def message_set(self, conversation_id: str, message_value: list[dict[str, Any]]) -> None:
+        with self._lock:
             self.c.execute(
-                "INSERT OR REPLACE INTO embedding_cache (md5_key, embedding) VALUES (?, ?)",
-                (md5_key, json.dumps(value)),
+                "INSERT OR REPLACE INTO message_cache (conversation_id, message) VALUES (?, ?)",
+                (conversation_id, json.dumps(message_value)),
             )
-        self.conn.commit()
+            self.conn.commit()
+        return None
+
+
+class SQliteWALCache(SingletonBaseClass):
+    """
+    A multi-process friendly version of `SQliteLazyCache` with the same interface and table schema.
+
+    - The database runs in WAL mode so readers never block the (single) writer.
+    - Connections are pooled per (process, thread); a forked/spawned worker never reuses the parent's connection.
+    - Writes are buffered and committed with `executemany` in one transaction once `write_batch_size` is reached.
+    - With `shard_num > 1`, records are split into several database files by the prefix of the hashed key,
+      so that concurrent writers of different keys do not contend for the same file lock.
+    """
+
+    TABLES: ClassVar[dict[str, tuple[str, str]]] = {
+        "chat_cache": ("md5_key", "chat"),
+        "embedding_cache": ("md5_key", "embedding"),
+        "message_cache": ("conversation_id", "message"),
+    }
+
+    def __init__(self, cache_location: str, shard_num: int = 1, write_batch_size: int = 1) -> None:
+        if getattr(self, "_initialized", False):
+            # SingletonBaseClass returns the same object for the same kwargs, but `__init__` is still called.
+            return
+        super().__init__()
+        self.cache_location = cache_location
+        self.shard_num = max(1, shard_num)
+        self.write_batch_size = max(1, write_batch_size)
+        Path(cache_location).parent.mkdir(parents=True, exist_ok=True)
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._pending: dict[tuple[str, int], dict[str, Any]] = {}  # (table, shard) -> {key: value}
+        self._pending_n = 0
+        atexit.register(self.flush)
+        self._initialized = True
+
+    @property
+    def shard_paths(self) -> list[Path]:
+        path = Path(self.cache_location)
+        if self.shard_num == 1:
+            return [path]
+        return [path.with_name(f"{path.stem}.shard{i}{path.suffix}") for i in range(self.shard_num)]
+
+    def _shard_of(self, md5_key: str) -> int:
+        return int(md5_key[:8], 16) % self.shard_num
+
+    def _conn(self, shard: int) -> sqlite3.Connection:
+        if getattr(self._local, "pid", None) != os.getpid():
+            # Fresh thread or a forked child: never reuse the connections created by another process.
+            self._local.pid = os.getpid()
+            self._local.pool = {}
+        pool: dict[int, sqlite3.Connection] = self._local.pool
+        if shard not in pool:
+            conn = sqlite3.connect(self.shard_paths[shard], timeout=60)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for table, (key_col, value_col) in self.TABLES.items():
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({key_col} TEXT PRIMARY KEY, {value_col} TEXT)")
+            conn.commit()
+            pool[shard] = conn
+        return pool[shard]
+
+    def _reset_pending_after_fork(self) -> None:
+        if self._pid != os.getpid():
+            # the parent process is responsible for flushing the writes it buffered before forking.
+            self._pid = os.getpid()
+            self._lock = threading.Lock()
+            self._pending = {}
+            self._pending_n = 0
+
+    def _get(self, table: str, key: str, hashed_key: str) -> Any:
+        return self._get_many(table, [(key, hashed_key)]).get(key)
+
+    def _get_many(self, table: str, keys: list[tuple[str, str]]) -> dict[str, Any]:
+        """keys: a list of (key, hashed_key); only the found keys are returned"""
+        self._reset_pending_after_fork()
+        res = {}
+        shard_to_keys: dict[int, list[str]] = {}
+        with self._lock:
+            for key, hashed_key in keys:
+                shard = self._shard_of(hashed_key)
+                pending = self._pending.get((table, shard), {})
+                if key in pending:
+                    res[key] = pending[key]
+                else:
+                    shard_to_keys.setdefault(shard, []).append(key)
+        key_col, value_col = self.TABLES[table]
+        for shard, shard_keys in shard_to_keys.items():
+            conn = self._conn(shard)
+            for key_chunk in _chunks(shard_keys):
+                res.update(
+                    conn.execute(
+                        f"SELECT {key_col}, {value_col} FROM {table} WHERE {key_col} IN ({','.join('?' * len(key_chunk))})",  # noqa: S608
+                        key_chunk,
+                    ).fetchall()
+                )
+        return res
+
+    def _set(self, table: str, records: list[tuple[str, str, Any]]) -> None:
+        """records: a list of (key, hashed_key, value)"""
+        self._reset_pending_after_fork()
+        with self._lock:
+            for key, hashed_key, value in records:
+                self._pending.setdefault((table, self._shard_of(hashed_key)), {})[key] = value
+                self._pending_n += 1
+            need_flush = self._pending_n >= self.write_batch_size
+        if need_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        """Commit all the buffered writes; one transaction per shard."""
+        self._reset_pending_after_fork()
+        with self._lock:
+            pending, self._pending, self._pending_n = self._pending, {}, 0
+        for (table, shard), kv in pending.items():
+            key_col, value_col = self.TABLES[table]
+            conn = self._conn(shard)
+            with conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {table} ({key_col}, {value_col}) VALUES (?, ?)",  # noqa: S608
+                    list(kv.items()),
+                )
+
+    def chat_get(self, key: str) -> str | None:
+        md5_key = md5_hash(key)
+        return self._get("chat_cache", md5_key, md5_key)
+
+    def embedding_get(self, key: str) -> list | dict | str | None:
+        return self.embedding_get_many([key]).get(key)
+
+    def embedding_get_many(self, keys: list[str]) -> dict[str, Any]:
+        md5_to_key = {md5_hash(key): key for key in keys}
+        found = self._get_many("embedding_cache", [(md5_key, md5_key) for md5_key in md5_to_key])
+        return {md5_to_key[md5_key]: _unpack_embedding(value) for md5_key, value in found.items()}
+
+    def chat_set(self, key: str, value: str) -> None:
+        md5_key = md5_hash(key)
+        self._set("chat_cache", [(md5_key, md5_key, value)])
+
+    def embedding_set(self, content_to_embedding_dict: dict) -> None:
+        self.embedding_set_many(content_to_embedding_dict)
+
+    def embedding_set_many(self, content_to_embedding_dict: dict) -> None:
+        records = []
+        for key, value in content_to_embedding_dict.items():
+            md5_key = md5_hash(key)
+            records.append((md5_key, md5_key, _pack_embedding(value)))
+        self._set("embedding_cache", records)
 
     def message_get(self, conversation_id: str) -> list[dict[str, Any]]:
-        self.c.execute("SELECT message FROM message_cache WHERE conversation_id=?", (conversation_id,))
-        result = self.c.fetchone()
-        return [] if result is None else cast(list[dict[str, Any]], json.loads(result[0]))
+        result = self._get("message_cache", conversation_id, md5_hash(conversation_id))
+        return [] if result is None else cast(list[dict[str, Any]], json.loads(result))
 
     def message_set(self, conversation_id: str, message_value: list[dict[str, Any]]) -> None:
-        self.c.execute(
-            "INSERT OR REPLACE INTO message_cache (conversation_id, message) VALUES (?, ?)",
-            (conversation_id, json.dumps(message_value)),
+        self._set("message_cache", [(conversation_id, md5_hash(conversation_id), json.dumps(message_value))])
+
+
+def get_prompt_cache() -> SQliteLazyCache | SQliteWALCache:
+    """Create (or get) the prompt cache selected by `LLM_SETTINGS.prompt_cache_backend`."""
+    if LLM_SETTINGS.prompt_cache_backend == "sqlite_wal":
+        return SQliteWALCache(
+            cache_location=LLM_SETTINGS.prompt_cache_path,
+            shard_num=LLM_SETTINGS.prompt_cache_shard_num,
+            write_batch_size=LLM_SETTINGS.prompt_cache_write_batch_size,
         )
-        self.conn.commit()
-        return None
+    return SQliteLazyCache(cache_location=LLM_SETTINGS.prompt_cache_path)
 
 
 class SessionChatHistoryCache(SingletonBaseClass):
     def __init__(self) -> None:
         """load all history conversation json file from self.session_cache_location"""
-        self.cache = SQliteLazyCache(cache_location=LLM_SETTINGS.prompt_cache_path)
+        self.cache = get_prompt_cache()
 
     def message_get(self, conversation_id: str) -> list[dict[str, Any]]:
         return self.cache.message_get(conversation_id)
@@ -313,7 +539,7 @@ class APIBackend(ABC):
         )
         if self.dump_chat_cache or self.use_chat_cache or self.dump_embedding_cache or self.use_embedding_cache:
             self.cache_file_location = LLM_SETTINGS.prompt_cache_path
-            self.cache = SQliteLazyCache(cache_location=self.cache_file_location)
+            self.cache = get_prompt_cache()
 
         self.retry_wait_seconds = LLM_SETTINGS.retry_wait_seconds
 
@@ -456,6 +682,32 @@ class APIBackend(ABC):
         )
         return self._calculate_token_from_messages(messages)
 
+    def build_messages_and_fit_content(
+        self,
+        render: Callable[[str], str],
+        content: str,
+        system_prompt: str | None = None,
+        *,
+        keep: Literal["head", "tail"] = "tail",
+    ) -> str:
+        """
+        Render the user prompt with the longest head (or tail) of `content` keeping the prompt within
+        `chat_token_limit`; `render(part)` returns the user prompt embedding `part`.
+        """
+        user_prompt = render(content)
+        limit = self.chat_token_limit
+        if self.build_messages_and_calculate_token(user_prompt, system_prompt) <= limit:
+            return user_prompt
+        budget = limit - self.build_messages_and_calculate_token(render(""), system_prompt)
+        empty = self._calculate_token_from_messages([{"role": "user", "content": ""}])
+        part = fit_to_token_limit(
+            content,
+            budget,
+            lambda s: self._calculate_token_from_messages([{"role": "user", "content": s}]) - empty,
+            keep=keep,
+        )
+        return render(part)
+
     def _try_create_chat_completion_or_embedding(  # type: ignore[no-untyped-def]
         self,
         max_retry: int = 10,
@@ -543,7 +795,15 @@ class APIBackend(ABC):
                         match = re.search(r"Please retry after (\d+) seconds\.", e.message)
                         if match:
                             recommended_wait_seconds = int(match.group(1))
-                    time.sleep(recommended_wait_seconds)
+                    if (
+                        openai_imported
+                        and isinstance(e, openai.RateLimitError)
+                        and (limiter := get_rate_limiter()) is not None
+                    ):
+                        # the scheduler pauses all the requests; the retry waits for it
+                        limiter.backoff(recommended_wait_seconds)
+                    else:
+                        time.sleep(recommended_wait_seconds)
                     if RD_Agent_TIMER_wrapper.timer.started and not isinstance(e, json.decoder.JSONDecodeError):
                         RD_Agent_TIMER_wrapper.timer.add_duration(datetime.now() - API_start_time)
                 logger.warning(str(e))
@@ -582,12 +842,10 @@ class APIBackend(ABC):
         # 0) return directly if cache is hit
         if seed is None and LLM_SETTINGS.use_auto_chat_cache_seed_gen:
             seed = LLM_CACHE_SEED_GEN.get_next_seed()
-        input_content_json = json.dumps(messages)
-        input_content_json = (
-            chat_cache_prefix + input_content_json + f"<seed={seed}/>"
-        )  # FIXME this is a hack to make sure the cache represents the round index
+        # NOTE: the seed is a part of the key to make sure the cache represents the round index
+        cache_key = ChatCacheKey(messages, seed=seed, response_format=response_format, prefix=chat_cache_prefix)
         if self.use_chat_cache:
-            cache_result = self.cache.chat_get(input_content_json)
+            cache_result = self._chat_cache_get(cache_key)
             if cache_result is not None:
                 if LLM_SETTINGS.log_llm_chat_content:
                     logger.info(self._build_log_messages(messages), tag="llm_messages")
@@ -605,11 +863,12 @@ class APIBackend(ABC):
             if response_format == {"type": "json_object"} and add_json_in_prompt and not json_added:
                 self._add_json_in_prompt(new_messages)
                 json_added = True
-            response, finish_reason = self._create_chat_completion_inner_function(
-                messages=new_messages,
-                response_format=response_format,
-                **kwargs,
-            )
+            with self._scheduled(lambda: self._calculate_token_from_messages(new_messages)):
+                response, finish_reason = self._create_chat_completion_inner_function(
+                    messages=new_messages,
+                    response_format=response_format,
+                    **kwargs,
+                )
             all_response += response
             if finish_reason is None or finish_reason != "length":
                 break  # we get a full response now.
@@ -647,32 +906,75 @@ class APIBackend(ABC):
             else:
                 logger.warning(f"Unknown response_format: {response_format}, skipping validation.")
         if self.dump_chat_cache:
-            self.cache.chat_set(input_content_json, all_response)
+            self.cache.chat_set(cache_key.exact, all_response)
+            if cache_key.near is not None:
+                self.cache.chat_set(cache_key.near, all_response)
         return all_response
 
+    def _chat_cache_get(self, key: ChatCacheKey) -> str | None:
+        """
+        Look up the exact key, then the key of the legacy format if `chat_cache_legacy_lookup` is enabled (the hit is
+        copied to the exact key), then the near-duplicate key, which is only served if
+        `chat_cache_serve_near_duplicates` is enabled.
+        """
+        if (res := self.cache.chat_get(key.exact)) is not None:
+            CHAT_CACHE_STATS.record("hit")
+            return res
+        if LLM_SETTINGS.chat_cache_legacy_lookup and (res := self.cache.chat_get(key.legacy)) is not None:
+            CHAT_CACHE_STATS.record("legacy_hit")
+            if self.dump_chat_cache:
+                self.cache.chat_set(key.exact, res)
+            return res
+        if key.near is not None and (res := self.cache.chat_get(key.near)) is not None:
+            CHAT_CACHE_STATS.record("near_hit")
+            logger.info(
+                f"Chat cache near-duplicate hit under {CHAT_CACHE_STATS.current_tag()} "
+                f"(the prompt only differs in volatile fields); "
+                f"{'served' if LLM_SETTINGS.chat_cache_serve_near_duplicates else 'not served'}.",
+                tag="chat_cache_stats",
+            )
+            return res if LLM_SETTINGS.chat_cache_serve_near_duplicates else None
+        CHAT_CACHE_STATS.record("miss")
+        return None
+
     def _create_embedding_with_cache(
         self, input_content_list: list[str], *args: Any, **kwargs: Any
     ) -> list[list[float]]:
         content_to_embedding_dict = {}
         filtered_input_content_list = []
         if self.use_embedding_cache:
-            for content in input_content_list:
-                cache_result = self.cache.embedding_get(content)
-                if cache_result is not None:
-                    content_to_embedding_dict[content] = cache_result
-                else:
-                    filtered_input_content_list.append(content)
+            content_to_embedding_dict = self.cache.embedding_get_many(input_content_list)
+            # dict.fromkeys keeps the order and removes the duplicated contents
+            filtered_input_content_list = [
+                content for content in dict.fromkeys(input_content_list) if content not in content_to_embedding_dict
+            ]
         else:
             filtered_input_content_list = input_content_list
 
         if len(filtered_input_content_list) > 0:
-            resp = self._create_embedding_inner_function(input_content_list=filtered_input_content_list)
-            for index, data in enumerate(resp):
-                content_to_embedding_dict[filtered_input_content_list[index]] = data
+            with self._scheduled(
+                lambda: self._calculate_token_from_messages(
+                    [{"role": "user", "content": content} for content in filtered_input_content_list]
+                )
+            ):
+                resp = self._create_embedding_inner_function(input_content_list=filtered_input_content_list)
+            new_content_to_embedding_dict = dict(zip(filtered_input_content_list, resp))
+            content_to_embedding_dict.update(new_content_to_embedding_dict)
             if self.dump_embedding_cache:
-                self.cache.embedding_set(content_to_embedding_dict)
+                # only the newly created embeddings need to be written
+                self.cache.embedding_set_many(new_content_to_embedding_dict)
         return [content_to_embedding_dict[content] for content in input_content_list]  # type: ignore[misc]
 
+    @contextmanager
+    def _scheduled(self, count_tokens: Callable[[], int]) -> Iterator[None]:
+        """Wait for the rate limit scheduler (if enabled) before sending a request to the endpoint."""
+        if (limiter := get_rate_limiter()) is None:
+            yield
+            return
+        limiter.acquire(count_tokens() if limiter.tpm else 0)
+        yield
+        limiter.succeed()
+
     @abstractmethod
     def supports_response_schema(self) -> bool:
         """
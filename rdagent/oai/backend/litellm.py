@@ -28,7 +28,7 @@ from typing import Any, Literal, Optional, Type, TypedDict, Union, cast
 import numpy as np
 from litellm import (
     completion,
-    completion_cost,
+    cost_per_token,
     embedding,
     get_model_info,
     supports_function_calling,
@@ -42,6 +42,7 @@ from rdagent.log import LogColors
 from rdagent.log import rdagent_logger as logger
 from rdagent.oai.backend.base import APIBackend
 from rdagent.oai.llm_conf import LLMSettings
+from rdagent.oai.utils.token_count import TOKEN_COUNT_CACHE
 
 
 # NOTE: Patching! Otherwise, the exception will call the constructor and with following error:
@@ -115,13 +116,30 @@ class LiteLLMAPIBackend(APIBackend):
         """
         Calculate the token count from messages
         """
-        num_tokens = token_counter(
-            model=LITELLM_SETTINGS.chat_model,
-            messages=messages,
-        )
+        num_tokens = self._count_tokens(LITELLM_SETTINGS.chat_model, messages)
         logger.info(f"{LogColors.CYAN}Token count: {LogColors.END} {num_tokens}", tag="debug_litellm_token")
         return num_tokens
 
+    @staticmethod
+    def _count_tokens(model: str, messages: list[dict[str, Any]]) -> int:
+        """
+        `token_counter` memoized per message; the count of the messages is the sum of the counts of each message
+        minus the priming tokens counted with every message.
+        """
+        if not all(set(m) <= {"role", "content"} and isinstance(m.get("content"), str) for m in messages):
+            return token_counter(model=model, messages=messages)  # e.g. images or tool calls
+        primer = TOKEN_COUNT_CACHE.get_or_count(
+            TOKEN_COUNT_CACHE.key(model, "", ""), lambda: token_counter(model=model, messages=[])
+        )
+        return primer + sum(
+            TOKEN_COUNT_CACHE.get_or_count(
+                TOKEN_COUNT_CACHE.key(model, m["role"], m["content"]),
+                lambda m=m: token_counter(model=model, messages=[m]),
+            )
+            - primer
+            for m in messages
+        )
+
     def _create_embedding_inner_function(self, input_content_list: list[str]) -> list[list[float]]:
         """
         Call the embedding function
@@ -256,9 +274,12 @@ class LiteLLMAPIBackend(APIBackend):
                     f"{LogColors.BLUE}assistant:{LogColors.END} {finish_reason_str}\n{content}", tag="llm_messages"
                 )
 
+        # the prompt has usually been counted before (e.g. by the prompt-size checks), so it is read from the cache
+        prompt_tokens = self._count_tokens(model, messages)
+        completion_tokens = token_counter(model=model, text=content)
         global ACC_COST
         try:
-            cost = completion_cost(model=model, messages=messages, completion=content)
+            cost = sum(cost_per_token(model=model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens))
         except Exception as e:
             logger.warning(f"Cost calculation failed for model {model}: {e}. Skip cost statistics.")
             cost = np.nan
@@ -269,8 +290,6 @@ class LiteLLMAPIBackend(APIBackend):
                     f"Current Cost: ${float(cost):.10f}; Accumulated Cost: ${float(ACC_COST):.10f}; {finish_reason=}",
                 )
 
-        prompt_tokens = token_counter(model=model, messages=messages)
-        completion_tokens = token_counter(model=model, text=content)
         logger.log_object(
             {
                 "model": model,
@@ -49,7 +49,43 @@ class LLMSettings(ExtendedBaseSettings):
     dump_embedding_cache: bool = True
     use_embedding_cache: bool = True
     prompt_cache_path: str = str(Path.cwd() / "prompt_cache.db")
+    prompt_cache_backend: Literal["sqlite", "sqlite_wal"] = "sqlite"
+    """
+    - sqlite: a single connection per process (the legacy behaviour).
+    - sqlite_wal: WAL journal, one connection per process/thread and batched writes.
+      It is recommended when several processes (e.g. `multiprocessing_wrapper`) share the cache.
+    """
+    prompt_cache_shard_num: int = 1
+    """Only for `sqlite_wal`. Split the cache into several files by the prefix of the hashed key.
+    Changing it makes the existing cache unreachable."""
+    prompt_cache_write_batch_size: int = 1
+    """Only for `sqlite_wal`. Buffer up to this number of writes before committing them in one transaction.
+    Pending writes are flushed at exit; 1 means write-through."""
+    chat_cache_volatile_patterns: list[str] = []
+    """Regexes of the volatile parts of the prompts (e.g. timestamps). The prompts differing only in them are
+    reported as near-duplicate hits of the chat cache."""
+    chat_cache_serve_near_duplicates: bool = False
+    """Serve the near-duplicate hits from the chat cache instead of only reporting them"""
+    chat_cache_legacy_lookup: bool = False
+    """Also look up the keys of the format before the structured keys (the hits are copied to the structured keys).
+    Enable it to reuse a chat cache written by older versions; it costs one more lookup per miss."""
+    chat_cache_stats_log_interval: int = 100
+    """Log the hit rates of the chat cache per logger tag every so many lookups; 0 (or any value <=0) disables it"""
     max_past_message_include: int = 10
+
+    # Scheduling of the requests (see rdagent.oai.utils.rate_limit)
+    rate_limit_enabled: bool = False
+    """Queue the requests in a shared scheduler and back off globally on rate limit errors"""
+    rate_limit_rpm: int = 0
+    """requests per minute; 0 (or any value <=0) means no limit"""
+    rate_limit_tpm: int = 0
+    """tokens (of the prompts) per minute; 0 (or any value <=0) means no limit"""
+    rate_limit_state_path: str | None = None
+    """a file shared by the processes of the machine to enforce the limits across them; None means per process"""
+    rate_limit_priority: dict[str, int] = {"exp_gen": 0, "propos": 0, "coding": 1, "running": 2, "feedback": 2}
+    """the priority (lower first) of the requests sent by the workflow steps whose name contains the key"""
+    rate_limit_default_priority: int = 1
+
     timeout_fail_limit: int = 10
     violation_fail_limit: int = 1
 
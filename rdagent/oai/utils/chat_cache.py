@@ -0,0 +1,132 @@
+"""
+Keys and statistics of the chat cache used by `APIBackend`.
+
+The key of a conversation is built from the hash of every message (memoized, so a system prompt shared by many
+calls is hashed once), the response format, the cache prefix and the seed, instead of hashing the whole
+serialized conversation.
+
+A secondary key replaces the parts matching `LLM_SETTINGS.chat_cache_volatile_patterns` (e.g. timestamps) by a
+placeholder, so the prompts differing only in such parts can be reported (and optionally served from the cache).
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import re
+from collections import Counter
+from typing import Any
+
+from pydantic import BaseModel
+
+from rdagent.log import rdagent_logger as logger
+from rdagent.oai.llm_conf import LLM_SETTINGS
+from rdagent.utils import md5_hash
+
+_VOLATILE_PLACEHOLDER = "<volatile>"
+
+
+@functools.lru_cache(maxsize=256)  # the prompts are kept alive by the cache, keep it small
+def _text_digest(text: str) -> str:
+    # the same prompt object (e.g. a system prompt) is hashed once; `str` caches its own `hash`
+    return md5_hash(text)
+
+
+def _message_digest(message: dict[str, Any], volatile: re.Pattern | None) -> str:
+    content = message.get("content")
+    if not isinstance(content, str):
+        content = json.dumps(content, sort_keys=True)
+    if volatile is not None:
+        content = volatile.sub(_VOLATILE_PLACEHOLDER, content)
+    extra = {k: v for k, v in message.items() if k not in ("role", "content")}
+    head = f"{message.get('role')}:{json.dumps(extra, sort_keys=True) if extra else ''}:"
+    return md5_hash(head + _text_digest(content))
+
+
+@functools.lru_cache(maxsize=256)
+def _model_digest(model: type[BaseModel]) -> str:
+    return md5_hash(f"{model.__module__}.{model.__qualname__}:{json.dumps(model.model_json_schema(), sort_keys=True)}")
+
+
+@functools.lru_cache(maxsize=16)
+def _volatile_pattern(patterns: tuple[str, ...]) -> re.Pattern | None:
+    return re.compile("|".join(f"(?:{p})" for p in patterns)) if patterns else None
+
+
+class ChatCacheKey:
+
+    def __init__(
+        self, messages: list[dict[str, Any]], seed: int | None, response_format: Any = None, prefix: str = ""
+    ) -> None:
+        self.messages = messages
+        self.seed = seed
+        self.prefix = prefix
+        if response_format is None:
+            self._format_digest = ""
+        elif isinstance(response_format, type) and issubclass(response_format, BaseModel):
+            self._format_digest = _model_digest(response_format)
+        else:
+            self._format_digest = md5_hash(json.dumps(response_format, sort_keys=True, default=str))
+
+    def _build(self, volatile: re.Pattern | None) -> str:
+        digests = ".".join(_message_digest(m, volatile) for m in self.messages)
+        return f"chat:v2:{_text_digest(self.prefix)}:{self._format_digest}:{digests}:seed={self.seed}"
+
+    @functools.cached_property
+    def exact(self) -> str:
+        return self._build(None)
+
+    @functools.cached_property
+    def near(self) -> str | None:
+        """the key ignoring the volatile parts; None if no volatile pattern is configured"""
+        volatile = _volatile_pattern(tuple(LLM_SETTINGS.chat_cache_volatile_patterns))
+        return None if volatile is None else "near:" + self._build(volatile)
+
+    @functools.cached_property
+    def legacy(self) -> str:
+        """the key used before the structured keys"""
+        return self.prefix + json.dumps(self.messages) + f"<seed={self.seed}/>"
+
+
+class ChatCacheStats:
+    """The lookups of the chat cache per logger tag (with the loop/round numbers removed)."""
+
+    OUTCOMES = ("hit", "legacy_hit", "near_hit", "miss")
+
+    def __init__(self) -> None:
+        self.counts: Counter[tuple[str, str]] = Counter()
+        self._n_lookups = 0
+
+    @staticmethod
+    def current_tag() -> str:
+        return re.sub(r"\d+", "*", logger._tag) or "<root>"  # noqa: SLF001
+
+    def record(self, outcome: str) -> None:
+        self.counts[(self.current_tag(), outcome)] += 1
+        self._n_lookups += 1
+        interval = LLM_SETTINGS.chat_cache_stats_log_interval
+        if interval > 0 and self._n_lookups % interval == 0:
+            self.log()
+
+    def hit_rates(self) -> dict[str, dict[str, float]]:
+        """{tag: {"lookups": n, "hit_rate": ..., "near_hit_rate": ...}}"""
+        res = {}
+        for tag in sorted({tag for tag, _ in self.counts}):
+            counts = {o: self.counts[(tag, o)] for o in self.OUTCOMES}
+            n = sum(counts.values())
+            res[tag] = {
+                "lookups": n,
+                "hit_rate": (counts["hit"] + counts["legacy_hit"]) / n,
+                "near_hit_rate": counts["near_hit"] / n,
+            }
+        return res
+
+    def log(self) -> None:
+        lines = [
+            f"{tag}: {r['lookups']} lookups, hit rate {r['hit_rate']:.1%}, near-duplicate rate {r['near_hit_rate']:.1%}"
+            for tag, r in self.hit_rates().items()
+        ]
+        logger.info("Chat cache hit rates:\n" + "\n".join(lines), tag="chat_cache_stats")
+
+
+CHAT_CACHE_STATS = ChatCacheStats()
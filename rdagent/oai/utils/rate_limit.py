@@ -0,0 +1,179 @@
+"""
+A process-wide scheduler of the requests sent by `APIBackend`, so that concurrent callers share one quota
+instead of backing off independently and hitting the endpoint again at the same time.
+
+- Two token buckets limit the requests per minute and the tokens per minute (0 means no limit).
+  The tokens of a request are counted by `_calculate_token_from_messages` before it is sent.
+- Waiting requests are served by priority (lower first), then in arrival order. The priority is set by
+  `llm_priority` or derived from the logger tag, i.e. the step of the workflow (e.g. `Loop_3.coding`).
+- A rate limit error blocks all the requests until the backoff expires. The backoff doubles with every
+  rate limit error received after the previous backoff expired, and is reset by a successful request.
+- With a state file, the buckets and the backoff are shared by all the processes of the machine
+  (e.g. the workers of `multiprocessing_wrapper`); the priorities only apply within a process.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import heapq
+import itertools
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from filelock import FileLock
+
+from rdagent.core.utils import SingletonBaseClass
+from rdagent.log import rdagent_logger as logger
+from rdagent.oai.llm_conf import LLM_SETTINGS
+
+_PRIORITY: contextvars.ContextVar[int | None] = contextvars.ContextVar("_PRIORITY", default=None)
+_MAX_BACKOFF_SECONDS = 600
+
+
+@contextlib.contextmanager
+def llm_priority(priority: int) -> Iterator[None]:
+    """The LLM requests sent in this context are served with `priority` (lower first)."""
+    token = _PRIORITY.set(priority)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+class LLMRateLimiter(SingletonBaseClass):
+
+    def __init__(self, rpm: int = 0, tpm: int = 0, state_path: str | None = None) -> None:
+        """
+        Parameters
+        ----------
+        rpm :
+            the requests per minute; 0 (or any value <= 0) means no limit
+        tpm :
+            the tokens per minute; 0 (or any value <= 0) means no limit
+        state_path :
+            the file holding the state shared by the processes; None keeps the state in this process
+        """
+        if getattr(self, "_initialized", False):
+            # SingletonBaseClass returns the same object for the same kwargs, but `__init__` is still called.
+            return
+        self.rpm = max(rpm, 0)
+        self.tpm = max(tpm, 0)
+        self.state_path = Path(state_path) if state_path else None
+        self._state = self._new_state()
+        self._cond = threading.Condition()
+        self._waiting: list[tuple[int, int]] = []  # heap of (priority, ticket)
+        self._tickets = itertools.count()
+        self._initialized = True
+
+    def _new_state(self) -> dict[str, float]:
+        return {
+            "requests": float(self.rpm),
+            "tokens": float(self.tpm),
+            "updated": time.time(),
+            "blocked_until": 0.0,
+            "backoff_level": 0,
+        }
+
+    def _with_state(self, func: Callable[[dict[str, float], float], Any]) -> Any:
+        """refill the buckets, then call `func(state, now)` and keep the changes"""
+        if self.state_path is None:
+            return self._apply(self._state, func)
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        with FileLock(self.state_path.with_name(f"{self.state_path.name}.lock")):
+            try:
+                state = json.loads(self.state_path.read_text())
+            except (FileNotFoundError, json.JSONDecodeError):
+                state = self._new_state()
+            res = self._apply(state, func)
+            self.state_path.write_text(json.dumps(state))
+        return res
+
+    def _apply(self, state: dict[str, float], func: Callable[[dict[str, float], float], Any]) -> Any:
+        now = time.time()
+        elapsed = max(now - state["updated"], 0.0)
+        state["requests"] = min(self.rpm, state["requests"] + elapsed * self.rpm / 60)
+        state["tokens"] = min(self.tpm, state["tokens"] + elapsed * self.tpm / 60)
+        state["updated"] = now
+        return func(state, now)
+
+    def _take(self, tokens: int) -> Callable[[dict[str, float], float], float]:
+        def take(state: dict[str, float], now: float) -> float:
+            """the seconds to wait; 0 means the request is admitted"""
+            if state["blocked_until"] > now:
+                return state["blocked_until"] - now
+            waits = [0.0]
+            if self.rpm and state["requests"] < 1:
+                waits.append((1 - state["requests"]) * 60 / self.rpm)
+            needed = min(tokens, self.tpm)  # a request larger than the bucket waits for a full bucket
+            if self.tpm and state["tokens"] < needed:
+                waits.append((needed - state["tokens"]) * 60 / self.tpm)
+            if max(waits) == 0:
+                state["requests"] -= 1 if self.rpm else 0
+                state["tokens"] -= needed if self.tpm else 0
+            return max(waits)
+
+        return take
+
+    def _priority(self) -> int:
+        if (priority := _PRIORITY.get()) is not None:
+            return priority
+        for step in reversed(logger._tag.split(".")):  # noqa: SLF001
+            for key, p in LLM_SETTINGS.rate_limit_priority.items():
+                if key in step:
+                    return p
+        return LLM_SETTINGS.rate_limit_default_priority
+
+    def acquire(self, tokens: int = 0) -> None:
+        """Block until a request of `tokens` tokens can be sent."""
+        ticket = (self._priority(), next(self._tickets))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    wait = None  # the others wait until the head of the queue is served
+                    if self._waiting[0] == ticket:
+                        if (wait := self._with_state(self._take(tokens))) <= 0:
+                            return
+                    # the state may be changed by other processes, so check it again from time to time
+                    self._cond.wait(timeout=None if wait is None else min(wait, 1.0))
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def backoff(self, seconds: float) -> None:
+        """Block all the requests after a rate limit error; `seconds` is the wait recommended by the endpoint."""
+
+        def block(state: dict[str, float], now: float) -> float:
+            if state["blocked_until"] <= now:  # not a duplicated error of the requests sent before the last backoff
+                state["backoff_level"] += 1
+            wait = min(seconds * 2 ** (state["backoff_level"] - 1), _MAX_BACKOFF_SECONDS)
+            state["blocked_until"] = max(state["blocked_until"], now + wait)
+            return state["blocked_until"] - now
+
+        logger.warning(f"Rate limited, all the LLM requests are paused for {self._with_state(block):.1f} seconds.")
+
+    def succeed(self) -> None:
+        """Reset the backoff after a successful request."""
+        if self.state_path is None and not self._state["backoff_level"]:
+            return  # avoid the lock on the hot path
+
+        def reset(state: dict[str, float], now: float) -> None:
+            state["backoff_level"] = 0
+
+        self._with_state(reset)
+
+
+def get_rate_limiter() -> LLMRateLimiter | None:
+    """The scheduler configured by LLM_SETTINGS; None if it is disabled."""
+    if not LLM_SETTINGS.rate_limit_enabled:
+        return None
+    return LLMRateLimiter(
+        rpm=LLM_SETTINGS.rate_limit_rpm,
+        tpm=LLM_SETTINGS.rate_limit_tpm,
+        state_path=LLM_SETTINGS.rate_limit_state_path,
+    )
@@ -0,0 +1,100 @@
+"""
+Token counting helpers for the prompt-size checks of `APIBackend`.
+
+- `TokenCountCache` memoizes the token count of every message, so the system prompt and the parts shared by the
+  successive versions of a prompt are tokenized once. The count of a conversation is the sum of the counts of its
+  messages (minus the priming tokens counted with every message), which is how `litellm.token_counter` counts them.
+- `fit_to_token_limit` finds the longest part of a content fitting a token budget by bisecting its length, i.e. it
+  tokenizes O(log n) candidate parts of the content instead of the whole prompt at every try.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Literal
+
+from rdagent.utils import md5_hash
+
+
+class TokenCountCache:
+    """A thread-safe LRU cache of token counts keyed by the digest of (model, role, content)."""
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize = maxsize
+        self._counts: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, role: str, content: str) -> str:
+        return md5_hash(f"{model}\0{role}\0{content}")
+
+    def get_or_count(self, key: str, count: Callable[[], int]) -> int:
+        with self._lock:
+            if (n := self._counts.get(key)) is not None:
+                self._counts.move_to_end(key)
+                self.hits += 1
+                return n
+        n = count()  # counted outside of the lock; a concurrent miss counts the same value
+        with self._lock:
+            self.misses += 1
+            self._counts[key] = n
+            if len(self._counts) > self.maxsize:
+                self._counts.popitem(last=False)
+        return n
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self.hits = self.misses = 0
+
+
+TOKEN_COUNT_CACHE = TokenCountCache()
+
+
+def fit_to_token_limit(
+    content: str,
+    budget: int,
+    count: Callable[[str], int],
+    keep: Literal["head", "tail"] = "tail",
+    tolerance: float = 0.01,
+) -> str:
+    """
+    The longest head (or tail) of `content` counted within `budget` tokens.
+
+    Parameters
+    ----------
+    content :
+        the content to shrink
+    budget :
+        the number of tokens the returned part may take
+    count :
+        counts the tokens of a part of the content
+    keep :
+        "tail" keeps the end of the content (e.g. the last lines of an execution log), "head" keeps its beginning
+    tolerance :
+        the search stops when the uncertainty on the length is below this fraction of the length of the part
+    """
+    n_tokens = count(content)
+    if n_tokens <= budget:
+        return content
+    if budget <= 0 or not content:
+        return ""
+
+    def part(length: int) -> str:
+        if keep == "head":
+            return content[:length]
+        return content[len(content) - length :]
+
+    lo, hi = 0, len(content)  # part(lo) fits, part(hi) does not
+    # the first guess assumes the tokens are spread evenly, which is usually close to the answer
+    guess = min(max(len(content) * budget // n_tokens, 1), hi - 1)
+    while guess > lo and hi - lo > max(1, int(hi * tolerance)):
+        if count(part(guess)) <= budget:
+            lo = guess
+        else:
+            hi = guess
+        guess = (lo + hi) // 2
+    return part(lo)
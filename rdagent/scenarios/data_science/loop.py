@@ -1,7 +1,7 @@
 import asyncio
 import shutil
 import subprocess
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Optional, Union
 
@@ -27,6 +27,7 @@ from rdagent.core.proposal import ExperimentFeedback, ExpGen
 from rdagent.core.scenario import Scenario
 from rdagent.core.utils import import_class
 from rdagent.log import rdagent_logger as logger
+from rdagent.log.summary_index import update_summary_index
 from rdagent.scenarios.data_science.dev.feedback import DSExperiment2Feedback
 from rdagent.scenarios.data_science.dev.runner import DSCoSTEERRunner
 from rdagent.scenarios.data_science.experiment.experiment import DSExperiment
@@ -207,7 +208,37 @@ class DataScienceRDLoop(RDLoop):
         logger.log_object(feedback)
         return feedback
 
+    def _update_summary_index(
+        self,
+        prev_out: dict[str, Any],
+        exp: DSExperiment | None,
+        sota_exp_to_submit: DSExperiment | None,
+        record_start: datetime,
+    ) -> None:
+        """Keep the statistics of the loop in the summary index read by the UI (see rdagent.log.summary_index)."""
+        loop_id = prev_out[self.LOOP_IDX_KEY]
+        times = {self.steps[t.step_idx]: {"start_time": t.start, "end_time": t.end} for t in self.loop_trace[loop_id]}
+        times["record"] = {"start_time": record_start, "end_time": datetime.now(timezone.utc)}
+        valid_score = None
+        try:
+            valid_score = float(exp.result.loc["ensemble"].iloc[0])
+        except Exception:
+            pass  # not run, or no ensemble score
+        feedback = prev_out.get("feedback") if prev_out.get(self.EXCEPTION_KEY) is None else None
+        loop_ids = [self.trace.idx2loop_id.get(i) for i in range(len(self.trace.hist))]
+        sota_idx = next((i for i, (e, _) in enumerate(self.trace.hist) if e is sota_exp_to_submit), None)
+        update_summary_index(
+            loop_id,
+            times=times,
+            decision=bool(feedback and feedback.decision),
+            valid_score=valid_score,
+            metric_direction=getattr(self.trace.scen, "metric_direction", None),
+            trace_loop_ids=loop_ids,
+            sota_to_submit_loop_id=None if sota_idx is None else loop_ids[sota_idx],
+        )
+
     def record(self, prev_out: dict[str, Any]):
+        start = datetime.now(timezone.utc)
 
         exp: DSExperiment = None
 
@@ -285,6 +316,7 @@ class DataScienceRDLoop(RDLoop):
 
         logger.log_object(self.trace, tag="trace")
         logger.log_object(self.trace.sota_experiment(search_type="all"), tag="SOTA experiment")
+        self._update_summary_index(prev_out, exp, sota_exp_to_submit, start)
 
         if DS_RD_SETTING.enable_knowledge_base and DS_RD_SETTING.knowledge_base_version == "v1":
             logger.log_object(self.trace.knowledge_base, tag="knowledge_base")
@@ -9,6 +9,7 @@ from rdagent.core.conf import RD_AGENT_SETTINGS
 from rdagent.core.proposal import ExpGen, ExpPlanner
 from rdagent.core.utils import import_class
 from rdagent.log import rdagent_logger as logger
+from rdagent.log.summary_index import update_summary_index
 from rdagent.log.timer import RD_Agent_TIMER_wrapper, RDAgentTimer
 from rdagent.scenarios.data_science.experiment.experiment import DSExperiment
 from rdagent.scenarios.data_science.loop import DataScienceRDLoop
@@ -132,6 +133,11 @@ class ParallelMultiTraceExpGen(ExpGen):
                     },
                     tag="exp_gen_time_info",
                 )
+                update_summary_index(
+                    loop.loop_idx,
+                    times={"exp_gen": {"start_time": start, "end_time": end}},
+                    is_merge=exp_gen_type == type(self.merge_exp_gen).__name__,
+                )
                 exp.set_local_selection(local_selection)
                 exp.plan = ds_plan
 
@@ -1,5 +1,6 @@
 from typing import List
 
+import numpy as np
 import pandas as pd
 
 from rdagent.components.coder.CoSTEER.evaluators import CoSTEERMultiFeedback
@@ -32,14 +33,27 @@ def process_factor_data(exp_or_list: List[QlibFactorExperiment] | QlibFactorExpe
                 # otherwise, it is developed with designed task. So it should have feedback.
                 assert isinstance(exp.prop_dev_feedback, CoSTEERMultiFeedback)
                 # Iterate over sub-implementations and execute them to get each factor data
-                message_and_df_list = multiprocessing_wrapper(
-                    [
-                        (implementation.execute, ("All",))
-                        for implementation, fb in zip(exp.sub_workspace_list, exp.prop_dev_feedback)
-                        if implementation and fb
-                    ],  # only execute successfully feedback
+                implementations = [
+                    implementation
+                    for implementation, fb in zip(exp.sub_workspace_list, exp.prop_dev_feedback)
+                    if implementation and fb
+                ]  # only execute successfully feedback
+                # The factor values in the columnar cache are computed in subprocesses but memory-mapped here
+                # instead of being pickled back to this process.
+                cached = [implementation.value_cache_enabled("All") for implementation in implementations]
+                multiprocessing_wrapper(
+                    [(impl.warm_value_cache, ("All",)) for impl, c in zip(implementations, cached) if c],
                     n=RD_AGENT_SETTINGS.multi_proc_n,
                 )
+                uncached_results = iter(
+                    multiprocessing_wrapper(
+                        [(impl.execute, ("All",)) for impl, c in zip(implementations, cached) if not c],
+                        n=RD_AGENT_SETTINGS.multi_proc_n,
+                    )
+                )
+                message_and_df_list = [
+                    impl.execute("All") if c else next(uncached_results) for impl, c in zip(implementations, cached)
+                ]
                 error_message = ""
                 for message, df in message_and_df_list:
                     # Check if factor generation was successful
@@ -65,3 +79,71 @@ def process_factor_data(exp_or_list: List[QlibFactorExperiment] | QlibFactorExpe
         raise FactorEmptyError(
             f"No valid factor data found to merge (in process_factor_data) because of {error_message}."
         )
+
+
+def cross_sectional_ic_matrix(
+    left: pd.DataFrame, right: pd.DataFrame, group_level: str = "datetime", max_batch_elements: int = 1 << 24
+) -> np.ndarray:
+    """
+    The mean IC (over the groups, e.g. trading days) between every column of `left` and every column of `right`.
+
+    It gives the same result as computing
+    `pd.concat([left, right], axis=1).groupby(group_level).apply(lambda x: x[l].corr(x[r])).mean()` for every pair
+    (Pearson correlation on the rows where both columns are not NaN), but every group is demeaned in one pass
+    and the whole (left x right) matrix is computed by batched matrix products over padded groups.
+
+    Parameters
+    ----------
+    max_batch_elements :
+        the size of the padded (groups, rows, columns) array of each batch; it bounds the memory usage
+
+    Returns
+    -------
+    np.ndarray
+        shape (left.shape[1], right.shape[1]); NaN if no group has a valid correlation
+    """
+    n_left = left.shape[1]
+    concat = pd.concat([left, right], axis=1)
+    codes, groups = pd.factorize(concat.index.get_level_values(group_level), sort=True)
+    order = np.argsort(codes, kind="stable")
+    values = concat.to_numpy(dtype=np.float64)[order]
+    codes = codes[order]
+    counts = np.bincount(codes, minlength=len(groups))
+    starts = np.concatenate([[0], np.cumsum(counts)])
+    pos = np.arange(len(codes)) - starts[codes]  # the position of each row inside its group
+
+    ic_sum = np.zeros((n_left, right.shape[1]))
+    ic_cnt = np.zeros((n_left, right.shape[1]))
+    n_rows = int(counts.max()) if len(counts) else 0
+    batch = max(1, max_batch_elements // max(1, n_rows * concat.shape[1]))
+    for g0 in range(0, len(groups), batch):
+        g1 = min(g0 + batch, len(groups))
+        r0, r1 = starts[g0], starts[g1]
+        padded = np.full((g1 - g0, n_rows, concat.shape[1]), np.nan)
+        padded[codes[r0:r1] - g0, pos[r0:r1]] = values[r0:r1]
+
+        mask = ~np.isnan(padded)
+        # demean each column in each group; the formula below is shift invariant, it only improves the precision
+        mean = np.nansum(padded, axis=1, keepdims=True) / np.maximum(mask.sum(axis=1, keepdims=True), 1)
+        v = np.where(mask, padded - mean, 0.0)
+        x, y = v[..., :n_left], v[..., n_left:]
+        mx, my = mask[..., :n_left].astype(np.float64), mask[..., n_left:].astype(np.float64)
+        xt, mxt = x.transpose(0, 2, 1), mx.transpose(0, 2, 1)
+
+        # pairwise sums over the rows where both columns are valid
+        n = mxt @ my
+        sx, sy = xt @ my, mxt @ y
+        sxx, syy = (xt * xt) @ my, mxt @ (y * y)
+        sxy = xt @ y
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cov = sxy - sx * sy / n
+            var_x = sxx - sx * sx / n
+            var_y = syy - sy * sy / n
+            ic = np.clip(cov / np.sqrt(var_x * var_y), -1.0, 1.0)
+        ic[(n < 2) | (var_x <= 0) | (var_y <= 0)] = np.nan
+
+        valid = ~np.isnan(ic)
+        ic_sum += np.where(valid, ic, 0.0).sum(axis=0)
+        ic_cnt += valid.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(ic_cnt > 0, ic_sum / ic_cnt, np.nan)
@@ -2,14 +2,28 @@
 Here are some infrastructure to build a agent
 
 The motivation of template and AgentOutput Design
+
+The templates are rendered hundreds of times per loop, so the process keeps
+- the parsed template files (reloaded when they are modified),
+- the file each uri is resolved to,
+- the compiled templates, by their resolved uri (recompiled when their source changes),
+and compiles them with one shared jinja environment (with a bytecode cache for the new processes).
 """
 
-import inspect
+import copy
+import functools
+import sys
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 
 import yaml
-from jinja2 import Environment, FunctionLoader, StrictUndefined
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FunctionLoader,
+    StrictUndefined,
+    Template,
+)
 
 from rdagent.core.conf import RD_AGENT_SETTINGS
 from rdagent.log import rdagent_logger as logger
@@ -17,30 +31,59 @@ from rdagent.log import rdagent_logger as logger
 DIRNAME = Path(__file__).absolute().resolve().parent
 PROJ_PATH = DIRNAME.parent.parent  # rdagent
 
+# (path, ftype) -> (mtime, the parsed content of the file)
+_FILE_CACHE: dict[tuple[str, str], tuple[int, Any]] = {}
+# (uri, caller_dir, ftype, app_tpl) -> (the file path, the yaml keys) the uri is resolved to
+_URI_CACHE: dict[tuple[str, Path, str, str | None], tuple[Path, list[str]]] = {}
+# the resolved uri -> (source, the compiled template)
+_TEMPLATE_CACHE: dict[str, tuple[str, Template]] = {}
 
-def get_caller_dir(upshift: int = 0) -> Path:
-    # Inspect the calling stack to get the caller's directory
-    stack = inspect.stack()
-    caller_frame = stack[1 + upshift]
-    caller_module = inspect.getmodule(caller_frame[0])
-    if caller_module and caller_module.__file__:
-        caller_dir = Path(caller_module.__file__).parent
-    else:
-        caller_dir = DIRNAME
-    return caller_dir
 
-
-def load_content(uri: str, caller_dir: Path | None = None, ftype: str = "yaml") -> Any:
+def get_caller_dir(upshift: int = 0) -> Path:
+    # Get the directory of the caller's module from its frame (`inspect.stack()` is too slow for the templates)
+    caller_file = sys._getframe(1 + upshift).f_globals.get("__file__")
+    return Path(caller_file).parent if caller_file else DIRNAME
+
+
+def _read_file(file_path: Path, ftype: str) -> Any:
+    mtime = file_path.stat().st_mtime_ns  # raises FileNotFoundError
+    key = (str(file_path), ftype)
+    cached = _FILE_CACHE.get(key)
+    if cached is None or cached[0] != mtime:
+        if ftype == "yaml":
+            # Parse the UTF-8 encoded YAML configuration for cross-platform compatibility
+            with file_path.open(encoding="utf-8") as file:
+                content = yaml.safe_load(file)
+        else:
+            content = file_path.read_text()
+        cached = _FILE_CACHE[key] = (mtime, content)
+    return cached[1]
+
+
+def _get_value(file_path: Path, yaml_trace: list[str], ftype: str) -> Any:
+    content = _read_file(file_path, ftype)
+    # Traverse the YAML content to get the desired template
+    for key in yaml_trace:
+        content = content[key]
+    return content
+
+
+def resolve_content(uri: str, caller_dir: Path, ftype: str = "yaml") -> tuple[str, Any]:
     """
-    Please refer to RDAT.__init__ file
+    Return the resolved uri (i.e. `<file path>:<yaml trace>`) and the content of `uri`.
+    The content is shared by the callers and should not be modified.
     """
-    if caller_dir is None:
-        caller_dir = get_caller_dir(upshift=1)
+    key = (uri, caller_dir, ftype, RD_AGENT_SETTINGS.app_tpl)
+    if (resolved := _URI_CACHE.get(key)) is not None:
+        try:
+            return f"{resolved[0]}:{'.'.join(resolved[1])}", _get_value(*resolved, ftype)
+        except (FileNotFoundError, KeyError):
+            del _URI_CACHE[key]  # the file is moved or modified; resolve it again
+
     # Parse the URI
     path_part, *yaml_trace = uri.split(":")
     assert len(yaml_trace) <= 1, f"Invalid uri {uri}, only one yaml trace is allowed."
     yaml_trace = [key for yt in yaml_trace for key in yt.split(".")]
-
     # load file_path with priorities.
     if path_part.startswith("."):
         file_path_l = [caller_dir / f"{path_part[1:].replace('.', '/')}.{ftype}"]
@@ -62,23 +105,73 @@ def load_content(uri: str, caller_dir: Path | None = None, ftype: str = "yaml")
             file_path_l.insert(0, (PROJ_PATH.parent / path_part.replace(".", "/")).with_suffix(f".{ftype}"))
 
     for file_path in file_path_l:
+        file_path = file_path.absolute()  # the relative paths are relative to the current directory
         try:
-            if ftype == "yaml":
-                # Parse the UTF-8 encoded YAML configuration for cross-platform compatibility
-                with file_path.open(encoding="utf-8") as file:
-                    yaml_content = yaml.safe_load(file)
-                # Traverse the YAML content to get the desired template
-                for key in yaml_trace:
-                    yaml_content = yaml_content[key]
-                return yaml_content
-
-            return file_path.read_text()
+            content = _get_value(file_path, yaml_trace, ftype)
         except FileNotFoundError:
             continue  # the file does not exist, so goto the next loop.
         except KeyError:
             continue  # the file exists, but the yaml key is missing.
-    else:
-        raise FileNotFoundError(f"Cannot find {uri} in {file_path_l}")
+        _URI_CACHE[key] = (file_path, yaml_trace)
+        return f"{file_path}:{'.'.join(yaml_trace)}", content
+    raise FileNotFoundError(f"Cannot find {uri} in {file_path_l}")
+
+
+def load_content(uri: str, caller_dir: Path | None = None, ftype: str = "yaml") -> Any:
+    """
+    Please refer to RDAT.__init__ file
+    """
+    if caller_dir is None:
+        caller_dir = get_caller_dir(upshift=1)
+    content = resolve_content(uri, caller_dir, ftype)[1]
+    return content if isinstance(content, str) else copy.deepcopy(content)
+
+
+def _load_included(uri: str) -> tuple[str, str, Callable[[], bool]]:
+    # for supporting grammar like below.
+    # `{% include "scenarios.data_science.share:component_spec.DataLoadSpec" %}`
+    resolved, source = resolve_content(uri, DIRNAME)
+    app_tpl = RD_AGENT_SETTINGS.app_tpl
+    return source, resolved, lambda: app_tpl == RD_AGENT_SETTINGS.app_tpl and resolve_content(uri, DIRNAME)[1] is source
+
+
+_ENV = Environment(
+    undefined=StrictUndefined,
+    loader=FunctionLoader(_load_included),
+    bytecode_cache=FileSystemBytecodeCache() if RD_AGENT_SETTINGS.tpl_bytecode_cache else None,
+)
+
+
+def _compile(name: str, source: str) -> Template:
+    """`_ENV.from_string(source)` through the bytecode cache of the environment."""
+    bcc = _ENV.bytecode_cache
+    bucket = None if bcc is None else bcc.get_bucket(_ENV, name, None, source)
+    code = None if bucket is None else bucket.code
+    if code is None:
+        code = _ENV.compile(source, name)
+        if bcc is not None and bucket is not None:
+            bucket.code = code
+            bcc.set_bucket(bucket)
+    return _ENV.template_class.from_code(_ENV, code, _ENV.make_globals(None))
+
+
+def get_template(resolved: str, source: str) -> Template:
+    """The compiled template of the resolved uri; it is compiled again when its source is changed."""
+    cached = _TEMPLATE_CACHE.get(resolved)
+    if cached is None or (cached[0] is not source and cached[0] != source):
+        cached = _TEMPLATE_CACHE[resolved] = (source, _compile(resolved, source))
+    return cached[1]
+
+
+@functools.lru_cache(maxsize=None)
+def _project_uri(uri: str, caller_dir: Path) -> str:
+    if uri.startswith("."):
+        try:
+            # modify the uri to a raltive path to the project for easier finding prompts.yaml
+            return f"{str(caller_dir.resolve().relative_to(PROJ_PATH)).replace('/', '.')}{uri}"
+        except ValueError:
+            pass
+    return uri
 
 
 # class T(SingletonBaseClass): TODO: singleton does not support args now.
@@ -88,7 +181,7 @@ class RDAT:
     Use the simplest way to (C)reate a Template and (r)ender it!!
     """
 
-    def __init__(self, uri: str, ftype: str = "yaml"):
+    def __init__(self, uri: str, ftype: str = "yaml", log: bool | None = None):
         """
         here are some uri usages
             case 1) "a.b.c:x.y.z"
@@ -108,40 +201,34 @@ class RDAT:
         -.a.b.c has the highest priority
         - <current directory>/a/b/c.yaml via a.b.c  (So you can make customization under current directory)
         - <RD-Agent pack directory>/a/b/c.yaml via a.b.c  (RD-Agent provides the default template)
+
+        `log` is whether `r` logs the rendering with the tag `debug_tpl` (`RD_AGENT_SETTINGS.tpl_log` by default);
+        it can be turned off for the templates rendered on hot paths.
         """
-        self.uri = uri
         caller_dir = get_caller_dir(1)
-        if uri.startswith("."):
-            try:
-                # modify the uri to a raltive path to the project for easier finding prompts.yaml
-                self.uri = f"{str(caller_dir.resolve().relative_to(PROJ_PATH)).replace('/', '.')}{uri}"
-            except ValueError:
-                pass
-        self.template = load_content(uri, caller_dir=caller_dir, ftype=ftype)
+        self.uri = _project_uri(uri, caller_dir)
+        self.log = RD_AGENT_SETTINGS.tpl_log if log is None else log
+        self._resolved, self.template = resolve_content(uri, caller_dir, ftype)
+        if not isinstance(self.template, str):
+            self.template = copy.deepcopy(self.template)
 
     def r(self, **context: Any) -> str:
         """
         Render the template with the given context.
         """
-        # loader=FunctionLoader(load_conent) is for supporting grammar like below.
-        # `{% include "scenarios.data_science.share:component_spec.DataLoadSpec" %}`
-        rendered = (
-            Environment(undefined=StrictUndefined, loader=FunctionLoader(load_content))
-            .from_string(self.template)
-            .render(**context)
-            .strip("\n")
-        )
+        rendered = get_template(self._resolved, self.template).render(**context).strip("\n")
         while "\n\n\n" in rendered:
             rendered = rendered.replace("\n\n\n", "\n\n")
-        logger.log_object(
-            obj={
-                "uri": self.uri,
-                "template": self.template,
-                "context": context,
-                "rendered": rendered,
-            },
-            tag="debug_tpl",
-        )
+        if self.log:
+            logger.log_object(
+                obj={
+                    "uri": self.uri,
+                    "template": self.template,
+                    "context": context,
+                    "rendered": rendered,
+                },
+                tag="debug_tpl",
+            )
         return rendered
 
 
@@ -7,6 +7,7 @@ Tries to create uniform environment for the agent to run;
 
 # TODO: move the scenario specific docker env into other folders.
 
+import collections
 import contextlib
 import json
 import os
@@ -44,6 +45,9 @@ from rdagent.oai.llm_utils import md5_hash
 from rdagent.utils import filter_redundant_text
 from rdagent.utils.agent.tpl import T
 from rdagent.utils.fmt import shrink_text
+from rdagent.utils.probe_cache import ProbeCache
+from rdagent.utils.sandbox import DockerSandbox, LocalSandbox, run_in_sandbox
+from rdagent.utils.snapshot import WorkspaceSnapshotStore, folder_file_hashes
 from rdagent.utils.workflow import wait_retry
 
 
@@ -126,6 +130,13 @@ class EnvConf(ExtendedBaseSettings):
     enable_cache: bool = True
     retry_count: int = 5  # retry count for the docker run
     retry_wait_seconds: int = 10  # retry wait seconds for the docker run
+    warm_sandbox: bool = False
+    """run the entries in a sandbox kept alive per (env conf, workspace) instead of a new container or process per run;
+    see `rdagent.utils.sandbox`"""
+    warm_sandbox_max: int = 4
+    """the idle warm sandboxes kept by a process; the least recently used ones are closed first"""
+    warm_sandbox_idle_timeout: int | None = 600
+    """the seconds a warm sandbox is kept idle before it is closed; None keeps it until the process exits"""
 
     model_config = SettingsConfigDict(
         # TODO: add prefix ....
@@ -155,6 +166,74 @@ class EnvResult:
         )
 
 
+_CONSOLE = Console()  # creating a console per line of output is slow
+
+
+def _echo(text: str, end: str = "\n") -> None:
+    _CONSOLE.out(text, end=end, highlight=False)
+
+
+class OutputCapture:
+    """
+    Capture the output of a run in linear time with bounded memory.
+
+    At most `limit` chars are kept in memory: the head and the tail of the output (`get_truncated_stdout` only shows
+    the head and the tail of it). When the output is longer, the whole output is written to a file in `spool_dir`
+    (by default the `env_output` folder of the current log trace, so it is kept and removed along with the trace),
+    which is referred to in place of the hidden part.
+    """
+
+    def __init__(self, limit: int | None = None, spool_dir: str | Path | None = None) -> None:
+        if limit is None:
+            limit = RD_AGENT_SETTINGS.stdout_capture_len
+        if limit <= 0:
+            limit = 2 * RD_AGENT_SETTINGS.stdout_context_len * RD_AGENT_SETTINGS.stdout_line_len
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        self.head: list[str] = []
+        self.head_len = 0
+        self.tail: collections.deque[str] = collections.deque()
+        self.tail_len = 0
+        self.total = 0
+        self.spool_dir = spool_dir
+        self.file: Any = None  # the file of the whole output, if it is too long
+
+    def write(self, text: str) -> None:
+        self.total += len(text)
+        if self.file is not None:
+            self.file.write(text)
+        if (room := self.head_limit - self.head_len) > 0:
+            self.head.append(text[:room])
+            self.head_len += len(self.head[-1])
+            text = text[room:]
+        if not text:
+            return
+        if self.tail_len + len(text) > self.tail_limit and self.file is None:
+            spool_dir = Path(self.spool_dir or Path(logger.storage.path) / "env_output")
+            spool_dir.mkdir(parents=True, exist_ok=True)
+            self.file = (spool_dir / f"{time.strftime('%Y-%m-%d_%H-%M-%S')}-{uuid.uuid4().hex[:8]}.log").open(
+                "w", encoding="utf-8"
+            )
+            self.file.writelines([*self.head, *self.tail, text])
+        if len(text) > self.tail_limit:
+            text = text[-self.tail_limit :]
+        self.tail.append(text)
+        self.tail_len += len(text)
+        while self.tail_len - len(self.tail[0]) >= self.tail_limit:
+            self.tail_len -= len(self.tail.popleft())
+
+    def getvalue(self) -> str:
+        if self.file is None:
+            return "".join(self.head) + "".join(self.tail)
+        self.file.close()
+        tail = "".join(self.tail)[-self.tail_limit :]
+        hidden = self.total - self.head_len - len(tail)
+        return (
+            f"{''.join(self.head)}\n... ({hidden} chars are hidden, the whole output is in {self.file.name}) ...\n"
+            f"{tail}"
+        )
+
+
 class Env(Generic[ASpecificEnvConf]):
     """
     We use BaseModel as the setting due to the features it provides
@@ -354,45 +433,35 @@ class Env(Generic[ASpecificEnvConf]):
     ) -> EnvResult:
         """
         Run the folder under the environment.
-        Will cache the output and the folder diff for next round of running.
-        Use the python codes and the parameters(entry, running_extra_volume) as key to hash the input.
+        Will cache the output and a snapshot of the folder for next round of running.
+        Use the python codes, csv files and the parameters(entry, running_extra_volume) as key to hash the input.
         """
-        target_folder = Path(RD_AGENT_SETTINGS.pickle_cache_folder_path_str) / f"utils.env.run"
-        target_folder.mkdir(parents=True, exist_ok=True)
+        store = WorkspaceSnapshotStore(
+            Path(RD_AGENT_SETTINGS.pickle_cache_folder_path_str) / "utils.env.run",
+            size_limit=RD_AGENT_SETTINGS.env_cache_size_limit,
+            max_age_days=RD_AGENT_SETTINGS.env_cache_max_age_days,
+        )
 
         # we must add the information of data (beyond code) into the key.
         # Otherwise, all commands operating on data will become invalid (e.g. rm -r submission.csv)
-        # So we recursively walk in the folder and add the sorted relative filename list as part of the key.
-        # data_key = []
-        # for path in Path(local_path).rglob("*"):
-        #     p = str(path.relative_to(Path(local_path)))
-        #     if p.startswith("__pycache__"):
-        #         continue
-        #     data_key.append(p)
-        # data_key = sorted(data_key)
-
+        # Files are hashed by content; unchanged files (same size/mtime/inode) are not read again.
         key = md5_hash(
-            json.dumps(
-                [
-                    [str(path.relative_to(Path(local_path))), path.read_text()]
-                    for path in sorted(list(Path(local_path).rglob("*.py")) + list(Path(local_path).rglob("*.csv")))
-                ]
-            )
+            json.dumps(folder_file_hashes(local_path, patterns=("*.py", "*.csv")))
             + json.dumps({"entry": entry, "running_extra_volume": dict(running_extra_volume)})
             + json.dumps({"extra_volumes": self.conf.extra_volumes})
-            # + json.dumps(data_key)
         )
-        if Path(target_folder / f"{key}.pkl").exists() and Path(target_folder / f"{key}.zip").exists():
-            with open(target_folder / f"{key}.pkl", "rb") as f:
-                ret = pickle.load(f)
-            self.unzip_a_file_into_a_folder(str(target_folder / f"{key}.zip"), local_path)
-        else:
+        hit, ret = store.get(key, local_path)
+        if not hit:
             ret = self.__run_with_retry(entry, local_path, env, running_extra_volume)
-            with open(target_folder / f"{key}.pkl", "wb") as f:
-                pickle.dump(ret, f)
-            self.zip_a_folder_into_a_file(local_path, str(target_folder / f"{key}.zip"))
+            store.set(key, local_path, ret)
         return cast(EnvResult, ret)
 
+    def _sandbox_key(self, local_path: str | None, volumes: Mapping) -> str:
+        """The warm sandboxes are shared by the runs with the same conf, workspace and volumes"""
+        return md5_hash(
+            json.dumps([type(self).__name__, self.conf.model_dump_json(), local_path, volumes], default=str)
+        )
+
     @abstractmethod
     def _run(
         self,
@@ -543,71 +612,90 @@ class LocalEnv(Env[ASpecificLocalConf]):
             cwd = Path(local_path).resolve() if local_path else None
             env = {k: str(v) if isinstance(v, int) else v for k, v in env.items()}
 
-            process = subprocess.Popen(
-                entry,
-                cwd=cwd,
-                env={**os.environ, **env},
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                shell=True,
-                bufsize=1,
-                universal_newlines=True,
-            )
+            if self.conf.warm_sandbox:
+                output_capture = OutputCapture()
+
+                def _on_output(text: str) -> None:
+                    _echo(text.strip())
+                    output_capture.write(text)
 
-            # Setup polling
-            if process.stdout is None or process.stderr is None:
-                raise RuntimeError("The subprocess did not correctly create stdout/stderr pipes")
-
-            if self.conf.live_output:
-                stdout_fd = process.stdout.fileno()
-                stderr_fd = process.stderr.fileno()
-
-                poller = select.poll()
-                poller.register(stdout_fd, select.POLLIN)
-                poller.register(stderr_fd, select.POLLIN)
-
-                combined_output = ""
-                while True:
-                    if process.poll() is not None:
-                        break
-                    events = poller.poll(100)
-                    for fd, event in events:
-                        if event & select.POLLIN:
-                            if fd == stdout_fd:
-                                while True:
-                                    output = process.stdout.readline()
-                                    if output == "":
-                                        break
-                                    Console().print(output.strip(), markup=False)
-                                    combined_output += output
-                            elif fd == stderr_fd:
-                                while True:
-                                    error = process.stderr.readline()
-                                    if error == "":
-                                        break
-                                    Console().print(error.strip(), markup=False)
-                                    combined_output += error
-
-                # Capture any final output
-                remaining_output, remaining_error = process.communicate()
-                if remaining_output:
-                    Console().print(remaining_output.strip(), markup=False)
-                    combined_output += remaining_output
-                if remaining_error:
-                    Console().print(remaining_error.strip(), markup=False)
-                    combined_output += remaining_error
+                return_code = run_in_sandbox(
+                    self._sandbox_key(str(cwd) if cwd else None, volumes),
+                    lambda: LocalSandbox(str(cwd) if cwd else None),
+                    entry,
+                    env,
+                    _on_output,
+                    max_sandboxes=self.conf.warm_sandbox_max,
+                    idle_timeout=self.conf.warm_sandbox_idle_timeout,
+                )
             else:
-                # Sacrifice real-time output to avoid possible standard I/O hangs
-                out, err = process.communicate()
-                Console().print(out, end="", markup=False)
-                Console().print(err, end="", markup=False)
-                combined_output = out + err
+                process = subprocess.Popen(
+                    entry,
+                    cwd=cwd,
+                    env={**os.environ, **env},
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    shell=True,
+                    bufsize=1,
+                    universal_newlines=True,
+                )
 
-            return_code = process.returncode
+                # Setup polling
+                if process.stdout is None or process.stderr is None:
+                    raise RuntimeError("The subprocess did not correctly create stdout/stderr pipes")
+
+                if self.conf.live_output:
+                    stdout_fd = process.stdout.fileno()
+                    stderr_fd = process.stderr.fileno()
+
+                    poller = select.poll()
+                    poller.register(stdout_fd, select.POLLIN)
+                    poller.register(stderr_fd, select.POLLIN)
+
+                    output_capture = OutputCapture()
+                    while True:
+                        if process.poll() is not None:
+                            break
+                        events = poller.poll(100)
+                        for fd, event in events:
+                            if event & select.POLLIN:
+                                if fd == stdout_fd:
+                                    while True:
+                                        output = process.stdout.readline()
+                                        if output == "":
+                                            break
+                                        _echo(output.strip())
+                                        output_capture.write(output)
+                                elif fd == stderr_fd:
+                                    while True:
+                                        error = process.stderr.readline()
+                                        if error == "":
+                                            break
+                                        _echo(error.strip())
+                                        output_capture.write(error)
+
+                    # Capture any final output
+                    remaining_output, remaining_error = process.communicate()
+                    if remaining_output:
+                        _echo(remaining_output.strip())
+                        output_capture.write(remaining_output)
+                    if remaining_error:
+                        _echo(remaining_error.strip())
+                        output_capture.write(remaining_error)
+                else:
+                    # Sacrifice real-time output to avoid possible standard I/O hangs
+                    out, err = process.communicate()
+                    _echo(out, end="")
+                    _echo(err, end="")
+                    output_capture = OutputCapture()
+                    output_capture.write(out)
+                    output_capture.write(err)
+
+                return_code = process.returncode
             print(Rule("[bold green]LocalEnv Logs End[/bold green]", style="dark_orange"))
 
-            return combined_output, return_code
+            return output_capture.getvalue(), return_code
 
 
 class CondaConf(LocalConf):
@@ -662,6 +750,13 @@ class DockerConf(EnvConf):
     retry_count: int = 5  # retry count for the docker run
     retry_wait_seconds: int = 10  # retry wait seconds for the docker run
 
+    probe_cache_ttl: int = 86400
+    """the seconds the results of `prepare` (the image is built or pulled) and of the GPU probe are reused for the same
+    image on the same docker host, also by other processes; 0 (or any value <=0) disables the cache"""
+    probe_cache_no_gpu_ttl: int = 300
+    """the seconds a GPU probe finding no GPU is reused (at most `probe_cache_ttl`), since the GPUs may only be busy or
+    the driver restarting; 0 (or any value <=0) probes again on every run"""
+
 
 class QlibCondaConf(CondaConf):
     model_config = SettingsConfigDict(
@@ -779,11 +874,28 @@ class MLEBDockerConf(DockerConf):
 class DockerEnv(Env[DockerConf]):
     # TODO: Save the output into a specific file
 
+    def _probe_cache(self) -> ProbeCache:
+        return ProbeCache(
+            Path(RD_AGENT_SETTINGS.pickle_cache_folder_path_str) / "docker_probe_cache.json", self.conf.probe_cache_ttl
+        )
+
+    def _prepare_key(self, client: docker.DockerClient) -> str:  # type: ignore[no-any-unimported]
+        probe = "prepare"
+        if self.conf.build_from_dockerfile and self.conf.dockerfile_folder_path is not None:
+            # the image is built again when the dockerfile folder is changed
+            probe += f":{md5_hash(str(folder_file_hashes(self.conf.dockerfile_folder_path)))}"
+        return ProbeCache.key(client.api.base_url, self.conf.image, probe)
+
     def prepare(self, *args, **kwargs) -> None:  # type: ignore[no-untyped-def]
         """
         Download image if it doesn't exist
+        The image is not checked again within `probe_cache_ttl` seconds after it is prepared.
         """
         client = docker.from_env()
+        prepare_key = self._prepare_key(client)
+        if self._probe_cache().get(prepare_key):
+            logger.info(f"The image {self.conf.image} has been prepared, skipped.")
+            return
         if (
             self.conf.build_from_dockerfile
             and self.conf.dockerfile_folder_path is not None
@@ -844,6 +956,7 @@ class DockerEnv(Env[DockerConf]):
                     )
         except docker.errors.APIError as e:
             raise RuntimeError(f"Error while pulling the image: {e}")
+        self._probe_cache().set(prepare_key, True)
 
     def _gpu_kwargs(self, client: docker.DockerClient) -> dict:  # type: ignore[no-any-unimported]
         """get gpu kwargs based on its availability"""
@@ -876,7 +989,51 @@ class DockerEnv(Env[DockerConf]):
                 cleanup_container(container, context="GPU test")
             return gpu_kwargs
 
-        return _f()
+        cache = self._probe_cache()
+        gpu_key = ProbeCache.key(client.api.base_url, self.conf.image, "gpu")
+        if (available := cache.get(gpu_key)) is None:
+            available = bool(_f())
+            cache.set(gpu_key, available, ttl=None if available else self.conf.probe_cache_no_gpu_ttl)
+        return gpu_kwargs if available else {}
+
+    def _run_in_sandbox(  # type: ignore[no-any-unimported]
+        self, client: docker.DockerClient, entry: str, local_path: str, env: dict, volumes: dict
+    ) -> tuple[str, int]:
+        output_capture = OutputCapture()
+
+        def _on_output(line: str) -> None:
+            decoded_log = line.strip()
+            _echo(decoded_log)
+            output_capture.write(decoded_log + "\n")
+
+        def _start() -> DockerSandbox:
+            return DockerSandbox(
+                client,
+                image=self.conf.image,
+                volumes=volumes,
+                working_dir=self.conf.mount_path,
+                network=self.conf.network,
+                shm_size=self.conf.shm_size,
+                mem_limit=self.conf.mem_limit,
+                cpu_count=self.conf.cpu_count,
+                **self._gpu_kwargs(client),
+            )
+
+        print(Rule("[bold green]Docker Sandbox Logs Begin[/bold green]", style="dark_orange"))
+        try:
+            exit_status = run_in_sandbox(
+                self._sandbox_key(local_path, volumes),
+                _start,
+                entry,
+                env,
+                _on_output,
+                max_sandboxes=self.conf.warm_sandbox_max,
+                idle_timeout=self.conf.warm_sandbox_idle_timeout,
+            )
+        except docker.errors.APIError as e:
+            raise RuntimeError(f"Error while running the sandbox container: {e}")
+        print(Rule("[bold green]Docker Sandbox Logs End[/bold green]", style="dark_orange"))
+        return output_capture.getvalue(), exit_status
 
     def _run(
         self,
@@ -908,8 +1065,10 @@ class DockerEnv(Env[DockerConf]):
             volumes[lp] = rp if isinstance(rp, dict) else {"bind": rp, "mode": self.conf.extra_volume_mode}
 
         volumes = normalize_volumes(cast(dict[str, str | dict[str, str]], volumes), self.conf.mount_path)
+        if self.conf.warm_sandbox:
+            return self._run_in_sandbox(client, entry, local_path, env, volumes)
 
-        log_output = ""
+        output_capture = OutputCapture()
         container: docker.models.containers.Container | None = None  # type: ignore[no-any-unimported]
 
         try:
@@ -942,14 +1101,15 @@ class DockerEnv(Env[DockerConf]):
             print(table)
             for log in logs:
                 decoded_log = log.strip().decode()
-                Console().print(decoded_log, markup=False)
-                log_output += decoded_log + "\n"
+                _echo(decoded_log)
+                output_capture.write(decoded_log + "\n")
             exit_status = container.wait()["StatusCode"]
             print(Rule("[bold green]Docker Logs End[/bold green]", style="dark_orange"))
-            return log_output, exit_status
+            return output_capture.getvalue(), exit_status
         except docker.errors.ContainerError as e:
             raise RuntimeError(f"Error while running the container: {e}")
         except docker.errors.ImageNotFound:
+            self._probe_cache().invalidate(self._prepare_key(client))
             raise RuntimeError("Docker image not found.")
         except docker.errors.APIError as e:
             raise RuntimeError(f"Error while running the container: {e}")
@@ -0,0 +1,80 @@
+"""
+A small cache of the results of probing the environments, used by `DockerEnv`.
+
+Probing a docker host is slow (e.g. `prepare` builds or pulls the image, the GPU probe starts a container running
+`nvidia-smi`) while the results rarely change, so they are kept in a json file shared by the processes::
+
+    {"<docker host>|<image>|<probe>": {"value": <json value>, "ts": <posix timestamp>, "ttl": <seconds>}, ...}
+
+A result expires `ttl` seconds after it is probed (a result may be given a shorter ttl, e.g. a failed probe);
+it can also be invalidated, e.g. when the image is missing.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+from filelock import FileLock
+
+
+class ProbeCache:
+
+    def __init__(self, path: str | Path, ttl: float) -> None:
+        """
+        Parameters
+        ----------
+        path :
+            the json file of the cache
+        ttl :
+            the seconds a result is valid; 0 (or any value <=0) disables the cache
+        """
+        self.path = Path(path)
+        self.ttl = ttl
+
+    @staticmethod
+    def key(host: str, image: str, probe: str) -> str:
+        return f"{host}|{image}|{probe}"
+
+    def _load(self) -> dict[str, dict[str, Any]]:
+        try:
+            return json.loads(self.path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _update(self, key: str, entry: dict[str, Any] | None) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with FileLock(self.path.with_suffix(".lock")):
+            data = self._load()
+            data = {k: v for k, v in data.items() if not self._expired(v)}
+            if entry is None:
+                data.pop(key, None)
+            else:
+                data[key] = entry
+            tmp = self.path.with_suffix(f".tmp-{os.getpid()}")
+            tmp.write_text(json.dumps(data))
+            os.replace(tmp, self.path)  # the readers don't take the lock
+
+    def _expired(self, entry: dict[str, Any]) -> bool:
+        return time.time() - entry["ts"] >= min(self.ttl, entry.get("ttl", self.ttl))
+
+    def get(self, key: str) -> Any | None:
+        """The cached result of the probe, or None if it is not cached or expired."""
+        if self.ttl <= 0:
+            return None
+        entry = self._load().get(key)
+        if entry is None or self._expired(entry):
+            return None
+        return entry["value"]
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        """`ttl` overrides (if shorter) the ttl of the cache for this result."""
+        if self.ttl > 0 and (ttl is None or ttl > 0):
+            self._update(key, {"value": value, "ts": time.time(), "ttl": self.ttl if ttl is None else ttl})
+
+    def invalidate(self, key: str) -> None:
+        if self.ttl > 0 and self.path.exists():
+            self._update(key, None)
@@ -0,0 +1,261 @@
+"""
+Warm sandboxes for running successive entries of an environment (`EnvConf.warm_sandbox`).
+
+Starting a container (or an interpreter) and importing the heavy packages dominate the short runs, e.g. the
+evaluations of CoSTEER and the backtests of qlib. A warm sandbox is started once per (env conf, workspace mount) and
+kept alive; every entry is executed in it as a new process:
+
+- `DockerSandbox`: a long-running container with the volumes mounted; the entries are run by `docker exec`.
+- `LocalSandbox`: a long-running shell; every entry is run in a subshell (so it doesn't change the shell's directory
+  or variables). It is the local stand-in of the docker sandbox.
+
+The isolation between the tasks is reset after every entry: the processes left by the entry are killed.
+The timeout and the exit code are those of the entry (`Env.run` wraps the entry with `timeout`).
+
+A process keeps at most `max_sandboxes` idle sandboxes (the least recently used ones are closed first), and a sandbox
+idle for `idle_timeout` seconds is closed by a background thread.
+"""
+
+from __future__ import annotations
+
+import atexit
+import codecs
+import os
+import shlex
+import subprocess
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable
+
+import docker  # type: ignore[import-untyped]
+import psutil
+
+from rdagent.log import rdagent_logger as logger
+
+
+class WarmSandbox(ABC):
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()  # one entry at a time
+        self.users = 0  # the runs holding the sandbox; guarded by `_SANDBOXES_LOCK`
+        self.last_used = time.monotonic()
+        self.idle_timeout: float | None = None
+
+    @abstractmethod
+    def alive(self) -> bool: ...
+
+    @abstractmethod
+    def exec(self, entry: str, env: dict[str, str], on_output: Callable[[str], None]) -> int:
+        """Run `entry` with the extra environment variables `env`; `on_output` receives the output line by line."""
+
+    @abstractmethod
+    def reset(self) -> None:
+        """Kill the processes left by the entries."""
+
+    @abstractmethod
+    def close(self) -> None: ...
+
+
+class LocalSandbox(WarmSandbox):
+
+    def __init__(self, cwd: str | None = None) -> None:
+        """`cwd` is the directory of the entries; None runs them in the current directory."""
+        super().__init__()
+        self.cwd = cwd
+        self.proc = subprocess.Popen(
+            ["/bin/sh"],
+            cwd=cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            start_new_session=True,
+        )
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def exec(self, entry: str, env: dict[str, str], on_output: Callable[[str], None]) -> int:
+        assert self.proc.stdin is not None and self.proc.stdout is not None
+        sentinel = f"__rdagent_sandbox_done_{uuid.uuid4().hex}"
+        cd = f"cd {shlex.quote(self.cwd)} || exit 1; " if self.cwd is not None else ""
+        exports = "".join(f"export {k}={shlex.quote(str(v))}; " for k, v in env.items())
+        # the entry is parsed by its own shell, so an unterminated quote or a syntax error can't break the warm shell;
+        # a new line is printed before the sentinel in case the output doesn't end with one; it is dropped below
+        self.proc.stdin.write(
+            f"({cd}{exports}exec /bin/sh -c {shlex.quote(entry)}) </dev/null 2>&1; "
+            f"printf '\\n{sentinel} %d\\n' $?\n"
+        )
+        self.proc.stdin.flush()
+        pending_newline = False
+        for line in self.proc.stdout:
+            if line.startswith(sentinel):
+                return int(line.split()[1])
+            on_output(("\n" if pending_newline else "") + line.removesuffix("\n"))
+            pending_newline = line.endswith("\n")
+        raise RuntimeError(f"The sandbox shell exited with code {self.proc.wait()}")
+
+    def reset(self) -> None:
+        # the shell leads a new session, which the processes of the entries (also the orphaned ones) stay in
+        for p in psutil.process_iter():
+            try:
+                if p.pid != self.proc.pid and os.getsid(p.pid) == self.proc.pid:
+                    p.kill()
+            except (OSError, psutil.Error):
+                pass  # the process has exited
+
+    def close(self) -> None:
+        self.reset()
+        self.proc.kill()
+        self.proc.wait()
+
+
+class DockerSandbox(WarmSandbox):
+
+    def __init__(self, client: Any, **run_kwargs: Any) -> None:
+        """`run_kwargs` are passed to `client.containers.run` to start the container."""
+        super().__init__()
+        self.client = client
+        self.workdir = run_kwargs.get("working_dir")
+        self.container = client.containers.run(command="sleep infinity", detach=True, **run_kwargs)
+        logger.info(f"Started the warm sandbox container {self.container.id}.")
+
+    def alive(self) -> bool:
+        try:
+            self.container.reload()
+        except docker.errors.APIError:
+            return False
+        return self.container.status == "running"
+
+    def exec(self, entry: str, env: dict[str, str], on_output: Callable[[str], None]) -> int:
+        exec_id = self.client.api.exec_create(
+            self.container.id, ["/bin/sh", "-c", entry], environment=env, workdir=self.workdir
+        )["Id"]
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        rest = ""
+        for chunk in self.client.api.exec_start(exec_id, stream=True):
+            *lines, rest = (rest + decoder.decode(chunk)).split("\n")
+            for line in lines:
+                on_output(line + "\n")
+        if rest := rest + decoder.decode(b"", final=True):
+            on_output(rest)
+        return int(self.client.api.exec_inspect(exec_id)["ExitCode"])
+
+    def reset(self) -> None:
+        # kill(-1) signals every process but the caller and the init process (`sleep infinity`) of the container
+        self.container.exec_run(["/bin/sh", "-c", "kill -9 -1 2>/dev/null; true"])
+
+    def close(self) -> None:
+        try:
+            self.container.stop(timeout=1)
+            self.container.remove()
+        except docker.errors.APIError as e:
+            logger.warning(f"Failed to cleanup the warm sandbox container {self.container.id}: {e}")
+
+
+# (pid, key) -> sandbox, the least recently used first; the sandboxes are not shared with the forked processes
+_SANDBOXES: OrderedDict[tuple[int, str], WarmSandbox] = OrderedDict()
+_SANDBOXES_LOCK = threading.Lock()
+_REAPERS: set[int] = set()  # the processes running a thread closing the idle sandboxes
+_REAP_INTERVAL = 30.0
+
+
+def _evict(max_sandboxes: int | None = None) -> list[WarmSandbox]:
+    """
+    Remove the sandboxes of the current process which are idle for longer than their `idle_timeout` or beyond the
+    `max_sandboxes` most recently used ones, and return them to be closed. Must be called with `_SANDBOXES_LOCK`.
+    """
+    now = time.monotonic()
+    mine = [(k, s) for k, s in _SANDBOXES.items() if k[0] == os.getpid()]
+    n_left, evicted = len(mine), []
+    for k, sandbox in mine:
+        if sandbox.users:
+            continue  # running an entry
+        expired = sandbox.idle_timeout is not None and now - sandbox.last_used > sandbox.idle_timeout
+        if expired or (max_sandboxes is not None and n_left > max_sandboxes):
+            del _SANDBOXES[k]
+            evicted.append(sandbox)
+            n_left -= 1
+    return evicted
+
+
+def _reap() -> None:
+    while True:
+        time.sleep(_REAP_INTERVAL)
+        with _SANDBOXES_LOCK:
+            evicted = _evict()
+        for sandbox in evicted:
+            sandbox.close()
+
+
+def run_in_sandbox(
+    key: str,
+    factory: Callable[[], WarmSandbox],
+    entry: str,
+    env: dict[str, str],
+    on_output: Callable[[str], None],
+    max_sandboxes: int | None = None,
+    idle_timeout: float | None = None,
+) -> int:
+    """
+    Run `entry` in the warm sandbox of `key` (created by `factory` if it doesn't exist or is dead) and return the
+    exit code. A sandbox failing to run the entry is closed, so the next run starts a new one.
+
+    Parameters
+    ----------
+    max_sandboxes :
+        the idle sandboxes of the process are closed, the least recently used first, to keep at most this number
+    idle_timeout :
+        the sandbox is closed after being idle for this number of seconds; None keeps it until the process exits
+    """
+    with _SANDBOXES_LOCK:
+        sandbox = _SANDBOXES.get((os.getpid(), key))
+        if sandbox is not None and not sandbox.alive():
+            del _SANDBOXES[(os.getpid(), key)]
+            sandbox.close()
+            sandbox = None
+        if sandbox is None:
+            sandbox = _SANDBOXES[(os.getpid(), key)] = factory()
+        _SANDBOXES.move_to_end((os.getpid(), key))
+        sandbox.users += 1
+        sandbox.idle_timeout = idle_timeout
+        evicted = _evict(max_sandboxes)
+        if idle_timeout is not None and os.getpid() not in _REAPERS:
+            _REAPERS.add(os.getpid())
+            threading.Thread(target=_reap, name="sandbox-reaper", daemon=True).start()
+    for s in evicted:
+        s.close()
+    try:
+        with sandbox.lock:
+            try:
+                return sandbox.exec(entry, env, on_output)
+            except BaseException:
+                with _SANDBOXES_LOCK:
+                    if _SANDBOXES.get((os.getpid(), key)) is sandbox:
+                        del _SANDBOXES[(os.getpid(), key)]
+                sandbox.close()
+                raise
+            finally:
+                if sandbox.alive():
+                    sandbox.reset()
+    finally:
+        with _SANDBOXES_LOCK:
+            sandbox.users -= 1
+            sandbox.last_used = time.monotonic()
+
+
+def close_sandboxes() -> None:
+    """Close the warm sandboxes of the current process."""
+    with _SANDBOXES_LOCK:
+        sandboxes = [s for (pid, _), s in _SANDBOXES.items() if pid == os.getpid()]
+        for k in [k for k in _SANDBOXES if k[0] == os.getpid()]:
+            del _SANDBOXES[k]
+    for sandbox in sandboxes:
+        sandbox.close()
+
+
+atexit.register(close_sandboxes)
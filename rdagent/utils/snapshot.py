@@ -0,0 +1,202 @@
+"""
+A content-addressed store of workspace snapshots, used by `Env.cached_run`.
+
+Layout of the store folder::
+
+    blobs/<2 chars>/<sha256>   deduplicated file contents (shared by all the snapshots)
+    snapshots/<key>.pkl        {"result": <the cached object>, "files": [(relpath, sha256 | None, link target | None)]}
+
+- Files are hashed once per (path, size, mtime, inode); unchanged files are not read again.
+- Restoring a snapshot copies the blobs into the workspace (a reflink where the filesystem supports it) instead of
+  unzipping an archive. Every restored file has its own inode, so writing it in place doesn't change the store.
+  The mtime of every blob is pinned to 0, so a blob modified in place is detected and dropped.
+- Snapshots are evicted by age and, when the blobs exceed the size budget, in least-recently-used order.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import shutil
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Iterable
+
+from filelock import FileLock
+
+from rdagent.log import rdagent_logger as logger
+
+# (abs path, size, mtime_ns, inode) -> sha256
+_FILE_HASH_CACHE: dict[tuple[str, int, int, int], str] = {}
+_CHUNK_SIZE = 1 << 20
+
+
+def file_hash(path: Path) -> str:
+    """sha256 of the file content with a (size, mtime, inode) fast-path"""
+    st = path.stat()
+    stat_key = (str(path.absolute()), st.st_size, st.st_mtime_ns, st.st_ino)
+    if (h := _FILE_HASH_CACHE.get(stat_key)) is None:
+        sha = hashlib.sha256()
+        with path.open("rb") as f:
+            while chunk := f.read(_CHUNK_SIZE):
+                sha.update(chunk)
+        h = _FILE_HASH_CACHE[stat_key] = sha.hexdigest()
+    return h
+
+
+def folder_file_hashes(folder: str | Path, patterns: Iterable[str] = ("*",)) -> list[tuple[str, str]]:
+    """sorted (relative path, sha256) of the regular files matching the patterns"""
+    folder = Path(folder)
+    paths = {p for pattern in patterns for p in folder.rglob(pattern) if p.is_file()}
+    return [(str(p.relative_to(folder)), file_hash(p)) for p in sorted(paths)]
+
+
+def _copy_blob(blob: Path, target: Path) -> None:
+    """Copy `blob` to the new file `target`; `copy_file_range` lets the filesystem share the extents (reflink)."""
+    try:
+        with blob.open("rb") as src, target.open("xb") as dst:
+            remaining = os.fstat(src.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        if remaining == 0:
+            return
+    except (AttributeError, OSError):  # e.g. not Linux, or the store and the workspace are on different devices
+        pass
+    target.unlink(missing_ok=True)
+    shutil.copyfile(blob, target)
+
+
+class WorkspaceSnapshotStore:
+
+    def __init__(self, path: str | Path, size_limit: int = 0, max_age_days: float = 0) -> None:
+        """
+        Parameters
+        ----------
+        path :
+            the folder of the store
+        size_limit :
+            the budget (bytes) of the blobs; 0 (or any value <= 0) means no limit
+        max_age_days :
+            snapshots not used for longer than this are evicted; 0 (or any value <= 0) means no limit
+        """
+        self.path = Path(path)
+        self.size_limit = size_limit
+        self.max_age_days = max_age_days
+        (self.path / "blobs").mkdir(parents=True, exist_ok=True)
+        (self.path / "snapshots").mkdir(parents=True, exist_ok=True)
+        self.lock = FileLock(self.path / "snapshot.lock")
+
+    def _blob_path(self, h: str) -> Path:
+        return self.path / "blobs" / h[:2] / h
+
+    def _snapshot_path(self, key: str) -> Path:
+        return self.path / "snapshots" / f"{key}.pkl"
+
+    @staticmethod
+    def _blob_valid(blob: Path) -> bool:
+        try:
+            return blob.stat().st_mtime_ns == 0
+        except FileNotFoundError:
+            return False
+
+    def _add_blob(self, file: Path) -> str:
+        h = file_hash(file)
+        blob = self._blob_path(h)
+        if not self._blob_valid(blob):
+            blob.parent.mkdir(exist_ok=True)
+            tmp = blob.with_name(f"{h}.{os.getpid()}.tmp")
+            shutil.copyfile(file, tmp)
+            os.utime(tmp, ns=(0, 0))
+            os.replace(tmp, blob)
+        return h
+
+    def get(self, key: str, folder: str | Path) -> tuple[bool, Any]:
+        """
+        Restore the snapshot `key` into `folder` (the folder is cleared first).
+
+        Returns
+        -------
+        (hit, the cached object)
+        """
+        snapshot_path = self._snapshot_path(key)
+        with self.lock:
+            if not snapshot_path.exists():
+                return False, None
+            with snapshot_path.open("rb") as f:
+                snapshot = pickle.load(f)
+            if not all(self._blob_valid(self._blob_path(h)) for _, h, _ in snapshot["files"] if h is not None):
+                logger.warning(f"Snapshot {key} refers to missing or modified blobs, drop it.")
+                snapshot_path.unlink()
+                return False, None
+
+            folder = Path(folder)
+            if folder.exists():
+                shutil.rmtree(folder)
+            folder.mkdir(parents=True)
+            for rel, h, link_target in snapshot["files"]:
+                target = folder / rel
+                target.parent.mkdir(parents=True, exist_ok=True)
+                if link_target is not None:
+                    os.symlink(link_target, target)
+                    continue
+                _copy_blob(self._blob_path(h), target)
+            snapshot_path.touch()  # the mtime of the snapshot is used as its last access time
+        return True, snapshot["result"]
+
+    def set(self, key: str, folder: str | Path, result: Any) -> None:
+        """Store the files (symlinks are not followed) in `folder` together with `result` as snapshot `key`."""
+        folder = Path(folder)
+        files: list[tuple[str, str | None, str | None]] = []
+        with self.lock:
+            for root, dirs, filenames in os.walk(folder):
+                for name in [*dirs, *filenames]:
+                    p = Path(root) / name
+                    if p.is_symlink():
+                        files.append((str(p.relative_to(folder)), None, os.readlink(p)))
+                    elif p.is_file():
+                        files.append((str(p.relative_to(folder)), self._add_blob(p), None))
+            tmp = self._snapshot_path(key).with_suffix(f".{os.getpid()}.tmp")
+            with tmp.open("wb") as f:
+                pickle.dump({"result": result, "files": files}, f)
+            os.replace(tmp, self._snapshot_path(key))
+            self._evict()
+
+    def _evict(self) -> None:
+        """NOTE: the caller must hold the lock"""
+        snapshots = sorted(self.path.glob("snapshots/*.pkl"), key=lambda p: p.stat().st_mtime)
+        evicted = False
+        if self.max_age_days > 0:
+            deadline = time.time() - self.max_age_days * 86400
+            while snapshots and snapshots[0].stat().st_mtime < deadline:
+                snapshots.pop(0).unlink()
+                evicted = True
+        blob_size = {p.name: p.stat().st_size for p in self.path.glob("blobs/*/*") if not p.name.endswith(".tmp")}
+        over_budget = 0 < self.size_limit < sum(blob_size.values())
+        if not evicted and not over_budget:
+            return
+
+        snapshot_blobs = {}
+        ref_count: Counter[str] = Counter()
+        for snapshot in snapshots:
+            with snapshot.open("rb") as f:
+                snapshot_blobs[snapshot] = {h for _, h, _ in pickle.load(f)["files"] if h is not None}
+            ref_count.update(snapshot_blobs[snapshot])
+        live_size = sum(blob_size.get(h, 0) for h in ref_count)
+        # evict the least recently used snapshots, but always keep the latest one
+        while self.size_limit > 0 and live_size > self.size_limit and len(snapshots) > 1:
+            oldest = snapshots.pop(0)
+            oldest.unlink()
+            for h in snapshot_blobs.pop(oldest):
+                ref_count[h] -= 1
+                if ref_count[h] == 0:
+                    del ref_count[h]
+                    live_size -= blob_size.get(h, 0)
+
+        for h in blob_size:
+            if h not in ref_count:
+                self._blob_path(h).unlink()
@@ -0,0 +1,127 @@
+"""
+Compact checkpoints of the workflow sessions.
+
+A checkpoint (e.g. `__session__/3/2_running`) is a pickle of the session in which the experiments and the
+workspaces are replaced by references to a content-addressed store (`__session__/objects/<digest[:2]>/<digest>`).
+The checkpoints of successive steps share most experiments, so each experiment is written once instead of once
+per checkpoint.
+
+- A checkpoint is still loadable by `pickle.load`: a reference is unpickled by loading its object from the store.
+  `load_checkpoint` should be preferred; it keeps the objects shared by several references shared (e.g. an
+  experiment referenced by the trace and by the outputs of a step), and finds the store if the folder was moved.
+- The session is serialized when `dump_checkpoint` is called (so the checkpoint is consistent), but the files are
+  written by a background thread, so the event loop is not blocked by the disk.
+"""
+
+from __future__ import annotations
+
+import atexit
+import concurrent.futures
+import hashlib
+import io
+import os
+import pickle
+import threading
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any
+
+from rdagent.core.experiment import Experiment, Workspace
+from rdagent.log import rdagent_logger as logger
+
+OBJECTS_DIR = "objects"
+
+# the store and the loaded objects of the checkpoint being loaded by `load_checkpoint`
+_LOAD_CONTEXT: ContextVar[tuple[Path, dict[tuple[str, int], Any]] | None] = ContextVar("_LOAD_CONTEXT", default=None)
+
+_writer = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+_pending: list[concurrent.futures.Future] = []
+_pending_lock = threading.Lock()
+_written: set[Path] = set()  # the objects known to be in the stores
+
+
+def _load_object(digest: str, oid: int, store: str) -> Any:
+    ctx = _LOAD_CONTEXT.get()
+    store_path, memo = (Path(store), {}) if ctx is None else ctx
+    if (digest, oid) not in memo:
+        with (store_path / digest[:2] / digest).open("rb") as f:
+            memo[(digest, oid)] = pickle.load(f)
+    return memo[(digest, oid)]
+
+
+class _CheckpointPickler(pickle.Pickler):
+    """Pickle the experiments and workspaces (except `root`) as references to the objects saved in `store`."""
+
+    def __init__(self, file: io.BytesIO, store: Path, blobs: dict[int, tuple[str, bytes]], root: Any = None) -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.store = store
+        self.blobs = blobs  # id(obj) -> (digest, data), shared by the picklers of a checkpoint
+        self.root = root
+
+    def reducer_override(self, obj: Any) -> Any:
+        if obj is self.root or not isinstance(obj, (Experiment, Workspace)):
+            return NotImplemented
+        if id(obj) not in self.blobs:
+            buf = io.BytesIO()
+            _CheckpointPickler(buf, self.store, self.blobs, root=obj).dump(obj)
+            data = buf.getvalue()
+            self.blobs[id(obj)] = (hashlib.sha256(data).hexdigest(), data)
+        # the id keeps the objects distinct if different objects have the same content
+        return _load_object, (self.blobs[id(obj)][0], id(obj), str(self.store))
+
+
+def _write(path: Path, data: bytes, tmp: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _write_checkpoint(path: Path, data: bytes, store: Path, objects: dict[Path, bytes]) -> None:
+    # the temporary files are not in the step folders, which are listed by the readers of the sessions
+    store.mkdir(parents=True, exist_ok=True)
+    tmp = store / f"tmp-{os.getpid()}"
+    for p, d in objects.items():
+        if not p.exists():
+            _write(p, d, tmp)
+    _write(path, data, tmp)  # written last, so a checkpoint never refers to a missing object
+
+
+def _log_error(future: concurrent.futures.Future) -> None:
+    if (e := future.exception()) is not None:
+        logger.error(f"Failed to write the checkpoint: {e}")
+
+
+def dump_checkpoint(obj: Any, path: str | Path) -> None:
+    """Serialize `obj` now and write it (with its new objects) to `path` in the background."""
+    path = Path(path)
+    store = path.parent.parent / OBJECTS_DIR
+    buf = io.BytesIO()
+    blobs: dict[int, tuple[str, bytes]] = {}
+    _CheckpointPickler(buf, store, blobs).dump(obj)
+    with _pending_lock:
+        objects = {store / d[:2] / d: data for d, data in blobs.values() if store / d[:2] / d not in _written}
+        _written.update(objects)
+        future = _writer.submit(_write_checkpoint, path, buf.getvalue(), store, objects)
+        future.add_done_callback(_log_error)
+        _pending[:] = [f for f in _pending if not f.done()] + [future]
+
+
+def flush_checkpoints() -> None:
+    """Wait for the checkpoints being written."""
+    with _pending_lock:
+        pending = list(_pending)
+    concurrent.futures.wait(pending)
+
+
+def load_checkpoint(path: str | Path) -> Any:
+    flush_checkpoints()
+    path = Path(path)
+    token = _LOAD_CONTEXT.set((path.parent.parent / OBJECTS_DIR, {}))
+    try:
+        with path.open("rb") as f:
+            return pickle.load(f)
+    finally:
+        _LOAD_CONTEXT.reset(token)
+
+
+atexit.register(flush_checkpoints)
@@ -12,7 +12,6 @@ import asyncio
 import concurrent.futures
 import copy
 import os
-import pickle
 from collections import defaultdict
 from dataclasses import dataclass
 from datetime import datetime, timezone
@@ -26,6 +25,11 @@ from rdagent.core.conf import RD_AGENT_SETTINGS
 from rdagent.log import rdagent_logger as logger
 from rdagent.log.conf import LOG_SETTINGS
 from rdagent.log.timer import RD_Agent_TIMER_wrapper, RDAgentTimer
+from rdagent.utils.workflow.checkpoint import (
+    dump_checkpoint,
+    flush_checkpoints,
+    load_checkpoint,
+)
 from rdagent.utils.workflow.tracking import WorkflowTracker
 
 
@@ -414,18 +418,16 @@ class LoopBase:
     def dump(self, path: str | Path) -> None:
         if RD_Agent_TIMER_wrapper.timer.started:
             RD_Agent_TIMER_wrapper.timer.update_remain_time()
-        path = Path(path)
-        path.parent.mkdir(parents=True, exist_ok=True)
-        with path.open("wb") as f:
-            pickle.dump(self, f)
+        dump_checkpoint(self, path)
 
     def truncate_session_folder(self, li: int, si: int) -> None:
         """
         Clear the session folder by removing all session objects after the given loop index (li) and step index (si).
         """
         # clear session folders after the li
+        flush_checkpoints()
         for sf in self.session_folder.iterdir():
-            if sf.is_dir() and int(sf.name) > li:
+            if sf.is_dir() and sf.name.isdigit() and int(sf.name) > li:
                 for file in sf.iterdir():
                     file.unlink()
                 sf.rmdir()
@@ -477,8 +479,7 @@ class LoopBase:
             files = sorted(path.glob("*/*_*"), key=lambda f: (int(f.parent.name), int(f.name.split("_")[0])))
             path = files[-1]
             logger.info(f"Loading latest session from {path}")
-        with path.open("rb") as f:
-            session = cast(LoopBase, pickle.load(f))
+        session = cast(LoopBase, load_checkpoint(path))
 
         # set session folder
         if checkout:
@@ -0,0 +1,77 @@
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from pydantic import BaseModel
+
+from rdagent.oai.backend.base import APIBackend, SQliteLazyCache
+from rdagent.oai.llm_conf import LLM_SETTINGS
+from rdagent.oai.utils.chat_cache import CHAT_CACHE_STATS, ChatCacheKey
+
+
+class Answer(BaseModel):
+    answer: str
+
+
+def _messages(time: str) -> list[dict]:
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": f"Now is 2024-01-01 {time}. What is 1 + 1?"},
+    ]
+
+
+@pytest.mark.offline
+class ChatCacheKeyTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.origin = LLM_SETTINGS.model_dump()
+        LLM_SETTINGS.chat_cache_volatile_patterns = [r"\d{2}:\d{2}:\d{2}"]
+        self.tmp = tempfile.TemporaryDirectory()
+        self.backend = SimpleNamespace(
+            cache=SQliteLazyCache(cache_location=str(Path(self.tmp.name) / "cache.db")), dump_chat_cache=True
+        )
+
+    def tearDown(self) -> None:
+        for k in ["chat_cache_volatile_patterns", "chat_cache_serve_near_duplicates", "chat_cache_legacy_lookup"]:
+            setattr(LLM_SETTINGS, k, self.origin[k])
+        self.tmp.cleanup()
+
+    def _get(self, key: ChatCacheKey) -> str | None:
+        return APIBackend._chat_cache_get(self.backend, key)  # type: ignore[arg-type]
+
+    def test_structured_key(self) -> None:
+        key = ChatCacheKey(_messages("10:00:00"), seed=1)
+        self.assertEqual(key.exact, ChatCacheKey(_messages("10:00:00"), seed=1).exact)
+        self.assertNotEqual(key.exact, ChatCacheKey(_messages("10:00:00"), seed=2).exact)
+        self.assertNotEqual(key.exact, ChatCacheKey(_messages("10:00:00"), seed=1, response_format=Answer).exact)
+        self.assertNotEqual(key.exact, ChatCacheKey(_messages("10:00:01"), seed=1).exact)
+        self.assertEqual(key.near, ChatCacheKey(_messages("10:00:01"), seed=1).near)
+        LLM_SETTINGS.chat_cache_volatile_patterns = []
+        self.assertIsNone(ChatCacheKey(_messages("10:00:00"), seed=1).near)
+
+    def test_lookup(self) -> None:
+        key = ChatCacheKey(_messages("10:00:00"), seed=1)
+        self.assertIsNone(self._get(key))
+
+        # an entry written with the legacy key is only hit if enabled, and copied to the structured key
+        self.backend.cache.chat_set(key.legacy, "2")
+        self.assertIsNone(self._get(key))
+        LLM_SETTINGS.chat_cache_legacy_lookup = True
+        self.assertEqual(self._get(key), "2")
+        self.assertEqual(self.backend.cache.chat_get(key.exact), "2")
+
+        # a near-duplicate is only reported unless it is enabled
+        self.backend.cache.chat_set(key.near, "2")
+        other = ChatCacheKey(_messages("11:00:00"), seed=1)
+        before = CHAT_CACHE_STATS.hit_rates()["<root>"]["lookups"]
+        self.assertIsNone(self._get(other))
+        LLM_SETTINGS.chat_cache_serve_near_duplicates = True
+        self.assertEqual(self._get(other), "2")
+        rates = CHAT_CACHE_STATS.hit_rates()["<root>"]
+        self.assertEqual(rates["lookups"], before + 2)
+        self.assertGreater(rates["near_hit_rate"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
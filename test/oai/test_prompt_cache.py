@@ -0,0 +1,123 @@
+import multiprocessing as mp
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import pytest
+
+from rdagent.oai.backend.base import SQliteLazyCache, SQliteWALCache
+from rdagent.utils import md5_hash
+
+
+def _open_cache(backend: str, cache_location: str, shard_num: int = 1, write_batch_size: int = 1):
+    if backend == "sqlite":
+        return SQliteLazyCache(cache_location=cache_location)
+    return SQliteWALCache(cache_location=cache_location, shard_num=shard_num, write_batch_size=write_batch_size)
+
+
+def _bench_worker(backend: str, cache_location: str, worker_id: int, n_ops: int, shard_num: int) -> tuple[float, float]:
+    cache = _open_cache(backend, cache_location, shard_num=shard_num)
+    start = time.perf_counter()
+    for i in range(n_ops):
+        cache.chat_set(f"worker-{worker_id}-{i}", "x" * 256)
+    write_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(n_ops):
+        assert cache.chat_get(f"worker-{worker_id}-{i}") is not None
+    return write_time, time.perf_counter() - start
+
+
+def benchmark_prompt_cache(
+    backend: str, n_procs: int, n_ops: int = 200, shard_num: int = 1, folder: str | None = None
+) -> dict[str, float]:
+    """Return the aggregated write/read throughput (ops per second) of `n_procs` concurrent processes."""
+    with tempfile.TemporaryDirectory(dir=folder) as tmp:
+        cache_location = str(Path(tmp) / "prompt_cache.db")
+        _open_cache(backend, cache_location, shard_num=shard_num)  # create the tables before starting the workers
+        ctx = mp.get_context("spawn")
+        with ctx.Pool(processes=n_procs) as pool:
+            res = pool.starmap(
+                _bench_worker, [(backend, cache_location, wid, n_ops, shard_num) for wid in range(n_procs)]
+            )
+    total_ops = n_procs * n_ops
+    return {
+        "write_ops_per_sec": total_ops / max(w for w, _ in res),
+        "read_ops_per_sec": total_ops / max(r for _, r in res),
+    }
+
+
+@pytest.mark.offline
+class SQliteWALCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_location = str(Path(self.tmp.name) / "prompt_cache.db")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_same_interface_and_schema(self) -> None:
+        cache = SQliteWALCache(cache_location=self.cache_location)
+        cache.chat_set("question", "answer")
+        cache.embedding_set({"hello": [0.25, 0.5]})
+        cache.message_set("conv", [{"role": "user", "content": "hi"}])
+        self.assertEqual(cache.chat_get("question"), "answer")
+        self.assertEqual(cache.embedding_get("hello"), [0.25, 0.5])  # exactly representable in float32
+        self.assertEqual(cache.message_get("conv"), [{"role": "user", "content": "hi"}])
+        self.assertIsNone(cache.chat_get("missing"))
+
+        # the legacy cache can read the same file
+        self.assertEqual(SQliteLazyCache(cache_location=self.cache_location).chat_get("question"), "answer")
+
+    def test_batched_writes(self) -> None:
+        cache = SQliteWALCache(cache_location=self.cache_location, write_batch_size=3)
+        cache.chat_set("k1", "v1")
+        cache.chat_set("k2", "v2")
+        # buffered writes are visible to the writer but not committed yet
+        self.assertEqual(cache.chat_get("k1"), "v1")
+        self.assertIsNone(SQliteLazyCache(cache_location=self.cache_location).chat_get("k1"))
+        cache.chat_set("k3", "v3")
+        self.assertEqual(SQliteLazyCache(cache_location=self.cache_location).chat_get("k1"), "v1")
+
+    def test_sharded_layout(self) -> None:
+        cache = SQliteWALCache(cache_location=self.cache_location, shard_num=4)
+        for i in range(32):
+            cache.chat_set(f"key-{i}", f"value-{i}")
+        self.assertEqual(len(cache.shard_paths), 4)
+        self.assertTrue(all(p.exists() for p in cache.shard_paths))
+        self.assertEqual([cache.chat_get(f"key-{i}") for i in range(32)], [f"value-{i}" for i in range(32)])
+
+    def test_embedding_many(self) -> None:
+        for cache in [
+            SQliteLazyCache(cache_location=self.cache_location),
+            SQliteWALCache(cache_location=str(Path(self.tmp.name) / "wal.db"), shard_num=3),
+        ]:
+            cache.embedding_set_many({f"text-{i}": [float(i), 0.5] for i in range(1000)})
+            res = cache.embedding_get_many([f"text-{i}" for i in range(0, 1200, 2)])
+            self.assertEqual(len(res), 500)
+            self.assertEqual(res["text-10"], [10.0, 0.5])
+            self.assertEqual(cache.embedding_get("text-3"), [3.0, 0.5])
+            self.assertIsNone(cache.embedding_get("text-1001"))
+
+    def test_embedding_legacy_json_rows(self) -> None:
+        cache = SQliteLazyCache(cache_location=self.cache_location)
+        cache.c.execute(
+            "INSERT INTO embedding_cache (md5_key, embedding) VALUES (?, ?)", (md5_hash("legacy"), "[0.25, 0.5]")
+        )
+        cache.conn.commit()
+        self.assertEqual(cache.embedding_get("legacy"), [0.25, 0.5])
+
+    def test_multiprocess(self) -> None:
+        res = benchmark_prompt_cache("sqlite_wal", n_procs=2, n_ops=20, shard_num=2)
+        self.assertGreater(res["write_ops_per_sec"], 0)
+
+
+if __name__ == "__main__":
+    # python test/oai/test_prompt_cache.py
+    for backend, shard_num in [("sqlite", 1), ("sqlite_wal", 1), ("sqlite_wal", 4)]:
+        for n_procs in [1, 4, 16]:
+            res = benchmark_prompt_cache(backend, n_procs=n_procs, shard_num=shard_num)
+            print(
+                f"{backend:<10} shards={shard_num} procs={n_procs:>2}: "
+                f"write {res['write_ops_per_sec']:>10.1f} ops/s, read {res['read_ops_per_sec']:>10.1f} ops/s"
+            )
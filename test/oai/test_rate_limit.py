@@ -0,0 +1,64 @@
+import json
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+import pytest
+
+from rdagent.oai.utils.rate_limit import LLMRateLimiter, llm_priority
+
+
+@pytest.mark.offline
+class LLMRateLimiterTest(unittest.TestCase):
+    def test_token_bucket(self) -> None:
+        limiter = LLMRateLimiter(tpm=600, rpm=6000)  # 10 tokens per second
+        start = time.monotonic()
+        limiter.acquire(600)
+        self.assertLess(time.monotonic() - start, 0.2)  # the bucket starts full
+        limiter.acquire(5)
+        self.assertGreater(time.monotonic() - start, 0.4)
+
+    def test_priority(self) -> None:
+        limiter = LLMRateLimiter(tpm=1200, rpm=6000)  # 20 tokens per second
+        limiter.acquire(1200)
+        order = []
+
+        def request(name: str, priority: int) -> None:
+            with llm_priority(priority):
+                limiter.acquire(5)
+            order.append(name)
+
+        threads = [threading.Thread(target=request, args=("evaluation", 2))]
+        threads[0].start()
+        time.sleep(0.05)
+        threads += [threading.Thread(target=request, args=(name, p)) for name, p in [("coding", 1), ("proposal", 0)]]
+        for t in threads[1:]:
+            t.start()
+            time.sleep(0.02)
+        for t in threads:
+            t.join()
+        self.assertEqual(order, ["proposal", "coding", "evaluation"])
+
+    def test_global_backoff(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            state_path = Path(tmp) / "rate_limit.json"
+            limiter = LLMRateLimiter(state_path=str(state_path))
+            limiter.backoff(0.5)
+            limiter.backoff(0.5)  # the errors of the requests sent before the backoff do not extend it
+            start = time.monotonic()
+            limiter.acquire()
+            self.assertGreater(time.monotonic() - start, 0.3)
+            self.assertEqual(json.loads(state_path.read_text())["backoff_level"], 1)
+
+            limiter.backoff(0.5)  # a new error doubles the backoff
+            start = time.monotonic()
+            limiter.acquire()
+            self.assertGreater(time.monotonic() - start, 0.8)
+            limiter.succeed()
+            self.assertEqual(json.loads(state_path.read_text())["backoff_level"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+import pytest
+from litellm import token_counter
+
+from rdagent.oai.backend.litellm import LiteLLMAPIBackend
+from rdagent.oai.utils.token_count import TOKEN_COUNT_CACHE, fit_to_token_limit
+
+
+@pytest.mark.offline
+class TokenCountTest(unittest.TestCase):
+    def test_memoized_count(self) -> None:
+        messages = [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": "Fix the following error:\n" + "Traceback line\n" * 200},
+        ]
+        expected = token_counter(model="gpt-4o", messages=messages)
+        TOKEN_COUNT_CACHE.clear()
+        self.assertEqual(LiteLLMAPIBackend._count_tokens("gpt-4o", messages), expected)
+        misses = TOKEN_COUNT_CACHE.misses
+        self.assertEqual(LiteLLMAPIBackend._count_tokens("gpt-4o", messages), expected)
+        self.assertEqual(TOKEN_COUNT_CACHE.misses, misses)
+        self.assertGreater(TOKEN_COUNT_CACHE.hits, 0)
+
+    def test_fit_to_token_limit(self) -> None:
+        content = "".join(f"line {i}\n" for i in range(10000))
+        calls = []
+
+        def count(s: str) -> int:
+            calls.append(s)
+            return token_counter(model="gpt-4o", text=s)
+
+        part = fit_to_token_limit(content, 500, count)
+        self.assertTrue(content.endswith(part))
+        self.assertLessEqual(token_counter(model="gpt-4o", text=part), 500)
+        self.assertGreater(token_counter(model="gpt-4o", text=part), 490)
+        self.assertLess(len(calls), 20)
+
+        head = fit_to_token_limit(content, 500, count, keep="head")
+        self.assertTrue(content.startswith(head))
+        self.assertEqual(fit_to_token_limit(content, 0, count), "")
+        self.assertEqual(fit_to_token_limit("short", 500, count), "short")
+
+
+if __name__ == "__main__":
+    unittest.main()
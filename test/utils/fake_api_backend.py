@@ -0,0 +1,13 @@
+import numpy as np
+
+
+class FakeAPIBackend:
+    """deterministic embeddings derived from the content, to replace `APIBackend` in `vector_base`"""
+
+    def create_embedding(self, input_content):
+        def emb(text: str) -> list[float]:
+            return np.random.default_rng(abs(hash(text)) % 2**32).normal(size=16).tolist()
+
+        if isinstance(input_content, str):
+            return emb(input_content)
+        return [emb(t) for t in input_content]
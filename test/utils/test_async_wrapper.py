@@ -0,0 +1,64 @@
+import asyncio
+import random
+import threading
+import time
+import unittest
+
+import pytest
+
+from rdagent.core.utils import LLM_CACHE_SEED_GEN, async_wrapper
+
+
+def draw_seeds(sleep: float) -> list[int]:
+    seeds = [LLM_CACHE_SEED_GEN.get_next_seed()]
+    time.sleep(sleep)  # the other calls draw their seeds meanwhile
+    return [*seeds, LLM_CACHE_SEED_GEN.get_next_seed()]
+
+
+class InFlightCounter:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.current = self.peak = 0
+
+    def __call__(self, x: int) -> int:
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+        time.sleep(0.05)
+        with self.lock:
+            self.current -= 1
+        if x < 0:
+            raise ValueError(x)
+        return x * x
+
+
+@pytest.mark.offline
+class AsyncWrapperTest(unittest.TestCase):
+    def test_bounded_in_flight_and_failures(self) -> None:
+        counter = InFlightCounter()
+        self.assertEqual(async_wrapper([(counter, (i,)) for i in [1, 2, -1, 3, 4]], n=2), [1, 4, None, 9, 16])
+        self.assertEqual(counter.peak, 2)
+
+    def test_seeds_are_per_call(self) -> None:
+        func_calls = [(draw_seeds, (0.05 * (3 - i),)) for i in range(3)]
+        LLM_CACHE_SEED_GEN.set_seed(10)
+        first = async_wrapper(func_calls, n=3)
+        LLM_CACHE_SEED_GEN.set_seed(10)
+        self.assertEqual(async_wrapper(func_calls, n=3), first)
+
+        # every call replays the sequence of its own seed, like `_subprocess_wrapper` in a process
+        LLM_CACHE_SEED_GEN.set_seed(10)
+        for seeds in first:
+            rng = random.Random(LLM_CACHE_SEED_GEN.get_next_seed())
+            self.assertEqual(seeds, [rng.randint(0, 10000), rng.randint(0, 10000)])
+
+    def test_inside_running_loop(self) -> None:
+        async def step() -> list:
+            # e.g. a synchronous step called by `LoopBase`
+            return async_wrapper([(abs, (-i,)) for i in range(4)], n=2)
+
+        self.assertEqual(asyncio.run(step()), [0, 1, 2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+
+import pytest
+
+from rdagent.core.experiment import Experiment, FBWorkspace
+from rdagent.utils.workflow.checkpoint import (
+    OBJECTS_DIR,
+    dump_checkpoint,
+    flush_checkpoints,
+    load_checkpoint,
+)
+
+
+def _exp(code: str) -> Experiment:
+    exp = Experiment(sub_tasks=[])
+    exp.experiment_workspace = FBWorkspace()
+    exp.experiment_workspace.file_dict["main.py"] = code
+    return exp
+
+
+@pytest.mark.offline
+class CheckpointTest(unittest.TestCase):
+    def test_dedup_and_identity(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            session = Path(tmp) / "__session__"
+            objects = session / OBJECTS_DIR
+            first = _exp("print(1)\n" * 1000)
+            state = {"hist": [first], "running": first}
+            dump_checkpoint(state, session / "0" / "0_running")
+            flush_checkpoints()
+            n_objects = len(list(objects.glob("*/*")))
+            self.assertEqual(n_objects, 2)  # the experiment and its workspace
+
+            state["hist"].append(_exp("print(2)"))
+            state["running"] = state["hist"][-1]
+            dump_checkpoint(state, session / "1" / "0_running")
+            flush_checkpoints()
+            self.assertEqual(len(list(objects.glob("*/*"))), n_objects + 2)  # only the new experiment is written
+            self.assertLess((session / "1" / "0_running").stat().st_size, 1000)
+
+            loaded = load_checkpoint(session / "1" / "0_running")
+            self.assertIs(loaded["running"], loaded["hist"][1])
+            self.assertEqual(loaded["hist"][0].experiment_workspace.file_dict["main.py"], "print(1)\n" * 1000)
+            with (session / "0" / "0_running").open("rb") as f:  # still a plain pickle
+                self.assertEqual(pickle.load(f)["running"].experiment_workspace.file_dict["main.py"][:9], "print(1)\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
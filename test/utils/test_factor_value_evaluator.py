@@ -0,0 +1,59 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from rdagent.components.coder.factor_coder import eva_utils
+from rdagent.components.coder.factor_coder.eva_utils import (
+    FactorValueEvaluator,
+    grouped_corr,
+)
+
+
+class FakeWorkspace:
+    def __init__(self, df: pd.DataFrame) -> None:
+        self.df = df
+        self.n_execute = 0
+
+    def execute(self, *args, **kwargs):
+        self.n_execute += 1
+        return "Execution succeeded without error.", self.df
+
+
+def _factor_df(seed: int, n_days: int = 20, n_instruments: int = 50) -> pd.DataFrame:
+    index = pd.MultiIndex.from_product(
+        [pd.date_range("2020-01-01", periods=n_days), [f"SH{i:06d}" for i in range(n_instruments)]],
+        names=["datetime", "instrument"],
+    )
+    return pd.DataFrame({"factor": np.random.default_rng(seed).normal(size=len(index))}, index=index)
+
+
+@pytest.mark.offline
+class FactorValueEvaluatorTest(unittest.TestCase):
+    def test_grouped_corr_same_as_pandas(self) -> None:
+        df = pd.concat([_factor_df(0), _factor_df(1)], axis=1)
+        df.columns = ["source", "gt"]
+        df.loc[df.sample(frac=0.1, random_state=0).index, "gt"] = np.nan
+        df["source"] = df["source"] + df["gt"].fillna(0)
+        for method in ["pearson", "spearman"]:
+            expected = df.groupby("datetime").apply(lambda x: x["source"].corr(x["gt"], method=method))
+            pd.testing.assert_series_equal(
+                grouped_corr(df["source"], df["gt"], method=method), expected, check_names=False
+            )
+
+    def test_dataframes_are_loaded_once(self) -> None:
+        gen, gt = FakeWorkspace(_factor_df(0)), FakeWorkspace(_factor_df(0))
+        with mock.patch.object(eva_utils.FactorOutputFormatEvaluator, "evaluate", return_value=("format ok", True)):
+            evaluator = FactorValueEvaluator(None)
+            conclusion, decision = evaluator.evaluate(gen, gt)
+        self.assertTrue(decision)
+        self.assertIn("All values in the dataframes are equal", conclusion)
+        self.assertEqual((gen.n_execute, gt.n_execute), (1, 1))
+        self.assertIn("load_dataframes", evaluator.timings)
+        self.assertIn("FactorCorrelationEvaluator", evaluator.timings)
+
+
+if __name__ == "__main__":
+    unittest.main()
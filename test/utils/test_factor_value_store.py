@@ -0,0 +1,69 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from rdagent.components.coder.factor_coder.factor_value_store import FactorValueStore
+from rdagent.core.utils import PickleCacheManager
+
+
+@pytest.mark.offline
+class FactorValueStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = FactorValueStore(self.tmp.name)
+        index = pd.MultiIndex.from_product(
+            [pd.date_range("2020-01-01", periods=5), ["SH600000", "SZ000001"]], names=["datetime", "instrument"]
+        )
+        self.df = pd.DataFrame({"factor_a": np.r_[np.nan, np.arange(9.0)], "factor_b": np.arange(10)}, index=index)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_round_trip(self) -> None:
+        self.assertEqual(self.store.get("0123"), (False, None, None))
+        self.store.set("0123", "succeeded", self.df)
+        hit, feedback, df = self.store.get("0123")
+        self.assertTrue(hit)
+        self.assertEqual(feedback, "succeeded")
+        pd.testing.assert_frame_equal(df, self.df, check_index_type=False)
+
+        # the values are writable, but the changes never reach the file
+        df.iloc[1, 0] = 100.0
+        self.assertEqual(self.store.get("0123")[2].iloc[1, 0], 0.0)
+
+    def test_column_projection(self) -> None:
+        self.store.set("0123", "succeeded", self.df)
+        df = self.store.get("0123", columns=["factor_b"])[2]
+        self.assertEqual(df.columns.tolist(), ["factor_b"])
+        np.testing.assert_array_equal(df["factor_b"].to_numpy(), self.df["factor_b"].to_numpy())
+
+    def test_failed_and_unsupported_values(self) -> None:
+        self.store.set("0123", "no output", None)
+        self.assertEqual(self.store.get("0123"), (True, "no output", None))
+
+        mixed = pd.DataFrame({"factor": [1, "x", 2.0]})  # falls back to pickle
+        self.store.set("4567", "succeeded", mixed)
+        hit, _, df = self.store.get("4567")
+        self.assertTrue(hit)
+        pd.testing.assert_frame_equal(df, mixed)
+
+    def test_eviction_by_the_pickle_cache(self) -> None:
+        manager = PickleCacheManager(root=self.tmp.name, size_limit=1 << 30)
+        store = FactorValueStore(Path(self.tmp.name) / "factor_values", cache_manager=manager)
+        for i, key in enumerate(["00aa", "00bb", "00cc"]):
+            store.set(key, "succeeded", self.df)
+            os.utime(store._path(key), (time.time() - 100 + i, time.time() - 100 + i))
+        self.assertTrue(store.get("00aa")[0])  # 00aa becomes the most recently used one
+        manager.size_limit = int(2.5 * store._path("00aa").stat().st_size)  # two entries fit after eviction
+        manager.evict()
+        self.assertEqual([store.get(key)[0] for key in ["00aa", "00bb", "00cc"]], [True, False, True])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from rdagent.components.coder.factor_coder.factor import FactorFBWorkspace, FactorTask
+from rdagent.components.coder.factor_coder.worker_pool import FactorWorkerPool
+from rdagent.core.conf import RD_AGENT_SETTINGS
+from rdagent.core.utils import multiprocessing_wrapper
+
+FACTOR_CODE = """
+import pandas as pd
+
+def calculate():
+    df = pd.read_hdf("daily_pv.h5", key="data")
+    df["$close"] = df["$close"] * 2  # the cached source data must not be changed
+    return df[["$close"]].rename(columns={"$close": "factor"})
+
+if __name__ == "__main__":
+    print("calculating")
+    calculate().to_hdf("result.h5", key="data", mode="w")
+"""
+
+
+@pytest.mark.offline
+class FactorWorkerPoolTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.origin_cache_folder = RD_AGENT_SETTINGS.pickle_cache_folder_path_str
+        RD_AGENT_SETTINGS.pickle_cache_folder_path_str = str(root / "cache")
+        self.data_folder = root / "data"
+        self.data_folder.mkdir()
+        index = pd.MultiIndex.from_product(
+            [pd.date_range("2020-01-01", periods=3), ["SH600000", "SZ000001"]], names=["datetime", "instrument"]
+        )
+        self.source = pd.DataFrame({"$close": np.arange(6.0)}, index=index)
+        self.source.to_hdf(self.data_folder / "daily_pv.h5", key="data")
+        self.workspace = root / "ws"
+        self.workspace.mkdir()
+        (self.workspace / "daily_pv.h5").symlink_to(self.data_folder / "daily_pv.h5")
+        self.pool = FactorWorkerPool(size=1)
+
+    def tearDown(self) -> None:
+        self.pool.close()
+        RD_AGENT_SETTINGS.pickle_cache_folder_path_str = self.origin_cache_folder
+        self.tmp.cleanup()
+
+    def _run(self, code: str, timeout: float = 60) -> tuple[bool, str]:
+        (self.workspace / "factor.py").write_text(code)
+        return self.pool.run(self.workspace / "factor.py", self.workspace, self.data_folder, timeout=timeout)
+
+    def test_execute_with_cached_source_data(self) -> None:
+        for _ in range(2):  # the second execution reads the source data from the store
+            success, output = self._run(FACTOR_CODE)
+            self.assertTrue(success, output)
+            self.assertIn("calculating", output)
+            result = pd.read_hdf(self.workspace / "result.h5")
+            np.testing.assert_array_equal(result["factor"].to_numpy(), self.source["$close"].to_numpy() * 2)
+        self.assertTrue(list((Path(self.tmp.name) / "cache" / "factor_source_data").rglob("*.arrow")))
+
+    def test_error_and_timeout(self) -> None:
+        success, output = self._run("raise ValueError('bad factor')")
+        self.assertFalse(success)
+        self.assertIn("ValueError: bad factor", output)
+
+        with self.assertRaises(subprocess.TimeoutExpired):
+            self._run("import time\ntime.sleep(60)", timeout=1)
+        # the worker is replaced after the timeout
+        self.assertTrue(self._run(FACTOR_CODE)[0])
+
+    def test_output_of_the_file_descriptors(self) -> None:
+        code = "import os, sys\nprint('python')\nos.write(1, b'native stdout\\n')\nos.write(2, b'native stderr\\n')\n"
+        success, output = self._run(code + "sys.exit(1)")
+        self.assertFalse(success)
+        for text in ("python", "native stdout", "native stderr"):
+            self.assertIn(text, output)
+        # the output of a task doesn't leak into the next one
+        self.assertEqual(self._run("print('next')")[1].strip(), "next")
+
+    def test_execute_in_daemonic_workers(self) -> None:
+        # the workers of `multiprocessing_wrapper` are daemonic; they can't start a pool and run subprocesses instead
+        workspaces = []
+        for i in range(2):
+            ws = FactorFBWorkspace(target_task=FactorTask(f"factor_{i}", "description", "formulation"))
+            ws.workspace_path = Path(self.tmp.name) / f"ws_{i}"
+            ws.inject_files(**{"factor.py": FACTOR_CODE + f"\n# factor {i}\n"})
+            workspaces.append(ws)
+        env = {
+            "FACTOR_CoSTEER_execution_mode": "worker_pool",
+            "FACTOR_CoSTEER_data_folder_debug": str(self.data_folder),
+            "PICKLE_CACHE_FOLDER_PATH_STR": RD_AGENT_SETTINGS.pickle_cache_folder_path_str,
+        }
+        with mock.patch.dict(os.environ, env), mock.patch.object(RD_AGENT_SETTINGS, "multi_proc_warm_pool", False):
+            results = multiprocessing_wrapper([(ws.execute, ("Debug",)) for ws in workspaces], n=2)
+        for res in results:
+            self.assertIsNotNone(res)
+            feedback, value = res
+            self.assertIn(FactorFBWorkspace.FB_OUTPUT_FILE_FOUND, feedback)
+            np.testing.assert_array_equal(value["factor"].to_numpy(), self.source["$close"].to_numpy() * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
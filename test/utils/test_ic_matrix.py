@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from rdagent.scenarios.qlib.developer.utils import cross_sectional_ic_matrix
+
+
+def _reference_ic(left: pd.DataFrame, right: pd.DataFrame) -> np.ndarray:
+    concat = pd.concat([left, right], axis=1)
+    res = np.full((left.shape[1], right.shape[1]), np.nan)
+    for i in range(left.shape[1]):
+        for j in range(right.shape[1]):
+            res[i, j] = (
+                concat.groupby("datetime").apply(lambda x: x.iloc[:, i].corr(x.iloc[:, left.shape[1] + j])).mean()
+            )
+    return res
+
+
+@pytest.mark.offline
+class CrossSectionalICTest(unittest.TestCase):
+    def test_same_as_pandas(self) -> None:
+        rng = np.random.default_rng(0)
+        index = pd.MultiIndex.from_product(
+            [pd.date_range("2020-01-01", periods=12), [f"SH{i:06d}" for i in range(30)]],
+            names=["datetime", "instrument"],
+        )
+        index = index[rng.random(len(index)) > 0.2]  # the groups have different sizes
+        sota = pd.DataFrame(rng.normal(size=(len(index), 4)), index=index, columns=list("abcd"))
+        new = pd.DataFrame(rng.normal(size=(len(index), 3)), index=index, columns=list("xyz"))
+        new["y"] = sota["b"] * 2 + rng.normal(scale=0.01, size=len(index))  # almost a duplicate
+        sota[sota > 1.5] = np.nan  # NaN are dropped pairwise
+        new.loc[new.index.get_level_values("datetime") == index[0][0], "z"] = 1.0  # constant in a group
+
+        expected = _reference_ic(sota, new)
+        for max_batch_elements in [1, 1 << 24]:  # one group per batch / all the groups in one batch
+            np.testing.assert_allclose(
+                cross_sectional_ic_matrix(sota, new, max_batch_elements=max_batch_elements), expected, atol=1e-10
+            )
+        self.assertGreater(cross_sectional_ic_matrix(sota, new)[1, 1], 0.99)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+import pickle
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pytest
+from fake_api_backend import FakeAPIBackend
+from filelock import FileLock
+
+from rdagent.components.coder.CoSTEER.knowledge_management import (
+    CoSTEERKnowledgeBaseV2,
+)
+from rdagent.components.knowledge_management import vector_base
+from rdagent.components.knowledge_management.graph import UndirectedNode
+from rdagent.components.knowledge_management.storage import KnowledgeGraphStore
+
+
+@pytest.mark.offline
+class KnowledgeGraphStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        patcher = mock.patch.object(vector_base, "APIBackend", FakeAPIBackend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / "kb"
+
+    def _add_task(self, kb: CoSTEERKnowledgeBaseV2, i: int) -> None:
+        task = UndirectedNode(content=f"task {i}", label="task_description")
+        component = UndirectedNode(content=f"component {i % 2}", label="component")
+        kb.graph.add_nodes(node=task, neighbors=[component])
+        kb.task_to_component_nodes[f"task {i}"] = [kb.graph.get_node(component.id)]
+        kb.node_to_implementation_knowledge_dict[task.id] = f"implementation {i}"
+
+    def test_incremental_save_and_load(self) -> None:
+        kb = CoSTEERKnowledgeBaseV2()
+        for i in range(3):
+            self._add_task(kb, i)
+        store = KnowledgeGraphStore(self.path, append_only_attrs=CoSTEERKnowledgeBaseV2.APPEND_ONLY_ATTRS)
+        store.save(kb)
+
+        # another process loads the store, appends new knowledge and saves it again
+        store2 = KnowledgeGraphStore(self.path, append_only_attrs=CoSTEERKnowledgeBaseV2.APPEND_ONLY_ATTRS)
+        kb2 = store2.load()
+        self.assertIsInstance(kb2.graph.vector_base.matrix, np.memmap)
+        # the processes unpickling the vector base map the same file instead of getting a copy of the embeddings
+        vb = pickle.loads(pickle.dumps(kb2.graph.vector_base))
+        self.assertIsInstance(vb.matrix, np.memmap)
+        np.testing.assert_array_equal(vb.matrix, kb2.graph.vector_base.matrix)
+        nodes_size = (self.path / "nodes.pkl").stat().st_size
+        self._add_task(kb2, 3)
+        store2.save(kb2)
+        self.assertGreater((self.path / "nodes.pkl").stat().st_size, nodes_size)
+
+        kb3 = KnowledgeGraphStore(self.path, append_only_attrs=CoSTEERKnowledgeBaseV2.APPEND_ONLY_ATTRS).load()
+        self.assertEqual(kb3.graph.size(), 6)  # 4 tasks + 2 components
+        self.assertEqual(len(kb3.node_to_implementation_knowledge_dict), 4)
+        # node references in the other attributes point to the graph nodes
+        component = kb3.task_to_component_nodes["task 3"][0]
+        self.assertIs(kb3.graph.get_node(component.id), component)
+        self.assertEqual({n.content for n in component.neighbors}, {"task 1", "task 3"})
+
+        found = kb3.graph.semantic_search("task 2", topk_k=1)
+        self.assertEqual(found[0].content, "task 2")
+
+    def test_refresh_replays_the_delta(self) -> None:
+        attrs = {
+            "append_only_attrs": CoSTEERKnowledgeBaseV2.APPEND_ONLY_ATTRS,
+            "append_only_list_attrs": CoSTEERKnowledgeBaseV2.APPEND_ONLY_LIST_ATTRS,
+        }
+        kb = CoSTEERKnowledgeBaseV2()
+        self._add_task(kb, 0)
+        store = KnowledgeGraphStore(self.path, **attrs)
+        store.save(kb)
+        reader = KnowledgeGraphStore(self.path, **attrs)
+        kb2 = reader.load()
+
+        # the writer appends a trace and a success knowledge which is the same object as the last trial
+        self._add_task(kb, 1)
+        knowledge = {"task": "task 1"}
+        kb.working_trace_knowledge.setdefault("task 1", []).extend([{"task": "trial"}, knowledge])
+        kb.success_task_to_knowledge_dict["task 1"] = knowledge
+        store.save(kb)
+        journal_size = (self.path / "kb_append.pkl").stat().st_size
+
+        with mock.patch.object(reader, "load", side_effect=AssertionError("should not reload")):
+            self.assertIs(reader.refresh(kb2), kb2)
+        self.assertEqual(kb2.graph.size(), 4)  # 2 tasks + 2 components
+        self.assertEqual(set(kb2.task_to_component_nodes), {"task 0", "task 1"})
+        trace = kb2.working_trace_knowledge["task 1"]
+        self.assertEqual(trace, [{"task": "trial"}, knowledge])
+        self.assertEqual(trace.index(kb2.success_task_to_knowledge_dict["task 1"]), 1)
+        self.assertIs(trace[1], kb2.success_task_to_knowledge_dict["task 1"])
+        self.assertEqual(kb2.graph.semantic_search("task 1", topk_k=1)[0].content, "task 1")
+
+        # the reader appends to the trace; only the new item is journaled
+        kb2.working_trace_knowledge["task 1"].append({"task": "retry"})
+        reader.save(kb2)
+        self.assertGreater((self.path / "kb_append.pkl").stat().st_size, journal_size)
+        kb3 = KnowledgeGraphStore(self.path, **attrs).load()
+        self.assertEqual(len(kb3.working_trace_knowledge["task 1"]), 3)
+        self.assertIs(kb3.working_trace_knowledge["task 1"][1], kb3.success_task_to_knowledge_dict["task 1"])
+
+        # the writer is out of sync now; its next save replays the reader's records before appending its own
+        self._add_task(kb, 2)
+        store.save(kb)
+        self.assertEqual(len(kb.working_trace_knowledge["task 1"]), 3)
+        self.assertIs(reader.refresh(kb2), kb2)
+        self.assertEqual(set(kb2.task_to_component_nodes), {"task 0", "task 1", "task 2"})
+
+    def test_stale_save_keeps_the_records_of_others(self) -> None:
+        attrs = {
+            "append_only_attrs": CoSTEERKnowledgeBaseV2.APPEND_ONLY_ATTRS,
+            "append_only_list_attrs": CoSTEERKnowledgeBaseV2.APPEND_ONLY_LIST_ATTRS,
+        }
+        kb_a = CoSTEERKnowledgeBaseV2()
+        self._add_task(kb_a, 0)
+        store_a = KnowledgeGraphStore(self.path, **attrs)
+        store_a.save(kb_a)
+        store_b = KnowledgeGraphStore(self.path, **attrs)
+        kb_b = store_b.load()
+
+        # both change their knowledge base; B saves after A without refreshing
+        self._add_task(kb_a, 1)
+        kb_a.working_trace_knowledge["task 0"] = [{"task": "a"}]
+        store_a.save(kb_a)
+        self._add_task(kb_b, 2)
+        kb_b.working_trace_knowledge["task 0"] = [{"task": "b"}]
+        store_b.save(kb_b)
+
+        for kb in (kb_b, KnowledgeGraphStore(self.path, **attrs).load(), store_a.refresh(kb_a)):
+            self.assertEqual(kb.graph.size(), 5)  # 3 tasks + 2 components
+            self.assertEqual(set(kb.task_to_component_nodes), {"task 0", "task 1", "task 2"})
+            self.assertEqual(len(kb.node_to_implementation_knowledge_dict), 3)
+            self.assertEqual(kb.working_trace_knowledge["task 0"], [{"task": "a"}, {"task": "b"}])
+            self.assertEqual(kb.graph.vector_base.size, 5)
+            for content in ("task 1", "task 2"):
+                self.assertEqual(kb.graph.semantic_search(content, topk_k=1)[0].content, content)
+
+    def test_rewrite_changes_the_epoch(self) -> None:
+        kb = CoSTEERKnowledgeBaseV2()
+        for i in range(3):
+            self._add_task(kb, i)
+        store = KnowledgeGraphStore(self.path, append_only_attrs=CoSTEERKnowledgeBaseV2.APPEND_ONLY_ATTRS)
+        store.save(kb)
+        stale = KnowledgeGraphStore(self.path, append_only_attrs=CoSTEERKnowledgeBaseV2.APPEND_ONLY_ATTRS)
+        stale_kb = stale.load()
+
+        # another knowledge base with fewer but longer records replaces the store
+        other = CoSTEERKnowledgeBaseV2()
+        self._add_task(other, 10**6)
+        other.node_to_implementation_knowledge_dict = {
+            k: "x" * 10**4 for k in other.node_to_implementation_knowledge_dict
+        }
+        KnowledgeGraphStore(self.path, append_only_attrs=CoSTEERKnowledgeBaseV2.APPEND_ONLY_ATTRS).save(other)
+
+        refreshed = store.refresh(kb)
+        self.assertIsNot(refreshed, kb)
+        self.assertEqual(set(refreshed.task_to_component_nodes), {f"task {10**6}"})
+        # the local changes of the stale knowledge base are merged into the rewritten store,
+        # with the nodes they are linked to
+        self._add_task(stale_kb, 3)
+        stale.save(stale_kb)
+        store = KnowledgeGraphStore(self.path, append_only_attrs=CoSTEERKnowledgeBaseV2.APPEND_ONLY_ATTRS)
+        for kb in (stale_kb, store.load()):
+            self.assertEqual(set(kb.task_to_component_nodes), {f"task {10**6}", "task 3"})
+            contents = {n.content for n in kb.graph.nodes.values()}
+            self.assertEqual(contents, {f"task {10**6}", "component 0", "task 3", "component 1"})
+            component = kb.task_to_component_nodes["task 3"][0]
+            self.assertIs(kb.graph.get_node(component.id), component)
+            self.assertEqual({n.content for n in component.neighbors}, {"task 3"})
+            self.assertEqual(kb.graph.vector_base.size, 4)
+            self.assertEqual(kb.graph.semantic_search("task 3", topk_k=1)[0].content, "task 3")
+
+    def test_load_waits_for_the_writer(self) -> None:
+        kb = CoSTEERKnowledgeBaseV2()
+        self._add_task(kb, 0)
+        KnowledgeGraphStore(self.path).save(kb)
+        loaded = []
+        with FileLock(self.path.with_name("kb.lock")):  # e.g. another process rewriting the store
+            reader = threading.Thread(target=lambda: loaded.append(KnowledgeGraphStore(self.path).load()))
+            reader.start()
+            reader.join(timeout=1)
+            self.assertFalse(loaded)
+        reader.join()
+        self.assertEqual(loaded[0].graph.size(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
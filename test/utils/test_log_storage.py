@@ -0,0 +1,94 @@
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+from rdagent.log.conf import LOG_SETTINGS
+from rdagent.log.storage import SEGMENT_DIR, FileStorage
+
+
+@pytest.mark.offline
+class SegmentedFileStorageTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.origin = LOG_SETTINGS.storage_format
+        self.tmp = tempfile.TemporaryDirectory()
+        self.t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def tearDown(self) -> None:
+        LOG_SETTINGS.storage_format = self.origin
+        self.tmp.cleanup()
+
+    def _log(self, storage: FileStorage, i: int, tag: str) -> None:
+        storage.log({"i": i}, tag=f"{tag}.123", timestamp=self.t0 + timedelta(seconds=i))
+
+    def test_mixed_formats(self) -> None:
+        storage = FileStorage(self.tmp.name)
+        LOG_SETTINGS.storage_format = "files"
+        for i in [0, 3]:
+            self._log(storage, i, "Loop_0.coding")
+        LOG_SETTINGS.storage_format = "segments"
+        for i, tag in [(1, "Loop_0.coding"), (2, "Loop_0.running.mle_score"), (4, "Loop_1.running")]:
+            self._log(storage, i, tag)
+        self.assertEqual(len(list((Path(self.tmp.name) / SEGMENT_DIR).glob("*.seg"))), 1)
+
+        msgs = list(storage.iter_msg())
+        self.assertEqual([m.content["i"] for m in msgs], [0, 1, 2, 3, 4])
+        self.assertEqual(msgs[2].tag, "Loop_0.running.mle_score")
+        self.assertEqual(msgs[2].pid_trace, "123")
+        self.assertEqual(msgs[2].timestamp, self.t0 + timedelta(seconds=2))
+
+        self.assertEqual([m.content["i"] for m in storage.iter_msg(tag="running")], [2, 4])
+        self.assertEqual([m.content["i"] for m in storage.iter_msg(tag="Loop_0")], [0, 1, 2, 3])
+        self.assertEqual([m.content["i"] for m in storage.iter_msg(pattern="**/running/*/*.pkl")], [4])
+        only_loop_1 = storage.iter_msg(tag_filter=lambda tag: tag.startswith("Loop_1."))
+        self.assertEqual([m.content["i"] for m in only_loop_1], [4])
+
+        storage.truncate(self.t0 + timedelta(seconds=1.5))
+        self.assertEqual([m.content["i"] for m in storage.iter_msg()], [0, 1])
+        self._log(storage, 5, "Loop_1.running")  # appended to a new segment
+        self.assertEqual([m.content["i"] for m in storage.iter_msg()], [0, 1, 5])
+
+    def test_tail(self) -> None:
+        storage = FileStorage(self.tmp.name)
+        cursor: dict = {}
+        LOG_SETTINGS.storage_format = "files"
+        self._log(storage, 0, "Loop_0.coding")
+        LOG_SETTINGS.storage_format = "segments"
+        self._log(storage, 1, "Loop_0.coding")
+        self.assertEqual([m.content["i"] for m in storage.iter_new_msg(cursor)], [0, 1])
+        self.assertEqual(list(storage.iter_new_msg(cursor)), [])
+
+        self._log(storage, 2, "Loop_0.running")
+        LOG_SETTINGS.storage_format = "files"
+        self._log(storage, 3, "Loop_0.running")
+        self.assertEqual([m.content["i"] for m in storage.iter_new_msg(cursor)], [2, 3])
+        self.assertEqual(list(storage.iter_new_msg(cursor)), [])
+
+    def test_tail_late_and_unconsumed_messages(self) -> None:
+        storage = FileStorage(self.tmp.name)
+        cursor: dict = {}
+        LOG_SETTINGS.storage_format = "files"
+        self._log(storage, 10, "Loop_0.coding")
+        self.assertEqual([m.content["i"] for m in storage.iter_new_msg(cursor)], [10])
+        # a file finished after a later one, e.g. by another process; only the files within the lookback are read
+        self._log(storage, 10 - int(FileStorage.TAIL_LOOKBACK) - 1, "Loop_0.coding")
+        self._log(storage, 5, "Loop_0.coding")
+        self.assertEqual([m.content["i"] for m in storage.iter_new_msg(cursor)], [5])
+        self.assertEqual(list(storage.iter_new_msg(cursor)), [])
+        self.assertEqual(list(Path(self.tmp.name).glob("**/*.tmp")), [])
+
+        # the messages not consumed are yielded by the next call
+        for i, fmt in [(11, "files"), (12, "segments"), (13, "segments"), (14, "files")]:
+            LOG_SETTINGS.storage_format = fmt
+            self._log(storage, i, "Loop_0.running")
+        msgs = storage.iter_new_msg(cursor)
+        self.assertEqual([next(msgs).content["i"] for _ in range(2)], [11, 12])
+        msgs.close()
+        self.assertEqual([m.content["i"] for m in storage.iter_new_msg(cursor)], [13, 14])
+        self.assertEqual(list(storage.iter_new_msg(cursor)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
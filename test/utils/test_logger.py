@@ -0,0 +1,40 @@
+import tempfile
+import unittest
+
+import pytest
+
+from rdagent.log import rdagent_logger as logger
+from rdagent.log.conf import LOG_SETTINGS
+from rdagent.log.utils import get_caller_info
+
+
+@pytest.mark.offline
+class LoggerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.origin = (LOG_SETTINGS.log_object_in_background, logger.storage.path)
+        self.tmp = tempfile.TemporaryDirectory()
+        logger.set_storages_path(self.tmp.name)
+
+    def tearDown(self) -> None:
+        LOG_SETTINGS.log_object_in_background = self.origin[0]
+        logger.set_storages_path(self.origin[1])
+        self.tmp.cleanup()
+
+    def test_log_object_in_background(self) -> None:
+        LOG_SETTINGS.log_object_in_background = True
+        with logger.tag("Loop_0.coding"):
+            for i in range(20):
+                logger.log_object({"i": i}, tag="obj")
+        logger.flush()
+        msgs = list(logger.storage.iter_msg())
+        self.assertEqual([m.content["i"] for m in msgs], list(range(20)))  # written in order
+        self.assertEqual(msgs[0].tag, "Loop_0.coding.obj")
+        self.assertEqual(logger.get_pids(), msgs[0].pid_trace)
+
+    def test_caller_info(self) -> None:
+        info = get_caller_info(level=1)
+        self.assertEqual((info["name"], info["function"]), (__name__, "test_caller_info"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import pytest
+
+from rdagent.utils.env import OutputCapture
+
+
+def benchmark_output_capture(size_mb: int = 50, limit: int | None = None) -> dict[str, float]:
+    """Capture `size_mb` MB of synthetic progress-bar lines; return the throughput and the captured size."""
+    line = "epoch 1:  42%|████▏     | 420/1000 [00:42<00:58, 10.00it/s] loss=0.1234\n"
+    n_lines = size_mb * 1024 * 1024 // len(line)
+    with tempfile.TemporaryDirectory() as spool_dir:
+        start = time.perf_counter()
+        capture = OutputCapture(limit, spool_dir=spool_dir)
+        for _ in range(n_lines):
+            capture.write(line)
+        value = capture.getvalue()
+        elapsed = time.perf_counter() - start
+    return {"mb_per_sec": n_lines * len(line) / 1024 / 1024 / elapsed, "captured_chars": len(value)}
+
+
+@pytest.mark.offline
+class OutputCaptureTest(unittest.TestCase):
+    def test_short_output(self) -> None:
+        capture = OutputCapture(limit=100)
+        for text in ["a\n", "b" * 10, "\n"]:
+            capture.write(text)
+        self.assertEqual(capture.getvalue(), "a\n" + "b" * 10 + "\n")
+        self.assertIsNone(capture.file)
+
+    def test_long_output(self) -> None:
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        capture = OutputCapture(limit=20, spool_dir=spool_dir.name)
+        text = "".join(f"{i}\n" for i in range(100))
+        for i in range(0, len(text), 7):
+            capture.write(text[i : i + 7])
+        capture.write("x" * 30)  # a chunk longer than the tail
+        head, hidden, tail = capture.getvalue().split("\n... (")[0], *capture.getvalue().split(") ...\n")
+        self.assertEqual(head, text[:10])
+        self.assertEqual(tail, "x" * 10)
+        self.assertIn(f"{len(text) + 30 - 20} chars are hidden", hidden)
+        path = Path(capture.file.name)
+        self.assertEqual(path.parent, Path(spool_dir.name))
+        self.assertEqual(path.read_text(), text + "x" * 30)
+
+    def test_benchmark(self) -> None:
+        res = benchmark_output_capture(size_mb=5, limit=1024 * 1024)
+        self.assertLessEqual(res["captured_chars"], 1024 * 1024 + 200)
+
+
+if __name__ == "__main__":
+    # python test/utils/test_output_capture.py
+    res = benchmark_output_capture(size_mb=50)
+    print(f"50 MB: {res['mb_per_sec']:.1f} MB/s, {res['captured_chars']} chars kept in memory")
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from rdagent.core.conf import RD_AGENT_SETTINGS
+from rdagent.core.utils import PickleCacheManager, cache_with_pickle
+from rdagent.log import rdagent_logger
+
+CALLS = []
+
+
+@cache_with_pickle(lambda x: f"key-{x}")
+def square(x: int) -> int:
+    CALLS.append(x)
+    return x * x
+
+
+@pytest.mark.offline
+class PickleCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.origin = RD_AGENT_SETTINGS.model_dump()
+        RD_AGENT_SETTINGS.pickle_cache_folder_path_str = self.tmp.name
+        CALLS.clear()
+
+    def tearDown(self) -> None:
+        for k in ["pickle_cache_folder_path_str", "pickle_cache_size_limit", "pickle_cache_memory_size_limit"]:
+            setattr(RD_AGENT_SETTINGS, k, self.origin[k])
+        self.tmp.cleanup()
+
+    def test_sharded_layout_and_legacy_files(self) -> None:
+        self.assertEqual([square(3), square(3)], [9, 9])
+        self.assertEqual(CALLS, [3])
+        files = list(Path(self.tmp.name).rglob("*.pkl"))
+        self.assertEqual(len(files), 1)
+        self.assertEqual(len(files[0].relative_to(self.tmp.name).parts), 4)  # namespace/xx/yy/key.pkl
+
+        # a file of the flat layout is still hit and moved into its shard
+        legacy = Path(self.tmp.name) / f"{square.__module__}.square" / "key-3.pkl"
+        files[0].rename(legacy)
+        self.assertEqual(square(3), 9)
+        self.assertFalse(legacy.exists())
+        self.assertTrue(files[0].exists())
+        self.assertEqual(CALLS, [3])
+
+    def test_lru_eviction(self) -> None:
+        manager = PickleCacheManager(root=self.tmp.name, size_limit=3000)
+        for i in range(3):
+            manager.dump("ns", f"k{i}", b"x" * 900)
+            path = manager.cache_path("ns", f"k{i}")
+            os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+        self.assertTrue(manager.load("ns", "k0")[0])  # k0 becomes the most recently used one
+        manager.dump("ns", "k3", b"x" * 900)
+        manager.evict()
+        self.assertFalse(manager.cache_path("ns", "k1").exists())
+        self.assertTrue(manager.cache_path("ns", "k0").exists())
+        self.assertTrue(manager.cache_path("ns", "k3").exists())
+        self.assertGreaterEqual(manager.stats["evicted_files"], 1)
+
+    def test_legacy_files_are_evicted(self) -> None:
+        manager = PickleCacheManager(root=self.tmp.name, size_limit=2100)
+        legacy = Path(self.tmp.name) / "ns" / "old.pkl"
+        legacy.parent.mkdir()
+        legacy.write_bytes(b"x" * 900)
+        os.utime(legacy, (time.time() - 100, time.time() - 100))
+        for i in range(2):
+            manager.dump("ns", f"k{i}", b"x" * 900)
+        manager.evict()
+        self.assertFalse(legacy.exists())
+        self.assertTrue(all(manager.cache_path("ns", f"k{i}").exists() for i in range(2)))
+
+    def test_periodic_stats(self) -> None:
+        manager = PickleCacheManager(root=self.tmp.name, stats_log_interval=3)
+        manager.dump("ns", "k", b"x" * 900)
+        with mock.patch.object(rdagent_logger, "info") as info:
+            for key in ["k", "k", "missing"]:
+                manager.load("ns", key)
+        info.assert_called_once()
+        self.assertIn("hit rate 66.7%", info.call_args.args[0])
+        self.assertGreater(manager.stats["size_bytes"], 900)
+
+    def test_memory_tier(self) -> None:
+        manager = PickleCacheManager(root=self.tmp.name, memory_size_limit=1 << 20)
+        manager.dump("ns", "k", {"a": [1, 2]})
+        manager.cache_path("ns", "k").unlink()  # the memory tier does not touch the disk
+        hit, res = manager.load("ns", "k")
+        self.assertTrue(hit)
+        self.assertEqual(res, {"a": [1, 2]})
+        res["a"].append(3)  # callers get their own copy
+        self.assertEqual(manager.load("ns", "k")[1], {"a": [1, 2]})
+        self.assertEqual(manager.stats["memory_hits"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
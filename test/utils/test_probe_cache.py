@@ -0,0 +1,85 @@
+import tempfile
+import time
+import unittest
+from collections import Counter
+from types import SimpleNamespace
+from unittest import mock
+
+import docker
+import pytest
+
+from rdagent.core.conf import RD_AGENT_SETTINGS
+from rdagent.utils.env import DockerConf, DockerEnv
+
+
+class FakeDockerClient:
+    """Records the images checked and the containers started"""
+
+    def __init__(self, gpu: bool = True) -> None:
+        self.gpu = gpu
+        self.api = SimpleNamespace(base_url="http+docker://fake")
+        self.calls: Counter = Counter()
+        self.images = SimpleNamespace(get=lambda image: self.calls.update(["images.get"]))
+        self.containers = SimpleNamespace(run=self._run)
+
+    def _run(self, image: str, command: str, **kwargs) -> SimpleNamespace:
+        self.calls.update([f"run:{command}"])
+        if command == "nvidia-smi" and not self.gpu:
+            raise docker.errors.APIError("could not select device driver")
+        return SimpleNamespace(id="0", wait=lambda: {"StatusCode": 0}, stop=lambda: None, remove=lambda: None)
+
+
+@pytest.mark.offline
+class DockerProbeCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.origin = RD_AGENT_SETTINGS.pickle_cache_folder_path_str
+        self.tmp = tempfile.TemporaryDirectory()
+        RD_AGENT_SETTINGS.pickle_cache_folder_path_str = self.tmp.name
+        self.client = FakeDockerClient()
+        patcher = mock.patch.object(docker, "from_env", return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        RD_AGENT_SETTINGS.pickle_cache_folder_path_str = self.origin
+        self.tmp.cleanup()
+
+    def _env(self, **kwargs) -> DockerEnv:
+        conf = {"image": "fake:latest", "mount_path": "/workspace", "default_entry": "true", **kwargs}
+        return DockerEnv(DockerConf(**conf))
+
+    def test_probed_once(self) -> None:
+        for _ in range(3):
+            env = self._env()  # e.g. a new process
+            env.prepare()
+            self.assertTrue(env._gpu_kwargs(self.client))
+        self.assertEqual(self.client.calls, Counter({"images.get": 2, "run:nvidia-smi": 1}))
+
+        self._env(image="other:latest").prepare()  # cached by image
+        self.assertEqual(self.client.calls["images.get"], 3)
+
+    def test_no_gpu_is_cached_shortly(self) -> None:
+        self.client.gpu = False
+        for _ in range(2):
+            self.assertEqual(self._env()._gpu_kwargs(self.client), {})
+        self.assertEqual(self.client.calls["run:nvidia-smi"], 1)
+
+        self.client.gpu = True  # e.g. the driver is back
+        now = time.time()
+        with mock.patch("rdagent.utils.probe_cache.time.time", return_value=now + 301):
+            self.assertTrue(self._env()._gpu_kwargs(self.client))
+        self.assertEqual(self.client.calls["run:nvidia-smi"], 2)
+
+        self.client.gpu = False
+        for _ in range(2):
+            self._env(image="other:latest", probe_cache_no_gpu_ttl=0)._gpu_kwargs(self.client)
+        self.assertEqual(self.client.calls["run:nvidia-smi"], 4)
+
+    def test_disabled(self) -> None:
+        for _ in range(2):
+            self._env(probe_cache_ttl=0).prepare()
+        self.assertEqual(self.client.calls["images.get"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import psutil
+import pytest
+
+from rdagent.utils.env import LocalConf, LocalEnv
+from rdagent.utils.sandbox import (
+    _SANDBOXES,
+    LocalSandbox,
+    close_sandboxes,
+    run_in_sandbox,
+)
+
+
+@pytest.mark.offline
+class LocalSandboxTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = LocalEnv(
+            LocalConf(
+                default_entry="true",
+                bin_path=str(Path(sys.executable).parent),
+                enable_cache=False,
+                warm_sandbox=True,
+                running_timeout_period=2,
+            )
+        )
+
+    def tearDown(self) -> None:
+        close_sandboxes()
+        self.tmp.cleanup()
+
+    def _run(self, entry: str, **env: str):
+        return self.env.run(entry, local_path=self.tmp.name, env=dict(env))
+
+    def test_warm_runs(self) -> None:
+        res = self._run("echo $FOO; export BAR=1; cd /; exit 3", FOO="foo")
+        self.assertEqual((res.stdout, res.exit_code), ("foo\n", 3))
+        shell = next(iter(_SANDBOXES.values())).proc.pid
+
+        res = self._run('printf "%s|%s" "${BAR:-unset}" "$(pwd)"')  # the previous run leaves nothing behind
+        self.assertEqual((res.stdout, res.exit_code), (f"unset|{Path(self.tmp.name).resolve()}", 0))
+        self.assertEqual([s.proc.pid for s in _SANDBOXES.values()], [shell])  # the same warm shell
+
+    def test_reset_and_timeout(self) -> None:
+        script = "import subprocess\nprint(subprocess.Popen(['sleep', '100']).pid)\n"
+        (Path(self.tmp.name) / "bg.py").write_text(script)
+        pid = int(self._run("python bg.py").stdout)
+        time.sleep(0.1)
+        self.assertFalse(psutil.pid_exists(pid) and psutil.Process(pid).status() != psutil.STATUS_ZOMBIE)
+
+        res = self._run("sleep 10")
+        self.assertEqual(res.exit_code, 124)  # killed by `timeout` like `Env.run`
+        self.assertEqual(self._run("echo ok").stdout, "ok\n")
+
+    def test_unparsable_entry_and_no_local_path(self) -> None:
+        res = self._run("echo 'unterminated")
+        self.assertNotEqual(res.exit_code, 0)
+        self.assertEqual(self._run("echo ok").stdout, "ok\n")
+
+        output: list[str] = []
+        code = run_in_sandbox("cwd", lambda: LocalSandbox(None), "pwd", {}, output.append)
+        self.assertEqual((code, "".join(output).strip()), (0, str(Path.cwd())))
+
+    def test_lru_and_idle_eviction(self) -> None:
+        def run(key: str, **kwargs) -> LocalSandbox:
+            run_in_sandbox(key, lambda: LocalSandbox(self.tmp.name), "true", {}, lambda _: None, **kwargs)
+            return _SANDBOXES[next(k for k in _SANDBOXES if k[1] == key)]
+
+        a, b = run("a"), run("b")
+        self.assertIs(run("a", max_sandboxes=2), a)
+        c = run("c", max_sandboxes=2)  # "b" is the least recently used one
+        self.assertEqual([k for _, k in _SANDBOXES], ["a", "c"])
+        self.assertFalse(b.alive())
+
+        time.sleep(0.1)
+        run("d", idle_timeout=0.05)  # the timeouts of "a" and "c" are also set on their next runs only
+        self.assertEqual([k for _, k in _SANDBOXES], ["a", "c", "d"])
+        run("c", idle_timeout=0.05)
+        time.sleep(0.1)
+        run("a", idle_timeout=0.05)
+        self.assertEqual([k for _, k in _SANDBOXES], ["a"])
+        self.assertTrue(a.alive())
+        self.assertFalse(c.alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
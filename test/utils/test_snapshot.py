@@ -0,0 +1,85 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import pytest
+
+from rdagent.utils.snapshot import WorkspaceSnapshotStore, folder_file_hashes
+
+
+@pytest.mark.offline
+class WorkspaceSnapshotStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.ws = self.root / "workspace"
+        (self.ws / "sub").mkdir(parents=True)
+        (self.ws / "main.py").write_text("print('hello')")
+        (self.ws / "sub" / "data.csv").write_text("a,b\n1,2\n")
+        (self.root / "input").mkdir()
+        os.symlink(self.root / "input", self.ws / "input")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_round_trip(self) -> None:
+        store = WorkspaceSnapshotStore(self.root / "store")
+        self.assertEqual(store.get("k", self.ws), (False, None))
+        store.set("k", self.ws, {"stdout": "ok"})
+
+        (self.ws / "main.py").write_text("changed")
+        (self.ws / "extra.txt").write_text("should be removed")
+        self.assertEqual(store.get("k", self.ws), (True, {"stdout": "ok"}))
+        self.assertEqual((self.ws / "main.py").read_text(), "print('hello')")
+        self.assertEqual((self.ws / "sub" / "data.csv").read_text(), "a,b\n1,2\n")
+        self.assertFalse((self.ws / "extra.txt").exists())
+        self.assertTrue((self.ws / "input").is_symlink())
+
+    def test_modified_blob_is_dropped(self) -> None:
+        store = WorkspaceSnapshotStore(self.root / "store")
+        store.set("k", self.ws, 1)
+        self.assertTrue(store.get("k", self.ws)[0])
+        blob = next(b for b in (self.root / "store").glob("blobs/*/*") if b.read_text() == "print('hello')")
+        with blob.open("w") as f:
+            f.write("corrupted")
+        self.assertEqual(store.get("k", self.ws), (False, None))
+
+    def test_restored_files_are_independent(self) -> None:
+        store = WorkspaceSnapshotStore(self.root / "store")
+        store.set("k", self.ws, 1)
+        ws_a, ws_b = self.root / "ws_a", self.root / "ws_b"
+        self.assertTrue(store.get("k", ws_a)[0] and store.get("k", ws_b)[0])
+        with (ws_a / "main.py").open("w") as f:  # written in place, e.g. by `to_csv`
+            f.write("CHANGED")
+        self.assertEqual((ws_b / "main.py").read_text(), "print('hello')")
+        self.assertTrue(store.get("k", self.ws)[0])  # the store is not changed
+        self.assertEqual((self.ws / "main.py").read_text(), "print('hello')")
+
+    def test_dedup_and_eviction(self) -> None:
+        store = WorkspaceSnapshotStore(self.root / "store")
+        store.set("k1", self.ws, 1)
+        store.set("k2", self.ws, 2)
+        self.assertEqual(len(list((self.root / "store").glob("blobs/*/*"))), 2)
+
+        (self.ws / "sub" / "data.csv").write_text("x" * 1000)
+        store.size_limit = 1000
+        old = time.time() - 100
+        for key in ["k1", "k2"]:
+            os.utime(self.root / "store" / "snapshots" / f"{key}.pkl", (old, old))
+        store.set("k3", self.ws, 3)
+        # the older snapshots are evicted and their unique blobs collected
+        self.assertEqual(store.get("k1", self.ws), (False, None))
+        self.assertEqual(store.get("k3", self.ws), (True, 3))
+        self.assertEqual(len(list((self.root / "store").glob("blobs/*/*"))), 2)
+
+    def test_folder_file_hashes(self) -> None:
+        hashes = folder_file_hashes(self.ws, patterns=("*.py", "*.csv"))
+        self.assertEqual([rel for rel, _ in hashes], ["main.py", str(Path("sub") / "data.csv")])
+        (self.ws / "main.py").write_text("print('world')")
+        self.assertNotEqual(folder_file_hashes(self.ws, patterns=("*.py",))[0][1], hashes[0][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
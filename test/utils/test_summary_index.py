@@ -0,0 +1,37 @@
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from rdagent.log.storage import FileStorage
+from rdagent.log.summary_index import SummaryIndex
+
+
+@pytest.mark.offline
+class SummaryIndexTest(unittest.TestCase):
+    def test_update_and_truncate(self) -> None:
+        t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        with tempfile.TemporaryDirectory() as tmp:
+            index = SummaryIndex(tmp)
+            self.assertFalse(index.exists())
+            index.update(1, times={"exp_gen": {"start_time": t0, "end_time": t0 + timedelta(seconds=1)}}, is_merge=True)
+            index.update(0, times={"coding": {"start_time": t0, "end_time": t0}}, decision=False)
+            index.update(1, times={"coding": {"start_time": t0, "end_time": t0}}, decision=True)
+            cut = datetime.now(timezone.utc)
+            index.update(1, mle_score={"score": 0.5})
+
+            loops = index.loops()
+            self.assertEqual(list(loops), [0, 1])
+            self.assertEqual(set(loops[1]["times"]), {"exp_gen", "coding"})
+            self.assertEqual(loops[1]["times"]["exp_gen"]["end_time"], t0 + timedelta(seconds=1))
+            self.assertTrue(loops[1]["decision"] and loops[1]["is_merge"])
+            self.assertEqual(loops[1]["mle_score"], {"score": 0.5})
+
+            # the index is truncated with the logs when a session is resumed
+            FileStorage(tmp).truncate(cut)
+            self.assertNotIn("mle_score", SummaryIndex(tmp).loops()[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import pytest
+
+from rdagent.utils.agent.tpl import T, get_caller_dir
+
+
+@pytest.mark.offline
+class TemplateCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)  # the uris are resolved relative to the current directory first
+
+    def tearDown(self) -> None:
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def _write(self, content: str, mtime: int) -> None:
+        path = Path(self.tmp.name) / "prompts.yaml"
+        path.write_text(content)
+        os.utime(path, ns=(mtime, mtime))
+
+    def test_reload_modified(self) -> None:
+        self.assertEqual(get_caller_dir(), Path(__file__).parent)
+        self._write('a:\n  user: "Hi {{ name }}"\n', 1_000_000_000)
+        self.assertEqual(T("prompts:a.user").r(name="x"), "Hi x")
+        self.assertEqual(T("prompts:a.user").r(name="y"), "Hi y")
+
+        self._write('a:\n  user: "Bye {{ name }}"\n  inc: \'{% include "prompts:a.user" %}!\'\n', 2_000_000_000)
+        self.assertEqual(T("prompts:a.user").r(name="x"), "Bye x")
+        self.assertEqual(T("prompts:a.inc").r(name="x"), "Bye x!")
+        with self.assertRaises(FileNotFoundError):
+            T("prompts:a.missing")
+
+
+if __name__ == "__main__":
+    unittest.main()
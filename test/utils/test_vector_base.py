@@ -0,0 +1,54 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+import pytest
+from fake_api_backend import FakeAPIBackend
+
+from rdagent.components.knowledge_management import vector_base
+from rdagent.components.knowledge_management.vector_base import (
+    Document,
+    MatrixVectorBase,
+    PDVectorBase,
+)
+
+
+@pytest.mark.offline
+class MatrixVectorBaseTest(unittest.TestCase):
+    def setUp(self) -> None:
+        patcher = mock.patch.object(vector_base, "APIBackend", FakeAPIBackend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.docs = [Document(content=f"doc {i}", label=f"label{i % 3}") for i in range(200)]
+
+    def test_same_result_as_pd_vector_base(self) -> None:
+        pd_vb, mat_vb = PDVectorBase(), MatrixVectorBase()
+        pd_vb.add(self.docs)
+        mat_vb.add(self.docs)
+        self.assertEqual(pd_vb.shape()[0], mat_vb.shape()[0])
+
+        for kwargs in [
+            {"topk_k": 5},
+            {"topk_k": 10, "constraint_labels": ["label1", "label2"]},
+            {"similarity_threshold": 0.3},
+        ]:
+            pd_docs, pd_scores = pd_vb.search("doc 3", **kwargs)
+            mat_docs, mat_scores = mat_vb.search("doc 3", **kwargs)
+            order = np.argsort(-np.asarray(pd_scores), kind="stable")  # PDVectorBase only sorts with topk_k
+            self.assertEqual([pd_docs[i].id for i in order], [d.id for d in mat_docs])
+            np.testing.assert_allclose(np.asarray(pd_scores)[order], mat_scores, rtol=1e-5)
+
+        docs, scores = mat_vb.search("doc 3", topk_k=1)
+        self.assertEqual(docs[0].content, "doc 3")
+        self.assertAlmostEqual(scores[0], 1.0, places=5)
+
+    def test_approximate_search(self) -> None:
+        mat_vb = MatrixVectorBase(approximate=True, ivf_min_size=50, n_probe=4)
+        mat_vb.add(self.docs)
+        docs, _ = mat_vb.search("doc 7", topk_k=3, constraint_labels=["label1"])
+        self.assertEqual(docs[0].content, "doc 7")
+        self.assertTrue(all(d.label == "label1" for d in docs))
+
+
+if __name__ == "__main__":
+    unittest.main()
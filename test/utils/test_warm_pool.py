@@ -0,0 +1,63 @@
+import os
+import random
+import time
+import unittest
+
+import pytest
+
+from rdagent.core.conf import RD_AGENT_SETTINGS
+from rdagent.core.utils import (
+    LLM_CACHE_SEED_GEN,
+    WarmProcessPool,
+    get_warm_process_pool,
+    multiprocessing_wrapper,
+)
+
+
+@pytest.mark.offline
+class WarmProcessPoolTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.origin = RD_AGENT_SETTINGS.model_dump()
+
+    def tearDown(self) -> None:
+        for k in ["multi_proc_warm_pool", "multi_proc_timeout"]:
+            setattr(RD_AGENT_SETTINGS, k, self.origin[k])
+
+    def test_reuse_and_seeds(self) -> None:
+        RD_AGENT_SETTINGS.multi_proc_warm_pool = True
+        pids = set(multiprocessing_wrapper([(os.getpid, ())] * 4, n=2))
+        self.assertEqual(set(multiprocessing_wrapper([(os.getpid, ())] * 4, n=2)), pids)
+        self.assertIs(get_warm_process_pool(2), get_warm_process_pool(2))
+
+        # every call draws from its own seed, like the calls run by a new pool
+        LLM_CACHE_SEED_GEN.set_seed(10)
+        res = multiprocessing_wrapper([(LLM_CACHE_SEED_GEN.get_next_seed, ())] * 3, n=2)
+        LLM_CACHE_SEED_GEN.set_seed(10)
+        self.assertEqual(res, [random.Random(LLM_CACHE_SEED_GEN.get_next_seed()).randint(0, 10000) for _ in range(3)])
+
+    def test_timeout_and_crash_only_affect_their_task(self) -> None:
+        pool = WarmProcessPool(2)
+        self.addCleanup(pool.close)
+        calls = [(time.sleep, 0, (30,)), (os._exit, 0, (1,)), (abs, 0, (-1,)), (abs, 0, (-2,))]
+        start = time.monotonic()
+        self.assertEqual(pool.map(calls, timeout=3), [None, None, 1, 2])
+        self.assertLess(time.monotonic() - start, 20)
+        self.assertEqual(pool.map([(abs, 0, (-3,))] * 2, timeout=3), [3, 3])
+
+    def test_unpicklable_call(self) -> None:
+        pool = WarmProcessPool(1)
+        self.addCleanup(pool.close)
+        calls = [(abs, 0, (-1,)), (lambda: 0, 0, ()), (abs, 0, (lambda: 0,)), (abs, 0, (-2,))]
+        self.assertEqual(pool.map(calls, timeout=60), [1, None, None, 2])
+        self.assertEqual(pool.map(calls[1:3], timeout=60), [None, None])
+
+    def test_recycling(self) -> None:
+        pool = WarmProcessPool(1, max_tasks_per_child=2)
+        self.addCleanup(pool.close)
+        pids = pool.map([(os.getpid, 0, ())] * 4, timeout=60)
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(pids[1], pids[2])
+
+
+if __name__ == "__main__":
+    unittest.main()